@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Optional
+
+import metrics_manager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request waited longer than the queue-wait budget for a slot."""
+
+
+class AdmissionController:
+    """
+    Caps how many requests a worker lets hold a DB session at once. Requests
+    beyond the cap wait for a slot for at most `queue_timeout` seconds and are then rejected, so
+    bursts are shed with a fast 503 instead of piling up on the DB pool until
+    gunicorn kills the worker.
+    """
+    def __init__(self, max_concurrency: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.queue_wait_seconds = metrics_manager.Histogram(metrics_manager.POOL_WAIT_BUCKETS)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics_manager.admission_rejections.inc()
+            raise AdmissionRejected()
+        finally:
+            self.waiting -= 1
+            self.queue_wait_seconds.observe(time.perf_counter() - started)
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def status(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": metrics_manager.admission_rejections.value,
+            "queue_wait_seconds": self.queue_wait_seconds.snapshot(),
+        }
@@ -0,0 +1,93 @@
+"""
+Load generator for comparing endpoint throughput before and after a change,
+e.g. the sync vs. async database path of the like/follow/comment handlers.
+
+Each of --concurrency clients loops over the given requests in order for
+--duration seconds and the script reports requests/sec and latency percentiles.
+Run it against the same deployment and hardware on both revisions:
+
+    python benchmark.py --base-url http://127.0.0.1:8000 --cookie "access_token=..." \\
+        --request "POST /media/1/like" --request "DELETE /media/1/like" \\
+        --concurrency 50 --duration 30
+"""
+import argparse
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+
+def parse_request(spec: str) -> Tuple[str, str, str]:
+    """Parses "METHOD /path [json-body]" into its parts."""
+    parts = spec.split(" ", 2)
+    if len(parts) < 2:
+        raise argparse.ArgumentTypeError(f"Expected 'METHOD /path [body]', got {spec!r}")
+    return parts[0].upper(), parts[1], parts[2] if len(parts) == 3 else ""
+
+
+def run_client(args, requests: List[Tuple[str, str, str]], deadline: float,
+               latencies: List[float], errors: List[int], lock: threading.Lock):
+    url = urlsplit(args.base_url)
+    connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(url.netloc, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    if args.cookie:
+        headers["Cookie"] = args.cookie
+
+    local_latencies, local_errors = [], 0
+    while time.perf_counter() < deadline:
+        for method, path, body in requests:
+            started = time.perf_counter()
+            try:
+                connection.request(method, url.path.rstrip("/") + path, body=body or None, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+            local_latencies.append(time.perf_counter() - started)
+
+    connection.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure requests/sec for a sequence of API requests.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--request", dest="requests", type=parse_request, action="append", required=True,
+                        help="'METHOD /path [json-body]'; repeat to cycle through several requests.")
+    parser.add_argument("--cookie", default="", help="Cookie header, e.g. 'access_token=...'.")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run.")
+    args = parser.parse_args()
+
+    latencies: List[float] = []
+    errors: List[int] = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(run_client, args, args.requests, deadline, latencies, errors, lock)
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print("No requests completed.")
+        return
+    latencies.sort()
+    p50 = latencies[int(0.50 * (len(latencies) - 1))]
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"requests:     {len(latencies)} in {elapsed:.1f}s ({sum(errors)} errors)")
+    print(f"requests/sec: {len(latencies) / elapsed:.1f}")
+    print(f"latency p50:  {p50 * 1000:.1f} ms")
+    print(f"latency p99:  {p99 * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    A small, thread-safe LRU cache whose entries also expire after a fixed TTL.
+    Each gunicorn worker keeps its own instance, so it must stay bounded.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores a value, evicting the least recently used entry when full."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend:
+    """
+    Storage behind ResponseCache. The in-process MemoryCacheBackend is per worker;
+    a shared store (e.g. Redis-compatible) implementing the same methods makes
+    entries, invalidations and single-flight locks global across workers.
+    """
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def add(self, key: Hashable, value: Any, ttl: float) -> bool:
+        """Stores the value only if the key is absent; returns whether it was stored."""
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def get_counter(self, key: Hashable) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: Hashable) -> int:
+        """Atomically increments a counter that never expires or gets evicted."""
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int = 1024):
+        self._entries = TTLCache(maxsize=maxsize)
+        # Counters live outside the LRU: evicting a namespace generation would
+        # resurrect entries it had invalidated.
+        self._counters: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries.set(key, value, ttl=ttl)
+
+    def add(self, key: Hashable, value: Any, ttl: float) -> bool:
+        with self._lock:
+            if self._entries.get(key) is not None:
+                return False
+            self._entries.set(key, value, ttl=ttl)
+            return True
+
+    def delete(self, key: Hashable) -> None:
+        self._entries.delete(key)
+
+    def get_counter(self, key: Hashable) -> int:
+        return self._counters.get(key, 0)
+
+    def incr(self, key: Hashable) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class ResponseCache:
+    """
+    Caches serialized responses by namespace and key.
+
+    - Invalidating a namespace bumps its generation, which orphans every entry
+      of that namespace at once.
+    - An entry is fresh for `ttl` seconds. For `stale_ttl` seconds after that it
+      is still served while a single caller recomputes it (single-flight).
+    - Callers that find no usable entry while another thread of this worker
+      recomputes it block on that computation (up to `lock_timeout`) instead of
+      stampeding the database, and wake as soon as it finishes.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 30.0, stale_ttl: float = 30.0,
+                 lock_timeout: float = 5.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        # Lock key -> event set when this worker's in-flight computation ends.
+        self._flights: Dict[Hashable, threading.Event] = {}
+        self._flights_lock = threading.Lock()
+
+    def invalidate(self, namespace: str) -> None:
+        self.backend.incr(("generation", namespace))
+
+    def get_or_compute(self, namespace: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        generation = self.backend.get_counter(("generation", namespace))
+        entry_key = ("response", namespace, generation, key)
+        entry = self.backend.get(entry_key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+
+        lock_key = ("lock", namespace, generation, key)
+        with self._flights_lock:
+            flight = self._flights.get(lock_key)
+            if flight is None and self.backend.add(lock_key, True, ttl=self.lock_timeout):
+                flight = self._flights[lock_key] = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            try:
+                value = compute()
+                self.backend.set(entry_key, (time.time() + self.ttl, value), ttl=self.ttl + self.stale_ttl)
+                return value
+            finally:
+                self.backend.delete(lock_key)
+                with self._flights_lock:
+                    self._flights.pop(lock_key, None)
+                flight.set()
+
+        # Someone else is recomputing: serve the stale copy if there is one,
+        # otherwise wait for their result. A lock held by another process (with
+        # a shared backend) cannot be waited on, so compute directly.
+        if entry is not None:
+            return entry[1]
+        if flight is not None and flight.wait(self.lock_timeout):
+            entry = self.backend.get(entry_key)
+            if entry is not None:
+                return entry[1]
+        return compute()
@@ -1,48 +1,396 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import os
+import threading
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import anyio
+import anyio.from_thread
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
 from fastapi import WebSocket
-from typing import Dict, List
 
-class ConnectionManager:
+import database_manager
+
+load_dotenv(dotenv_path="../.env")
+
+# "postgres" fans messages out to every worker through LISTEN/NOTIFY;
+# "memory" only reaches sockets held by this process (single worker / tests).
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "postgres")
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "ws_broadcast")
+BROADCAST_RECONNECT_SECONDS = float(os.getenv("BROADCAST_RECONNECT_SECONDS", "2"))
+
+# Outbound messages buffered per socket before the overflow policy kicks in.
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+# "drop" discards new messages for a client whose queue is full; "close" disconnects it.
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop")
+# Close code 1013 (Try Again Later) tells a client it was dropped for falling behind.
+WS_TRY_AGAIN_LATER = 1013
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+NOTIFY_MAX_PAYLOAD_BYTES = 7999
+
+Deliver = Callable[[str], Awaitable[None]]
+EventHandler = Callable[[str], None]
+# (kind, row id) of a message too large to broadcast; receivers rebuild it with
+# the loader registered for `kind`, which returns None if the row is gone.
+Reference = Tuple[str, int]
+ReferenceLoader = Callable[[int], Optional[str]]
+
+
+def encode_envelope(header: dict, message: str) -> str:
+    """
+    The routing header as JSON, a newline, then the message as is. Messages are
+    mostly serialized JSON already, so embedding them raw avoids escaping them twice.
+    """
+    return json.dumps(header, separators=(",", ":"), ensure_ascii=False) + "\n" + message
+
+
+class BroadcastBackend(ABC):
+    """
+    Carries encoded envelopes from the publishing worker to every worker's listener.
+    `start` is called once per process with the coroutine that delivers an envelope
+    to the sockets held locally. `max_payload_bytes` is the largest envelope it
+    carries, or None if unbounded.
+    """
+    max_payload_bytes: Optional[int] = None
+
+    @abstractmethod
+    async def start(self, deliver: Deliver):
+        ...
+
+    @abstractmethod
+    async def publish(self, envelope: str):
+        ...
+
+
+class InMemoryBroadcastBackend(BroadcastBackend):
+    """Delivers straight to this process's sockets. Correct only with a single worker."""
     def __init__(self):
-        # Maps user_id to their WebSocket for personal notifications
-        self.active_connections: Dict[int, WebSocket] = {}
-        # Maps a room name (e.g., "image-123") to a list of WebSockets in that room
-        self.room_connections: Dict[str, List[WebSocket]] = {}
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def publish(self, envelope: str):
+        await self._deliver(envelope)
+
+
+class PostgresBroadcastBackend(BroadcastBackend):
+    """
+    Publishes with pg_notify and runs one LISTEN connection per worker, read from
+    the event loop with add_reader so no thread or pool connection is tied up.
+    """
+    max_payload_bytes = NOTIFY_MAX_PAYLOAD_BYTES
+
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._deliver: Optional[Deliver] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        await self._listen()
+
+    async def _listen(self):
+        while True:
+            try:
+                conn = await asyncio.to_thread(psycopg2.connect, self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                self._listen_conn = conn
+                self._loop.add_reader(conn.fileno(), self._on_readable)
+                return
+            except psycopg2.Error as e:
+                print(f"{datetime.now()}: Broadcast listener failed to connect, retrying: {e}")
+                await asyncio.sleep(BROADCAST_RECONNECT_SECONDS)
+
+    def _on_readable(self):
+        conn = self._listen_conn
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            print(f"{datetime.now()}: Broadcast listener connection lost, reconnecting: {e}")
+            self._loop.remove_reader(conn.fileno())
+            conn.close()
+            self._listen_conn = None
+            self._spawn(self._listen())
+            return
+        while conn.notifies:
+            self._spawn(self._deliver(conn.notifies.pop(0).payload))
+
+    def _spawn(self, coro):
+        # Keep a reference so pending deliveries are not garbage collected.
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _notify(self, envelope: str):
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = psycopg2.connect(self.dsn)
+                        self._publish_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                    with self._publish_conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, envelope))
+                    return
+                except psycopg2.OperationalError:
+                    # Stale connection; reconnect once before giving up.
+                    if self._publish_conn is not None:
+                        self._publish_conn.close()
+                    self._publish_conn = None
+                    if attempt:
+                        raise
+
+    async def publish(self, envelope: str):
+        if len(envelope.encode()) > self.max_payload_bytes:
+            # Publishers send a reference instead when they can (see ConnectionManager._publish).
+            # This runs after the write committed, so reach this worker rather than fail.
+            print(f"{datetime.now()}: Broadcast payload exceeds {self.max_payload_bytes} bytes, "
+                  f"delivering to this worker only.")
+            await self._deliver(envelope)
+            return
+        try:
+            await asyncio.to_thread(self._notify, envelope)
+        except psycopg2.Error as e:
+            print(f"{datetime.now()}: Broadcast publish failed, delivering to this worker only: {e}")
+            await self._deliver(envelope)
+
 
-    # --- Personal Notification Methods (Unchanged) ---
-    async def connect(self, user_id: int, websocket: WebSocket):
+def create_broadcast_backend() -> BroadcastBackend:
+    if BROADCAST_BACKEND == "memory":
+        return InMemoryBroadcastBackend()
+    if BROADCAST_BACKEND == "postgres":
+        return PostgresBroadcastBackend(database_manager.SQLALCHEMY_DATABASE_URL, BROADCAST_CHANNEL)
+    raise ValueError(f"Unknown BROADCAST_BACKEND: {BROADCAST_BACKEND}")
+
+
+class ClientConnection:
+    """
+    A connected socket with a bounded outbound queue drained by its own writer task,
+    so a slow or dead client only ever delays itself. When the queue is full the
+    overflow policy either drops the new message or closes the socket.
+    """
+    def __init__(self, websocket: WebSocket, queue_size: int, overflow_policy: str):
+        self.websocket = websocket
+        self.overflow_policy = overflow_policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self._closer: Optional[asyncio.Task] = None
+        self._writer = asyncio.create_task(self._write())
+
+    async def _write(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await self.websocket.send_text(message)
+        except Exception as e:
+            # The socket is gone; the endpoint's receive loop will call disconnect.
+            self.closed = True
+            print(f"{datetime.now()}: Websocket writer stopped: {e}")
+
+    def enqueue(self, message: str):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if self.overflow_policy == "close":
+                print(f"{datetime.now()}: Websocket send queue full, closing slow client.")
+                self.closed = True
+                self._writer.cancel()
+                self._closer = asyncio.create_task(self._close(WS_TRY_AGAIN_LATER))
+            else:
+                print(f"{datetime.now()}: Websocket send queue full, dropping message.")
+
+    async def _close(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stop(self):
+        self.closed = True
+        self._writer.cancel()
+
+
+class ConnectionManager:
+    """
+    Tracks the sockets held by this worker. Messages are published once to the
+    broadcast backend and every worker's listener delivers them to its own sockets,
+    so personal messages and room broadcasts reach users on any worker.
+    Delivery only enqueues onto each connection's send queue and never waits on a socket.
+    """
+    def __init__(self, backend: BroadcastBackend):
+        self.backend = backend
+        # Maps user_id to the connections of each of their devices/tabs
+        self.active_connections: Dict[int, Set[ClientConnection]] = {}
+        # Maps a room name (e.g., "media-123") to the connections in that room
+        self.room_connections: Dict[str, Set[ClientConnection]] = {}
+        # Maps an event name to the in-process handlers run when any worker publishes it
+        self.event_handlers: Dict[str, List[EventHandler]] = {}
+        # Maps a reference kind to the loader that rebuilds its message from a row id
+        self.reference_loaders: Dict[str, ReferenceLoader] = {}
+        self._started = False
+        self._start_lock: Optional[asyncio.Lock] = None
+        # Keeps a reference to fire-and-forget publishes until they finish.
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _ensure_started(self):
+        """Starts this worker's listener the first time it is needed."""
+        if self._started:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if not self._started:
+                await self.backend.start(self._deliver)
+                self._started = True
+
+    async def _publish(self, target: str, key, message: str, ref: Optional[Reference] = None):
+        await self._ensure_started()
+        header = {"t": target, "k": key}
+        envelope = encode_envelope(header, message)
+        limit = self.backend.max_payload_bytes
+        if ref is not None and limit is not None and len(envelope.encode()) > limit:
+            # Too large for the backend: every worker loads the row itself instead.
+            envelope = encode_envelope({**header, "r": list(ref)}, "")
+        await self.backend.publish(envelope)
+
+    async def _load_reference(self, kind: str, row_id: int) -> Optional[str]:
+        loader = self.reference_loaders.get(kind)
+        if loader is None:
+            print(f"{datetime.now()}: No loader for broadcast reference '{kind}'.")
+            return None
+        try:
+            # Loaders query the database, so they run off the event loop.
+            return await asyncio.to_thread(loader, row_id)
+        except Exception as e:
+            print(f"{datetime.now()}: Loading broadcast reference '{kind}' {row_id} failed: {e}")
+            return None
+
+    async def _deliver(self, envelope: str):
+        """Queues a published envelope on the matching connections held by this worker."""
+        header, _, message = envelope.partition("\n")
+        try:
+            data = json.loads(header)
+            target, key, ref = data["t"], data["k"], data.get("r")
+            if ref is not None:
+                kind, row_id = ref
+        except (ValueError, KeyError, TypeError):
+            print(f"{datetime.now()}: Ignoring malformed broadcast envelope.")
+            return
+
+        if ref is not None:
+            message = await self._load_reference(kind, row_id)
+            if message is None:
+                return
+
+        if target == "event":
+            for handler in self.event_handlers.get(key, ()):
+                try:
+                    handler(message)
+                except Exception as e:
+                    print(f"{datetime.now()}: Event handler for '{key}' failed: {e}")
+            return
+
+        registry = self.active_connections if target == "user" else self.room_connections
+        # The envelope is decoded once; every recipient is handed the same string.
+        for connection in list(registry.get(key, ())):
+            connection.enqueue(message)
+
+    async def _register(self, registry: Dict, key, websocket: WebSocket) -> ClientConnection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        await self._ensure_started()
+        connection = ClientConnection(websocket, WS_SEND_QUEUE_SIZE, WS_OVERFLOW_POLICY)
+        registry.setdefault(key, set()).add(connection)
+        return connection
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+    @staticmethod
+    def _unregister(registry: Dict, key, websocket: WebSocket):
+        connections = registry.get(key)
+        if not connections:
+            return
+        for connection in [c for c in connections if c.websocket is websocket]:
+            connection.stop()
+            connections.discard(connection)
+        # If nothing is left under this key, remove it to save memory
+        if not connections:
+            del registry[key]
 
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            await websocket.send_text(message)
+    # --- Personal Notification Methods ---
+    async def connect(self, user_id: int, websocket: WebSocket) -> ClientConnection:
+        return await self._register(self.active_connections, user_id, websocket)
 
-    # --- NEW: Room-Based Broadcast Methods ---
-    async def connect_to_room(self, room_name: str, websocket: WebSocket):
+    def disconnect(self, user_id: int, websocket: WebSocket):
+        self._unregister(self.active_connections, user_id, websocket)
+
+    async def send_personal_message(self, message: str, user_id: int, ref: Optional[Reference] = None):
+        """Sends a message to every socket of a user, on every worker. See on_reference for `ref`."""
+        await self._publish("user", user_id, message, ref)
+
+    # --- Room-Based Broadcast Methods ---
+    async def connect_to_room(self, room_name: str, websocket: WebSocket) -> ClientConnection:
         """Connects a WebSocket to a specific room."""
-        await websocket.accept()
-        if room_name not in self.room_connections:
-            self.room_connections[room_name] = []
-        self.room_connections[room_name].append(websocket)
+        return await self._register(self.room_connections, room_name, websocket)
 
     def disconnect_from_room(self, room_name: str, websocket: WebSocket):
         """Disconnects a WebSocket from a room and cleans up if empty."""
-        if room_name in self.room_connections:
-            self.room_connections[room_name].remove(websocket)
-            # If the room is now empty, remove it to save memory
-            if not self.room_connections[room_name]:
-                del self.room_connections[room_name]
-
-    async def broadcast_to_room(self, room_name: str, message: str):
-        """Sends a message to all WebSockets in a specific room."""
-        if room_name in self.room_connections:
-            for connection in self.room_connections[room_name]:
-                await connection.send_text(message)
+        self._unregister(self.room_connections, room_name, websocket)
+
+    async def broadcast_to_room(self, room_name: str, message: str, ref: Optional[Reference] = None):
+        """Sends a message to all WebSockets in a specific room, on every worker. See on_reference for `ref`."""
+        await self._publish("room", room_name, message, ref)
+
+    # --- Cross-Worker Events ---
+    async def start(self):
+        """Starts the listener eagerly, so this worker receives events before any socket connects."""
+        await self._ensure_started()
+
+    def on_reference(self, kind: str, loader: ReferenceLoader):
+        """
+        Registers how to rebuild a message of `kind` from its row id. A message
+        published with ref=(kind, id) that is too large for the backend is sent
+        as that reference, and each worker calls `loader(id)` in a thread to
+        recover it; the loader should open its own session.
+        """
+        self.reference_loaders[kind] = loader
+
+    def on_event(self, name: str, handler: EventHandler):
+        """Registers a handler run on every worker, including the publisher, when `name` is published."""
+        self.event_handlers.setdefault(name, []).append(handler)
+
+    async def publish_event(self, name: str, message: str):
+        await self._publish("event", name, message)
+
+    def publish_event_nowait(self, name: str, message: str):
+        """
+        Publishes an event from sync or async code: scheduled as a task on the
+        running loop, or run through it from a threadpool worker. Outside the web
+        app (workers, scripts) there is no loop and nothing is published.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                anyio.from_thread.run(self.publish_event, name, message)
+            except RuntimeError:
+                pass
+            return
+        task = loop.create_task(self.publish_event(name, message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
 # Create a single instance to be used across the application
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager(create_broadcast_backend())
@@ -1,10 +1,27 @@
 from typing import List, Dict, Any, Optional
 
-from sqlalchemy.orm import Session, contains_eager, selectinload
-from sqlalchemy import func, or_
-import schemas, security, models
+from sqlalchemy.orm import Session, aliased, contains_eager, joinedload, selectinload
+from sqlalchemy import (func, or_, select, any_, bindparam, case, cast, delete, extract, literal, literal_column,
+                        union_all, update, Date, Float, Integer)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+import schemas, security, models, pagination
 from datetime import datetime, timedelta, timezone
 import hashlib
+import math
+import os
+import re
+
+# --- Loader Options ---
+
+# Everything schemas.Media serializes besides plain columns. Each relationship is
+# batch-loaded with one extra `WHERE id IN (...)` query for the whole page instead
+# of one lazy load per card.
+MEDIA_CARD_OPTIONS = (
+    selectinload(models.Media.owner),
+    selectinload(models.Media.tags),
+)
+
 
 # --- User CRUD Functions ---
 
@@ -19,16 +36,32 @@ def get_user_by_email(db: Session, email: str):
 
 
 def get_user_by_username(db: Session, username: str):
-    """Retrieves a single user by their username, preloading related data."""
-    return (
-        db.query(models.User)
-        .options(
-            selectinload(models.User.media).options(selectinload(models.Media.tags)),
-            selectinload(models.User.albums)
-        )
-        .filter(models.User.username == username)
-        .first()
-    )
+    """Retrieves a single user by their username."""
+    return db.query(models.User).filter(models.User.username == username).first()
+
+
+# Columns needed to authorize a request and to describe the caller in responses.
+# hashed_password is deliberately left out so it never sits in the auth cache.
+PRINCIPAL_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.bio,
+    models.User.profile_picture_url,
+    models.User.allow_downloads,
+    models.User.is_admin,
+    models.User.created_at,
+    models.User.updated_at,
+)
+
+
+def get_user_principal(db: Session, username: str) -> Optional[Dict[str, Any]]:
+    """
+    Retrieves only the columns needed to authenticate a user, without loading
+    any of their media, albums or follower counts.
+    """
+    row = db.query(*PRINCIPAL_COLUMNS).filter(models.User.username == username).first()
+    return dict(row._mapping) if row else None
 
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
@@ -55,32 +88,168 @@ def get_user_albums(db: Session, user_id: int) -> List[models.Album]:
     return db.query(models.Album).filter(models.Album.owner_id == user_id).all()
 
 
+def get_user_albums_with_media_count(db: Session, user_id: int) -> List[models.Album]:
+    """
+    Retrieves a user's albums with `media_count` set on each, counted in SQL
+    rather than by loading every album's media list.
+    """
+    rows = (
+        db.query(models.Album, func.count(models.media_albums.c.media_id))
+        .outerjoin(models.media_albums, models.media_albums.c.album_id == models.Album.id)
+        .filter(models.Album.owner_id == user_id)
+        .group_by(models.Album.id)
+        .order_by(models.Album.created_at.desc())
+        .all()
+    )
+    albums = []
+    for album, media_count in rows:
+        album.media_count = media_count
+        albums.append(album)
+    return albums
+
+
+def get_media_count_for_user(db: Session, user_id: int) -> int:
+    """Gets the number of media items a user has uploaded."""
+    return db.query(func.count(models.Media.id)).filter(models.Media.owner_id == user_id).scalar()
+
+
 # --- Leaderboard CRUD Functions ---
 
-def get_top_liked_media(db: Session, limit: int = 10):
+# Leaderboard windows, in UTC days including today. "all" reads the all-time counters.
+LEADERBOARD_WINDOWS = {"day": 1, "week": 7, "month": 30}
+
+
+def _window_totals(window: str, day_column, key_column, count_column, limit: int):
     """
-    Retrieves a list of the most liked media (media and videos).
+    Subquery of the top `limit` keys by their summed daily rollups over `window`:
+    one range scan of the rollup primary key, which leads with `day`.
+    Raises ValueError for an unknown window.
     """
+    if window not in LEADERBOARD_WINDOWS:
+        raise ValueError("Invalid leaderboard window.")
+    start_day = datetime.now(timezone.utc).date() - timedelta(days=LEADERBOARD_WINDOWS[window] - 1)
+    total = func.sum(count_column)
     return (
-        db.query(models.Media)
-        .order_by(models.Media.like_count.desc())
+        select(key_column.label("key"), total.label("total"))
+        .where(day_column >= start_day)
+        .group_by(key_column)
+        .having(total > 0)
+        .order_by(total.desc(), key_column.desc())
         .limit(limit)
+        .subquery()
+    )
+
+
+def get_top_liked_media(db: Session, limit: int = 10, window: str = "all"):
+    """
+    Retrieves a list of the most liked media (media and videos), all-time or by
+    likes received within a leaderboard window. Raises ValueError for an unknown window.
+    """
+    if window == "all":
+        return (
+            db.query(models.Media)
+            .options(*MEDIA_CARD_OPTIONS)
+            .order_by(models.Media.like_count.desc())
+            .limit(limit)
+            .all()
+        )
+    totals = _window_totals(window, models.MediaLikeDaily.day, models.MediaLikeDaily.media_id,
+                            models.MediaLikeDaily.likes, limit)
+    return (
+        db.query(models.Media)
+        .options(*MEDIA_CARD_OPTIONS)
+        .join(totals, totals.c.key == models.Media.id)
+        .order_by(totals.c.total.desc(), models.Media.id.desc())
         .all()
     )
 
 
-def get_most_followed_users(db: Session, limit: int = 10):
+def get_most_followed_users(db: Session, limit: int = 10, window: str = "all"):
     """
-    Retrieves a list of the most followed users. (Unchanged)
+    Retrieves a list of the most followed users, all-time (served by
+    ix_users_followers_count) or by follows gained within a leaderboard window.
+    Raises ValueError for an unknown window.
     """
+    if window == "all":
+        return (
+            db.query(models.User)
+            .order_by(models.User.followers_count.desc(), models.User.id)
+            .limit(limit)
+            .all()
+        )
+    totals = _window_totals(window, models.UserFollowDaily.day, models.UserFollowDaily.user_id,
+                            models.UserFollowDaily.follows, limit)
     return (
         db.query(models.User)
-        .order_by(models.User.followers_count.desc())
-        .limit(limit)
+        .join(totals, totals.c.key == models.User.id)
+        .order_by(totals.c.total.desc(), models.User.id.desc())
         .all()
     )
 
 
+# --- Leaderboard Rollups ---
+
+# Days of rollups kept; must cover the longest leaderboard window.
+ROLLUP_RETENTION_DAYS = int(os.getenv("ROLLUP_RETENTION_DAYS", "35"))
+
+
+def _utc_day(at=None):
+    """SQL expression for the UTC calendar day of `at` (default now())."""
+    # The zone is a literal rather than a bind parameter so repeated uses render identically,
+    # as GROUP BY requires.
+    return cast(func.timezone(literal_column("'UTC'"), at if at is not None else func.now()), Date)
+
+
+def build_daily_rollup(model, key_column: str, key: int, count_column: str, delta: int, at=None):
+    """
+    An upsert adding `delta` to the rollup row for `key` on the UTC day of `at`
+    (default today). Decrements never take a bucket below zero.
+    """
+    table = model.__table__
+    stmt = pg_insert(model).values({"day": _utc_day(at), key_column: key, count_column: max(delta, 0)})
+    return stmt.on_conflict_do_update(
+        index_elements=["day", key_column],
+        set_={count_column: func.greatest(table.c[count_column] + delta, 0)}
+    )
+
+
+def build_like_rollup(media_id: int, delta: int, at=None):
+    return build_daily_rollup(models.MediaLikeDaily, "media_id", media_id, "likes", delta, at)
+
+
+def build_follow_rollup(user_id: int, delta: int, at=None):
+    return build_daily_rollup(models.UserFollowDaily, "user_id", user_id, "follows", delta, at)
+
+
+def rebuild_daily_rollups(db: Session, days: int) -> int:
+    """
+    Recomputes the last `days` UTC days of both rollups from the likes and follows
+    tables, repairing any drift from the incremental updates, and prunes buckets
+    older than ROLLUP_RETENTION_DAYS. Runs in one transaction; returns the number
+    of rollup rows written.
+    """
+    today = datetime.now(timezone.utc).date()
+    start_day = today - timedelta(days=days - 1)
+    start_at = datetime.combine(start_day, datetime.min.time(), tzinfo=timezone.utc)
+    written = 0
+    rollups = (
+        (models.MediaLikeDaily, "media_id", "likes", models.Like, models.Like.media_id),
+        (models.UserFollowDaily, "user_id", "follows", models.Follow, models.Follow.following_id),
+    )
+    for model, key_column, count_column, source, source_key in rollups:
+        db.execute(delete(model).where(model.day >= start_day))
+        rows = (
+            select(_utc_day(source.created_at), source_key, func.count())
+            .where(source.created_at >= start_at)
+            .group_by(_utc_day(source.created_at), source_key)
+        )
+        result = db.execute(pg_insert(model).from_select(["day", key_column, count_column], rows))
+        written += result.rowcount
+        db.execute(delete(model).where(model.day < today - timedelta(days=ROLLUP_RETENTION_DAYS - 1)))
+    db.commit()
+    return written
+
+
 def get_user_followers(db: Session, user_id: int) -> List[models.User]:
     """Retrieves a list of users who follow the given user."""
     return db.query(models.User).join(models.Follow, models.User.id == models.Follow.follower_id).filter(
@@ -117,45 +286,345 @@ def get_media(db: Session, media_id: int):
     return db.query(models.Media).filter(models.Media.id == media_id).first()
 
 
-def get_all_media(db: Session, sort_by: str = "newest", skip: int = 0, limit: int = 20):
+def get_media_card(db: Session, media_id: int):
+    """Retrieves a single media item with everything schemas.Media serializes preloaded."""
+    return db.query(models.Media).options(*MEDIA_CARD_OPTIONS).filter(models.Media.id == media_id).first()
+
+
+def get_media_cards(db: Session, media_ids: List[int]) -> List[models.Media]:
+    """Retrieves several media items by id, in id order, with everything schemas.Media serializes preloaded."""
+    return (
+        db.query(models.Media)
+        .options(*MEDIA_CARD_OPTIONS)
+        .filter(models.Media.id.in_(media_ids))
+        .order_by(models.Media.id)
+        .all()
+    )
+
+
+# Keyset sort columns for each GET /media sort mode; each matches an index in models.Media.
+MEDIA_SORT_COLUMNS = {
+    "newest": (models.Media.created_at, models.Media.id),
+    "featured": (models.Media.created_at, models.Media.id),
+    "popular": (models.Media.like_count, models.Media.created_at, models.Media.id),
+    "trending": (models.Media.trending_score, models.Media.id),
+}
+
+
+def get_all_media(db: Session, sort_by: str = "newest", cursor: Optional[str] = None,
+                  limit: int = 20) -> Dict[str, Any]:
+    """
+    Retrieves a keyset-paginated list of all media, with sorting options.
+    Returns the page of media and an opaque cursor for the next page (None on the last page).
+    Raises ValueError if the cursor is invalid.
+    """
+    if sort_by not in MEDIA_SORT_COLUMNS:
+        sort_by = "newest"
+
+    query = db.query(models.Media).options(*MEDIA_CARD_OPTIONS)
+    if sort_by == "featured":
+        query = query.filter(models.Media.is_featured == True)
+
+    media, next_cursor = pagination.paginate_keyset(
+        query, sort_by, MEDIA_SORT_COLUMNS[sort_by], cursor=cursor, limit=limit
+    )
+    return {"media": media, "next_cursor": next_cursor}
+
+
+def get_media_for_user(db: Session, owner_id: int, cursor: Optional[str] = None,
+                       limit: int = 24) -> Dict[str, Any]:
     """
-    Retrieves a paginated list of all media, with sorting options.
-    NOW HIGHLY EFFICIENT. Like/comment counts come from the model.
+    Retrieves a keyset-paginated list of a user's media, newest first.
+    Raises ValueError if the cursor is invalid.
     """
-    # The complex subqueries are no longer needed!
-    query = db.query(models.Media)
+    query = db.query(models.Media).options(*MEDIA_CARD_OPTIONS).filter(models.Media.owner_id == owner_id)
+    media, next_cursor = pagination.paginate_keyset(
+        query, "newest", MEDIA_SORT_COLUMNS["newest"], cursor=cursor, limit=limit
+    )
+    return {"media": media, "next_cursor": next_cursor}
+
 
-    if sort_by == "popular":
-        query = query.order_by(models.Media.like_count.desc(), models.Media.created_at.desc())
-    elif sort_by == "featured":
-        query = query.filter(models.Media.is_featured == True).order_by(
-            models.Media.created_at.desc()
+def create_media_batch(db: Session, owner_id: int, uploads: list[tuple[str, models.MediaType, Optional[str]]],
+                       caption: str, tags: list[str]) -> list[int]:
+    """
+    Creates one media record per (media_url, media_type, source_key) upload, fans
+    each out to followers' timelines and tags them all, in a single transaction.
+    Uploads with a source_key (the uploaded object in OSS) also get a processing
+    job in that transaction: transcoding for videos, derivatives for images.
+    Returns the new ids in upload order.
+    Raises ValueError if a source_key already backs another media item.
+    """
+    media_items = [
+        models.Media(
+            owner_id=owner_id,
+            media_url=media_url,
+            caption=caption,
+            media_type=media_type,
+            trending_score=trending_event(TRENDING_POST_WEIGHT)
         )
-    else: # "newest"
-        query = query.order_by(models.Media.created_at.desc())
+        for media_url, media_type, _ in uploads
+    ]
+    db.add_all(media_items)
+    db.flush()
+    media_ids = [db_media.id for db_media in media_items]
+    for media_id in media_ids:
+        db.execute(build_timeline_fanout(media_id))
+    db.add_all([
+        models.MediaJob(
+            media_id=media_id,
+            source_key=source_key,
+            kind=(models.MediaJobKind.transcode_video if media_type == models.MediaType.video
+                  else models.MediaJobKind.image_derivatives),
+            max_attempts=MEDIA_JOB_MAX_ATTEMPTS
+        )
+        for media_id, (_, media_type, source_key) in zip(media_ids, uploads) if source_key
+    ])
+    try:
+        db.flush()
+    except IntegrityError:
+        # Two requests completed the same upload at once; ux_media_jobs_source_key let one through.
+        db.rollback()
+        raise ValueError("An upload is already attached to another media item.")
+
+    tag_ids = get_or_create_tag_ids(db, tags=tags)
+    if media_ids and tag_ids:
+        db.execute(build_media_tag_links(media_ids, tag_ids))
+    db.commit()
+    return media_ids
+
+
+def get_used_source_keys(db: Session, source_keys: list[str]) -> set[str]:
+    """Returns the uploaded objects among `source_keys` that already back a media item."""
+    if not source_keys:
+        return set()
+    return set(db.scalars(select(models.MediaJob.source_key).where(models.MediaJob.source_key.in_(source_keys))))
 
-    return query.offset(skip).limit(limit).all()
 
+# --- Media Jobs (see media_worker.py) ---
 
-def create_media(db: Session, owner_id: int, media_url: str, caption: str, media_type: models.MediaType):
-    """Creates a new media record in the database."""
-    db_media = models.Media(
-        owner_id=owner_id,
-        media_url=media_url,
-        caption=caption,
-        media_type=media_type
+MEDIA_JOB_MAX_ATTEMPTS = int(os.getenv("MEDIA_JOB_MAX_ATTEMPTS", "5"))
+# Retry delays double from the base per failed attempt, up to the cap.
+MEDIA_JOB_RETRY_BASE_SECONDS = int(os.getenv("MEDIA_JOB_RETRY_BASE_SECONDS", "30"))
+MEDIA_JOB_RETRY_MAX_SECONDS = int(os.getenv("MEDIA_JOB_RETRY_MAX_SECONDS", "3600"))
+
+MEDIA_JOB_CLAIM_COLUMNS = (
+    models.MediaJob.id,
+    models.MediaJob.media_id,
+    models.MediaJob.source_key,
+    models.MediaJob.kind,
+    models.MediaJob.attempts,
+    models.MediaJob.max_attempts,
+)
+
+
+def claim_media_job(db: Session, worker_id: str):
+    """
+    Locks the next due pending job to `worker_id` and counts the attempt. SKIP
+    LOCKED lets any number of workers poll at once without blocking or claiming
+    the same job. Returns a row of MEDIA_JOB_CLAIM_COLUMNS, or None if nothing is due.
+    """
+    next_job_id = (
+        select(models.MediaJob.id)
+        .where(models.MediaJob.status == models.MediaJobStatus.pending, models.MediaJob.run_after <= func.now())
+        .order_by(models.MediaJob.run_after, models.MediaJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    job = db.execute(
+        update(models.MediaJob)
+        .where(models.MediaJob.id == next_job_id)
+        .values(status=models.MediaJobStatus.running, attempts=models.MediaJob.attempts + 1,
+                locked_by=worker_id, locked_at=func.now())
+        .returning(*MEDIA_JOB_CLAIM_COLUMNS)
+    ).first()
+    db.commit()
+    return job
+
+
+def _owned_media_job(job_id: int, worker_id: str):
+    """An UPDATE of a job that only applies while `worker_id` still holds it."""
+    return update(models.MediaJob).where(
+        models.MediaJob.id == job_id,
+        models.MediaJob.status == models.MediaJobStatus.running,
+        models.MediaJob.locked_by == worker_id,
     )
-    db.add(db_media)
+
+
+def heartbeat_media_job(db: Session, job_id: int, worker_id: str) -> bool:
+    """Refreshes the job's lock; False means it was recovered and the worker should abandon it."""
+    held = db.execute(_owned_media_job(job_id, worker_id).values(locked_at=func.now())).rowcount == 1
+    db.commit()
+    return held
+
+
+def complete_media_job(db: Session, job_id: int, worker_id: str, media_id: int, media_values: dict) -> bool:
+    """
+    Marks the job done and writes its results (e.g. the transcoded media_url, or
+    derivatives and dimensions) to its media row, if the worker still holds it.
+    """
+    held = db.execute(
+        _owned_media_job(job_id, worker_id).values(status=models.MediaJobStatus.done, locked_by=None, last_error=None)
+    ).rowcount == 1
+    if held:
+        db.execute(update(models.Media).where(models.Media.id == media_id).values(media_values))
     db.commit()
-    db.refresh(db_media)
-    return db_media
+    return held
 
 
-def delete_media(db: Session, media: models.Media):
-    """Deletes a media item from the database."""
+def fail_media_job(db: Session, job_id: int, worker_id: str, media_id: int, error: str,
+                   fallback_media_url: Optional[str] = None) -> Optional[models.MediaJobStatus]:
+    """
+    Records a failed attempt. The job goes back to the queue after a backoff
+    delay, or, once it has used all its attempts, fails for good and the media
+    row falls back to `fallback_media_url`, if given, instead of staying "processing".
+    Returns the job's new status, or None if the worker no longer held it.
+    """
+    job = db.query(models.MediaJob).filter(models.MediaJob.id == job_id).first()
+    if job is None or job.status != models.MediaJobStatus.running or job.locked_by != worker_id:
+        db.rollback()
+        return None
+
+    job.last_error = error
+    job.locked_by = None
+    if job.attempts >= job.max_attempts:
+        job.status = models.MediaJobStatus.failed
+        if fallback_media_url:
+            db.execute(update(models.Media).where(models.Media.id == media_id).values(media_url=fallback_media_url))
+    else:
+        delay = min(MEDIA_JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1), MEDIA_JOB_RETRY_MAX_SECONDS)
+        job.status = models.MediaJobStatus.pending
+        job.run_after = func.now() + timedelta(seconds=delay)
+    status = job.status
+    db.commit()
+    return status
+
+
+def recover_stale_media_jobs(db: Session, stale_seconds: int) -> int:
+    """
+    Returns running jobs whose worker stopped heartbeating (crashed, killed,
+    redeployed) to the queue. Jobs that already used every attempt are given up
+    on by the next worker that claims them.
+    """
+    recovered = db.execute(
+        update(models.MediaJob)
+        .where(models.MediaJob.status == models.MediaJobStatus.running,
+               models.MediaJob.locked_at < func.now() - timedelta(seconds=stale_seconds))
+        .values(status=models.MediaJobStatus.pending, locked_by=None, run_after=func.now(),
+                last_error="Worker stopped responding.")
+    ).rowcount
+    db.commit()
+    return recovered
+
+
+def get_latest_media_job(db: Session, media_id: int) -> Optional[models.MediaJob]:
+    """The most recent processing job for a media item, if any."""
+    return (
+        db.query(models.MediaJob)
+        .filter(models.MediaJob.media_id == media_id)
+        .order_by(models.MediaJob.id.desc())
+        .first()
+    )
+
+
+# --- Following Feed ---
+
+# Accounts with more followers than this are not fanned out on write; their posts
+# are merged into their followers' feeds at read time instead.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv("FEED_FANOUT_MAX_FOLLOWERS", "10000"))
+# How many of a followee's most recent posts a new follow copies into the follower's timeline.
+FEED_BACKFILL_LIMIT = int(os.getenv("FEED_BACKFILL_LIMIT", "50"))
+
+TIMELINE_COLUMNS = ["user_id", "media_id", "owner_id", "created_at"]
+
+
+def build_timeline_fanout(media_id: int):
+    """
+    A single INSERT ... SELECT that pushes a media item into the timeline of every
+    follower of its owner, unless the owner has more than FEED_FANOUT_MAX_FOLLOWERS.
+    """
+    rows = (
+        select(models.Follow.follower_id, models.Media.id, models.Media.owner_id, models.Media.created_at)
+        .select_from(models.Media)
+        .join(models.Follow, models.Follow.following_id == models.Media.owner_id)
+        .join(models.User, models.User.id == models.Media.owner_id)
+        .where(models.Media.id == media_id, models.User.followers_count <= FEED_FANOUT_MAX_FOLLOWERS)
+    )
+    return pg_insert(models.TimelineEntry).from_select(TIMELINE_COLUMNS, rows).on_conflict_do_nothing()
+
+
+def build_timeline_backfill(follower_id: int, following_id: int):
+    """An INSERT ... SELECT copying the followee's recent posts into a new follower's timeline."""
+    rows = (
+        select(literal(follower_id, Integer), models.Media.id, models.Media.owner_id, models.Media.created_at)
+        .select_from(models.Media)
+        .join(models.User, models.User.id == models.Media.owner_id)
+        .where(models.Media.owner_id == following_id,
+               models.User.followers_count <= FEED_FANOUT_MAX_FOLLOWERS)
+        .order_by(models.Media.created_at.desc(), models.Media.id.desc())
+        .limit(FEED_BACKFILL_LIMIT)
+    )
+    return pg_insert(models.TimelineEntry).from_select(TIMELINE_COLUMNS, rows).on_conflict_do_nothing()
+
+
+def build_timeline_removal(follower_id: int, following_id: int):
+    """A DELETE removing an unfollowed account's posts from the follower's timeline."""
+    return delete(models.TimelineEntry).where(
+        models.TimelineEntry.user_id == follower_id,
+        models.TimelineEntry.owner_id == following_id
+    )
+
+
+def get_following_feed(db: Session, user_id: int, cursor: Optional[str] = None,
+                       limit: int = 20) -> Dict[str, Any]:
+    """
+    Retrieves a keyset-paginated page of media from the accounts a user follows,
+    newest first. Fanned-out posts come from a range scan of the user's timeline;
+    posts by accounts over FEED_FANOUT_MAX_FOLLOWERS are read from media directly
+    and merged in. Raises ValueError if the cursor is invalid.
+    """
+    large_followees = (
+        select(models.Follow.following_id)
+        .join(models.User, models.User.id == models.Follow.following_id)
+        .where(models.Follow.follower_id == user_id,
+               models.User.followers_count > FEED_FANOUT_MAX_FOLLOWERS)
+    )
+    fanned_out = (
+        select(models.TimelineEntry.created_at.label("created_at"),
+               models.TimelineEntry.media_id.label("media_id"))
+        .where(models.TimelineEntry.user_id == user_id,
+               models.TimelineEntry.owner_id.notin_(large_followees))
+    )
+    pulled = (
+        select(models.Media.created_at.label("created_at"), models.Media.id.label("media_id"))
+        .where(models.Media.owner_id.in_(large_followees))
+    )
+    feed = union_all(fanned_out, pulled).subquery("feed")
+
+    rows, next_cursor = pagination.paginate_keyset(
+        db.query(feed.c.created_at, feed.c.media_id), "feed", (feed.c.created_at, feed.c.media_id),
+        cursor=cursor, limit=limit
+    )
+    cards = {media.id: media for media in get_media_cards(db, media_ids=[row.media_id for row in rows])}
+    return {"media": [cards[row.media_id] for row in rows if row.media_id in cards], "next_cursor": next_cursor}
+
+
+def delete_media(db: Session, media: models.Media) -> List[str]:
+    """
+    Deletes a media item and its processing jobs in one transaction, so no worker
+    claims them afterwards; one mid-run finds its job gone and drops its output.
+    Returns the uploaded objects of unfinished video jobs, which the media row does
+    not reference yet and which the caller must delete from OSS as well.
+    """
+    jobs = db.execute(
+        delete(models.MediaJob)
+        .where(models.MediaJob.media_id == media.id)
+        .returning(models.MediaJob.source_key, models.MediaJob.kind, models.MediaJob.status)
+    ).all()
     db.delete(media)
     db.commit()
-    return True
+    return [job.source_key for job in jobs
+            if job.kind == models.MediaJobKind.transcode_video and job.status != models.MediaJobStatus.done]
 
 
 def update_media(db: Session, media: models.Media, media_update: schemas.MediaUpdate) -> models.Media:
@@ -168,36 +637,123 @@ def update_media(db: Session, media: models.Media, media_update: schemas.MediaUp
     return media
 
 
-# --- Tag CRUD Functions ---
+def _bump_media_counter(db: Session, media_id: int, counter, delta: int, trending=None):
+    """
+    Atomically adjusts one of the denormalized counters on a media row as part of
+    the caller's transaction, so the counter commits or rolls back with the row
+    that caused it. A `trending` update (see trending_increment) is applied in the
+    same UPDATE.
+    """
+    db.query(models.Media).filter(models.Media.id == media_id).update(
+        media_counter_values(counter, delta, trending), synchronize_session=False
+    )
 
-def get_tag_by_name(db: Session, tag_name: str):
-    """Retrieves a single tag by its name."""
-    return db.query(models.Tag).filter(models.Tag.name == tag_name).first()
 
+def media_counter_values(counter, delta: int, trending=None) -> dict:
+    """The SET clause shared by the sync and async counter bumps."""
+    values = {counter: counter + delta}
+    if trending is not None:
+        values[models.Media.trending_score] = trending
+    return values
 
-def get_or_create_tags(db: Session, tags: list[str]) -> list[models.Tag]:
-    """For a list of tag names, retrieves existing tags or creates new ones."""
-    tag_models = []
-    tags_to_create = []
-    for tag_name in set(t.strip().lower() for t in tags if t.strip()):
-        db_tag = get_tag_by_name(db, tag_name)
-        if db_tag:
-            tag_models.append(db_tag)
-        else:
-            tags_to_create.append(models.Tag(name=tag_name))
 
-    if tags_to_create:
-        db.add_all(tags_to_create)
-        db.commit()
-        tag_models.extend(tags_to_create)
+# --- Trending ---
+
+# Engagement halves in weight every TRENDING_HALF_LIFE_HOURS.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_POST_WEIGHT = 1.0
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 2.0
+
+
+def trending_event(weight: float, at=None):
+    """
+    SQL expression for the log-domain score of a single event of `weight` (> 0) at
+    time `at` (default now()): log2(weight) + at / half-life, with `at` in Unix
+    seconds. It is also the starting score of a new post.
+    """
+    event_time = at if at is not None else func.now()
+    return math.log2(weight) + cast(extract("epoch", event_time), Float) / (TRENDING_HALF_LIFE_HOURS * 3600)
 
-    return tag_models
 
+def trending_increment(weight: float, at=None):
+    """
+    SQL expression for media.trending_score after an event of `weight` at time `at`;
+    a negative weight removes an event again (unlike, comment delete), so pass the
+    original event time. Scores are log2 of the decayed engagement against a fixed
+    epoch (see migration 022), so an event only ever touches its own row and no
+    stored score ever needs rebasing.
+    """
+    combine = func.trending_log_add if weight > 0 else func.trending_log_sub
+    return combine(models.Media.trending_score, trending_event(abs(weight), at))
 
-def associate_tags_with_media(db: Session, media: models.Media, tags: list[models.Tag]):
-    """Associates a list of Tag models with a Media model."""
-    media.tags.extend(tag for tag in tags if tag not in media.tags)
+
+def reconcile_media_counters(db: Session, start_id: int, end_id: int) -> int:
+    """
+    Recomputes like_count and comment_count from the likes and comments tables
+    for media ids in [start_id, end_id), touching only rows that have drifted.
+    Returns the number of rows that were corrected.
+    """
+    like_counts = (
+        select(func.count(models.Like.user_id))
+        .where(models.Like.media_id == models.Media.id)
+        .scalar_subquery()
+    )
+    comment_counts = (
+        select(func.count(models.Comment.id))
+        .where(models.Comment.media_id == models.Media.id)
+        .scalar_subquery()
+    )
+    corrected = (
+        db.query(models.Media)
+        .filter(
+            models.Media.id >= start_id,
+            models.Media.id < end_id,
+            or_(models.Media.like_count != like_counts, models.Media.comment_count != comment_counts)
+        )
+        .update(
+            {models.Media.like_count: like_counts, models.Media.comment_count: comment_counts},
+            synchronize_session=False
+        )
+    )
     db.commit()
+    return corrected
+
+
+# --- Tag CRUD Functions ---
+
+def get_tag_by_name(db: Session, tag_name: str):
+    """Retrieves a single tag by its name."""
+    return db.query(models.Tag).filter(models.Tag.name == tag_name).first()
+
+
+def get_or_create_tag_ids(db: Session, tags: list[str]) -> list[int]:
+    """
+    Resolves tag names to ids, creating any that are missing, in a single
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement. The no-op update
+    makes existing rows come back in RETURNING too, and lets concurrent uploads
+    creating the same tag wait on each other instead of failing on the unique index.
+    Names are inserted in sorted order so concurrent upserts lock rows in the same
+    order. Does not commit; the ids are valid within the caller's transaction.
+    """
+    names = sorted({t.strip().lower() for t in tags if t.strip()})
+    if not names:
+        return []
+    stmt = pg_insert(models.Tag).values([{"name": name} for name in names])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Tag.name],
+        set_={"name": stmt.excluded.name}
+    ).returning(models.Tag.id)
+    return list(db.execute(stmt).scalars())
+
+
+def build_media_tag_links(media_ids: list[int], tag_ids: list[int]):
+    """A single bulk insert linking every given media item to every given tag."""
+    return (
+        pg_insert(models.media_tags)
+        .values([{"media_id": media_id, "tag_id": tag_id} for media_id in media_ids for tag_id in tag_ids])
+        .on_conflict_do_nothing()
+    )
 
 
 # --- Comment CRUD Functions ---
@@ -210,6 +766,8 @@ def create_comment(db: Session, comment: schemas.CommentCreate, media_id: int, a
         author_id=author_id
     )
     db.add(db_comment)
+    _bump_media_counter(db, media_id, models.Media.comment_count, 1,
+                        trending=trending_increment(TRENDING_COMMENT_WEIGHT))
     db.commit()
     db.refresh(db_comment)
     return db_comment
@@ -238,6 +796,9 @@ def create_like(db: Session, user_id: int, media_id: int):
     """Creates a like record."""
     db_like = models.Like(user_id=user_id, media_id=media_id)
     db.add(db_like)
+    _bump_media_counter(db, media_id, models.Media.like_count, 1,
+                        trending=trending_increment(TRENDING_LIKE_WEIGHT))
+    db.execute(build_like_rollup(media_id, 1))
     db.commit()
     db.refresh(db_like)
     return db_like
@@ -246,10 +807,31 @@ def create_like(db: Session, user_id: int, media_id: int):
 def delete_like(db: Session, like: models.Like):
     """Deletes a like record."""
     db.delete(like)
+    _bump_media_counter(db, like.media_id, models.Media.like_count, -1,
+                        trending=trending_increment(-TRENDING_LIKE_WEIGHT, at=like.created_at))
+    db.execute(build_like_rollup(like.media_id, -1, at=like.created_at))
     db.commit()
     return True
 
 
+def get_liked_media_ids(db: Session, user_id: int, media_ids: List[int]) -> set[int]:
+    """
+    Returns the subset of `media_ids` the user has liked, using a single
+    `media_id = ANY(:media_ids)` query regardless of how many ids are passed.
+    """
+    if not media_ids:
+        return set()
+    rows = (
+        db.query(models.Like.media_id)
+        .filter(
+            models.Like.user_id == user_id,
+            models.Like.media_id == any_(bindparam("media_ids", list(media_ids), type_=ARRAY(Integer)))
+        )
+        .all()
+    )
+    return {media_id for (media_id,) in rows}
+
+
 def get_like_count_for_media(db: Session, media_id: int) -> int:
     """Gets the total number of likes for a media item."""
     return db.query(models.Like).filter(models.Like.media_id == media_id).count()
@@ -268,6 +850,9 @@ def create_follow(db: Session, follower_id: int, following_id: int):
     """Creates a follow relationship."""
     db_follow = models.Follow(follower_id=follower_id, following_id=following_id)
     db.add(db_follow)
+    db.execute(build_follow_counters_update(follower_id, following_id, 1))
+    db.execute(build_follow_rollup(following_id, 1))
+    db.execute(build_timeline_backfill(follower_id, following_id))
     db.commit()
     db.refresh(db_follow)
     return db_follow
@@ -276,9 +861,64 @@ def create_follow(db: Session, follower_id: int, following_id: int):
 def delete_follow(db: Session, follow: models.Follow):
     """Deletes a follow relationship."""
     db.delete(follow)
+    db.execute(build_follow_counters_update(follow.follower_id, follow.following_id, -1))
+    db.execute(build_follow_rollup(follow.following_id, -1, at=follow.created_at))
+    db.execute(build_timeline_removal(follow.follower_id, follow.following_id))
     db.commit()
     return True
 
+
+def build_follow_counters_update(follower_id: int, following_id: int, delta: int):
+    """
+    Adjusts following_count on the follower and followers_count on the followed
+    user in one statement. Both rows are locked by a single primary-key scan in
+    id order, so A following B while B follows A cannot deadlock.
+    """
+    return (
+        update(models.User)
+        .where(models.User.id.in_([follower_id, following_id]))
+        .values(
+            following_count=case((models.User.id == follower_id, models.User.following_count + delta),
+                                 else_=models.User.following_count),
+            followers_count=case((models.User.id == following_id, models.User.followers_count + delta),
+                                 else_=models.User.followers_count),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_user_follow_counters(db: Session, start_id: int, end_id: int) -> int:
+    """
+    Recomputes followers_count and following_count from the follows table for
+    user ids in [start_id, end_id), touching only rows that have drifted.
+    Returns the number of rows that were corrected.
+    """
+    followers_counts = (
+        select(func.count(models.Follow.follower_id))
+        .where(models.Follow.following_id == models.User.id)
+        .scalar_subquery()
+    )
+    following_counts = (
+        select(func.count(models.Follow.following_id))
+        .where(models.Follow.follower_id == models.User.id)
+        .scalar_subquery()
+    )
+    corrected = (
+        db.query(models.User)
+        .filter(
+            models.User.id >= start_id,
+            models.User.id < end_id,
+            or_(models.User.followers_count != followers_counts,
+                models.User.following_count != following_counts)
+        )
+        .update(
+            {models.User.followers_count: followers_counts, models.User.following_count: following_counts},
+            synchronize_session=False
+        )
+    )
+    db.commit()
+    return corrected
+
 def get_follower_count_for_user(db: Session, user_id: int) -> int:
     """Gets the number of followers a user has."""
     return db.query(models.Follow).filter(models.Follow.following_id == user_id).count()
@@ -322,6 +962,19 @@ def get_album(db: Session, album_id: int):
     return db.query(models.Album).filter(models.Album.id == album_id).first()
 
 
+def get_album_with_media(db: Session, album_id: int):
+    """Retrieves a single album with its owner and media cards preloaded, for serialization."""
+    return (
+        db.query(models.Album)
+        .options(
+            selectinload(models.Album.owner),
+            selectinload(models.Album.media).options(*MEDIA_CARD_OPTIONS)
+        )
+        .filter(models.Album.id == album_id)
+        .first()
+    )
+
+
 def delete_album(db: Session, album: models.Album):
     """Deletes an album from the database."""
     db.delete(album)
@@ -345,36 +998,138 @@ def remove_media_from_album(db: Session, media: models.Media, album: models.Albu
     return album
 
 
-# --- NEW SEARCH FUNCTION ---
+# --- Version Stamps (HTTP conditional requests) ---
+# Each returns a small tuple of trigger-maintained timestamps (migration 024)
+# that changes whenever the serialized resource does, fetched with indexed
+# lookups only, or None if the resource does not exist. A viewer's own likes
+# and follows bump counters on the stamped rows, so the viewer-dependent
+# fields are covered as well.
+
+def get_media_version(db: Session, media_id: int):
+    """(media.updated_at, owner.updated_at) for GET /media/{id}."""
+    return db.execute(
+        select(models.Media.updated_at, models.User.updated_at)
+        .join(models.User, models.User.id == models.Media.owner_id)
+        .where(models.Media.id == media_id)
+    ).first()
+
+
+def _epoch_sum(column):
+    # Sums change on any single update, even one whose timestamp is not the newest.
+    return func.coalesce(func.sum(extract("epoch", column)), 0)
+
+
+def get_album_version(db: Session, album_id: int):
+    """Album and owner stamps plus an aggregate over the album's media and their owners."""
+    owner = aliased(models.User)
+    media = aliased(models.Media)
+    media_owner = aliased(models.User)
+    return db.execute(
+        select(
+            models.Album.updated_at,
+            owner.updated_at,
+            func.count(media.id),
+            func.max(func.greatest(media.updated_at, media_owner.updated_at)),
+            _epoch_sum(media.updated_at) + _epoch_sum(media_owner.updated_at),
+        )
+        .join(owner, owner.id == models.Album.owner_id)
+        .outerjoin(models.media_albums, models.media_albums.c.album_id == models.Album.id)
+        .outerjoin(media, media.id == models.media_albums.c.media_id)
+        .outerjoin(media_owner, media_owner.id == media.owner_id)
+        .where(models.Album.id == album_id)
+        .group_by(models.Album.id, owner.updated_at)
+    ).first()
+
+
+def get_profile_version(db: Session, username: str):
+    """User stamp, media count and an aggregate over the user's albums for GET /users/profile/{username}."""
+    media_count = (
+        select(func.count(models.Media.id))
+        .where(models.Media.owner_id == models.User.id)
+        .scalar_subquery()
+    )
+    album_count = (
+        select(func.count(models.Album.id))
+        .where(models.Album.owner_id == models.User.id)
+        .scalar_subquery()
+    )
+    album_stamp = (
+        select(_epoch_sum(models.Album.updated_at))
+        .where(models.Album.owner_id == models.User.id)
+        .scalar_subquery()
+    )
+    return db.execute(
+        select(models.User.updated_at, media_count, album_count, album_stamp)
+        .where(models.User.username == username)
+    ).first()
 
-def search_content(db: Session, query: str, limit: int = 20):
+
+# --- Search Functions ---
+
+SEARCH_CONFIG = "simple"
+
+
+def _prefix_tsquery(query: str) -> Optional[str]:
     """
-    Searches for users by username and media by caption or tag.
+    Turns free text into a tsquery string that matches every word as a prefix,
+    e.g. "class of 20" -> "class:* & of:* & 20:*". Returns None if there are no words.
+    Only word characters survive, so user input can never break tsquery syntax.
     """
-    search_term = f"%{query.lower()}%"
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
 
-    users = (
-        db.query(models.User)
-        .filter(models.User.username.ilike(search_term))
-        .limit(limit)
-        .all()
-    )
 
-    media_items = (
-        db.query(models.Media)
-        .outerjoin(models.Media.tags)
-        .filter(
-            or_(
-                models.Media.caption.ilike(search_term),
-                models.Tag.name.ilike(search_term)
-            )
+def _contains_pattern(query: str) -> str:
+    """Builds an escaped ILIKE '%query%' pattern, served by the trigram indexes."""
+    escaped = query.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_content(db: Session, query: str, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    """
+    Searches users by username, tags by name and media by caption and tag names.
+    Users and tags use pg_trgm indexes and are ordered by similarity; they are only
+    returned with the first page. Media uses the full-text index on
+    media.search_vector, ranked by relevance and keyset-paginated on (rank, id).
+    Raises ValueError if the cursor is invalid.
+    """
+    users, tags = [], []
+    if cursor is None:
+        pattern = _contains_pattern(query)
+        users = (
+            db.query(models.User)
+            .filter(models.User.username.ilike(pattern))
+            .order_by(func.similarity(models.User.username, query).desc(), models.User.id)
+            .limit(limit)
+            .all()
+        )
+        tags = (
+            db.query(models.Tag)
+            .filter(models.Tag.name.ilike(pattern))
+            .order_by(func.similarity(models.Tag.name, query).desc(), models.Tag.id)
+            .limit(limit)
+            .all()
         )
-        .distinct(models.Media.id)
-        .limit(limit)
-        .all()
-    )
 
-    return {"users": users, "media": media_items}
+    tsquery_text = _prefix_tsquery(query)
+    if tsquery_text is None:
+        return {"users": users, "tags": tags, "media": [], "next_cursor": None}
+
+    tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+    # Cast to double precision so the rank round-trips exactly through the cursor.
+    rank = cast(func.ts_rank_cd(models.Media.search_vector, tsquery), Float)
+    media_query = (
+        db.query(models.Media, rank.label("rank"))
+        .options(*MEDIA_CARD_OPTIONS)
+        .filter(models.Media.search_vector.op("@@")(tsquery))
+    )
+    rows, next_cursor = pagination.paginate_keyset(
+        media_query, "search", (rank, models.Media.id), cursor=cursor, limit=limit,
+        key_of=lambda row: [row.rank, row.Media.id]
+    )
+    return {"users": users, "tags": tags, "media": [row.Media for row in rows], "next_cursor": next_cursor}
 
 
 def get_notification(db: Session, notification_id: int):
@@ -469,6 +1224,8 @@ def get_comment(db: Session, comment_id: int) -> models.Comment:
 def delete_comment(db: Session, comment: models.Comment):
     """Deletes a comment from the database."""
     db.delete(comment)
+    _bump_media_counter(db, comment.media_id, models.Media.comment_count, -1,
+                        trending=trending_increment(-TRENDING_COMMENT_WEIGHT, at=comment.created_at))
     db.commit()
     return True
 
@@ -561,6 +1318,57 @@ def create_message(db: Session, sender_id: int, conversation_id: int, content: s
     return db_message
 
 
+def create_chat_message(db: Session, sender_id: int, conversation_id: int, content: str,
+                        participant_ids: List[int]) -> tuple[models.Message, list[models.Notification]]:
+    """
+    Saves a chat message together with a chat_message notification for every other
+    participant in a single transaction, then re-reads them with sender/actor loaded
+    so they can be serialized without further queries.
+    """
+    db_message = models.Message(sender_id=sender_id, conversation_id=conversation_id, content=content)
+    db_notifications = [
+        models.Notification(
+            recipient_id=participant_id,
+            actor_id=sender_id,
+            type=models.NotificationType.chat_message,
+            related_entity_id=conversation_id  # The related entity is the conversation itself
+        )
+        for participant_id in participant_ids if participant_id != sender_id
+    ]
+    db.add(db_message)
+    db.add_all(db_notifications)
+    db.flush()
+    message_id = db_message.id
+    notification_ids = [notification.id for notification in db_notifications]
+    db.commit()
+
+    db_message = (
+        db.query(models.Message)
+        .options(joinedload(models.Message.sender))
+        .filter(models.Message.id == message_id)
+        .one()
+    )
+    db_notifications = []
+    if notification_ids:
+        db_notifications = (
+            db.query(models.Notification)
+            .options(joinedload(models.Notification.actor))
+            .filter(models.Notification.id.in_(notification_ids))
+            .all()
+        )
+    return db_message, db_notifications
+
+
+def get_message(db: Session, message_id: int) -> Optional[models.Message]:
+    """Retrieves a single chat message by its ID, with its sender loaded."""
+    return (
+        db.query(models.Message)
+        .options(joinedload(models.Message.sender))
+        .filter(models.Message.id == message_id)
+        .first()
+    )
+
+
 def get_user_conversations(db: Session, user_id: int) -> list[type[models.Conversation]]:
     """
     Retrieves all conversations a given user is a part of.
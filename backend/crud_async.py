@@ -0,0 +1,143 @@
+"""
+Async variants of the hot crud functions, for `async def` handlers running on
+database_manager.AsyncSessionLocal. They mirror the functions of the same name in
+crud.py, but load every relationship the caller serializes up front, since lazy
+loading is not available under asyncio.
+"""
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+import crud, models, schemas
+
+
+# --- User Functions ---
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    """Retrieves a single user by their ID."""
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
+
+
+# --- Media Functions ---
+
+async def get_media(db: AsyncSession, media_id: int) -> Optional[models.Media]:
+    """Retrieves a single media item by its ID."""
+    return await db.scalar(select(models.Media).where(models.Media.id == media_id))
+
+
+async def get_media_with_owner(db: AsyncSession, media_id: int) -> Optional[models.Media]:
+    """Retrieves a single media item with its owner loaded."""
+    return await db.scalar(
+        select(models.Media).options(joinedload(models.Media.owner)).where(models.Media.id == media_id)
+    )
+
+
+async def _bump_media_counter(db: AsyncSession, media_id: int, counter, delta: int, trending=None):
+    """
+    Atomically adjusts a denormalized counter, and optionally the trending score,
+    on a media row within the caller's transaction.
+    """
+    await db.execute(
+        update(models.Media).where(models.Media.id == media_id)
+        .values(crud.media_counter_values(counter, delta, trending))
+    )
+
+
+# --- Comment Functions ---
+
+async def create_comment(db: AsyncSession, comment: schemas.CommentCreate, media_id: int,
+                         author_id: int) -> models.Comment:
+    """Creates a new comment on a media item and returns it with its author loaded."""
+    db_comment = models.Comment(**comment.model_dump(), media_id=media_id, author_id=author_id)
+    db.add(db_comment)
+    await _bump_media_counter(db, media_id, models.Media.comment_count, 1,
+                              trending=crud.trending_increment(crud.TRENDING_COMMENT_WEIGHT))
+    await db.flush()
+    comment_id = db_comment.id
+    await db.commit()
+    return await db.scalar(
+        select(models.Comment)
+        .options(joinedload(models.Comment.author))
+        .where(models.Comment.id == comment_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+# --- Like Functions ---
+
+async def get_like(db: AsyncSession, user_id: int, media_id: int) -> Optional[models.Like]:
+    """Checks if a specific like exists."""
+    return await db.scalar(
+        select(models.Like).where(models.Like.user_id == user_id, models.Like.media_id == media_id)
+    )
+
+
+async def create_like(db: AsyncSession, user_id: int, media_id: int) -> models.Like:
+    """Creates a like record."""
+    db_like = models.Like(user_id=user_id, media_id=media_id)
+    db.add(db_like)
+    await _bump_media_counter(db, media_id, models.Media.like_count, 1,
+                              trending=crud.trending_increment(crud.TRENDING_LIKE_WEIGHT))
+    await db.execute(crud.build_like_rollup(media_id, 1))
+    await db.commit()
+    return db_like
+
+
+# --- Follow Functions ---
+
+async def get_follow(db: AsyncSession, follower_id: int, following_id: int) -> Optional[models.Follow]:
+    """Checks if a follow relationship exists."""
+    return await db.scalar(
+        select(models.Follow).where(models.Follow.follower_id == follower_id,
+                                    models.Follow.following_id == following_id)
+    )
+
+
+async def create_follow(db: AsyncSession, follower_id: int, following_id: int) -> models.Follow:
+    """Creates a follow relationship."""
+    db_follow = models.Follow(follower_id=follower_id, following_id=following_id)
+    db.add(db_follow)
+    await db.execute(crud.build_follow_counters_update(follower_id, following_id, 1))
+    await db.execute(crud.build_follow_rollup(following_id, 1))
+    await db.execute(crud.build_timeline_backfill(follower_id, following_id))
+    await db.commit()
+    return db_follow
+
+
+async def delete_follow(db: AsyncSession, follow: models.Follow):
+    """Deletes a follow relationship."""
+    await db.delete(follow)
+    await db.execute(crud.build_follow_counters_update(follow.follower_id, follow.following_id, -1))
+    await db.execute(crud.build_follow_rollup(follow.following_id, -1, at=follow.created_at))
+    await db.execute(crud.build_timeline_removal(follow.follower_id, follow.following_id))
+    await db.commit()
+    return True
+
+
+# --- Notification Functions ---
+
+async def create_notification(db: AsyncSession, recipient_id: int, actor_id: int,
+                              type: models.NotificationType,
+                              related_entity_id: int) -> Optional[models.Notification]:
+    """Creates a notification for a user action and returns it with its actor loaded."""
+    if recipient_id == actor_id:
+        return None
+
+    db_notification = models.Notification(
+        recipient_id=recipient_id,
+        actor_id=actor_id,
+        type=type,
+        related_entity_id=related_entity_id
+    )
+    db.add(db_notification)
+    await db.flush()
+    notification_id = db_notification.id
+    await db.commit()
+    return await db.scalar(
+        select(models.Notification)
+        .options(joinedload(models.Notification.actor))
+        .where(models.Notification.id == notification_id)
+        .execution_options(populate_existing=True)
+    )
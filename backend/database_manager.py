@@ -1,8 +1,19 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
+import admission_manager, metrics_manager
+
 load_dotenv(dotenv_path="../.env")
 
 DB_USER = os.getenv("DB_USER")
@@ -18,18 +29,235 @@ SQLALCHEMY_DATABASE_URL = (
     f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# Pool sizing, per worker process and per engine. Every sync handler borrows a
+# threadpool slot and a connection, so the pool should roughly match the
+# concurrency admitted by ADMISSION_MAX_CONCURRENCY below.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+# Seconds a request may wait for a connection before failing fast with a 503,
+# well inside gunicorn's 120 s timeout.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "280"))  # Slightly less than the typical 5-minute (300s) timeout
+
+
+def _instrumented(pool_class, name: str):
+    """
+    Returns a subclass of `pool_class` that records how long each checkout waited
+    for a connection, and how many gave up after the pool timeout.
+    """
+    metrics_manager.register_pool(name)
+    wait_histogram = metrics_manager.pool_wait_seconds[name]
+    timeouts = metrics_manager.pool_timeouts[name]
+
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                timeouts.inc()
+                raise
+            finally:
+                wait_histogram.observe(time.perf_counter() - started)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_recycle=280,  # Slightly less than the typical 5-minute (300s) timeout
+    poolclass=_instrumented(QueuePool, "primary"),
+    pool_recycle=DB_POOL_RECYCLE,
     pool_pre_ping=True, # Checks if the connection is alive before using it, crucial for this error
-    pool_size=2,       # The number of connections to keep open in the pool
-    max_overflow=1    # The number of extra connections that can be opened
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT
 )
 
+# Async engine for `async def` handlers: queries are awaited on the event loop
+# through asyncpg instead of blocking it or taking a threadpool slot.
+ASYNC_SQLALCHEMY_DATABASE_URL = (
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    poolclass=_instrumented(AsyncAdaptedQueuePool, "primary_async"),
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT
+)
+
+
+# --- Read Replica ---
+# Optional streaming replica for read-only handlers (see get_read_db). Unset, every
+# read goes to the primary as before.
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+# Reads fall back to the primary while the replica is further behind than this.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# How often each worker re-checks replica lag.
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+# After a user's own write, their reads stay on the primary for this long.
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+READ_PRIMARY_COOKIE = "read_primary"
+
+replica_engine = None
+if DB_REPLICA_URL:
+    replica_engine = create_engine(
+        DB_REPLICA_URL,
+        poolclass=_instrumented(QueuePool, "replica"),
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT
+    )
+
+# Age of the last transaction the replica replayed. A replica that stops
+# receiving WAL keeps ageing, so it cannot look healthy; NULL (not a standby, or
+# nothing replayed yet) is treated as unusable. While the primary sees no writes
+# at all this also grows, which only sends reads back to the idle primary.
+REPLICA_LAG_SQL = text("SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())")
+
+
+class ReplicaHealth:
+    """
+    Per-worker cache of the replica's lag, refreshed at most every
+    REPLICA_LAG_CHECK_SECONDS. One request runs each check; the others read the
+    last result instead of waiting on the round-trip.
+    """
+    def __init__(self):
+        self.lag_seconds: Optional[float] = None
+        self.usable = False
+        self._checked_at = 0.0
+        self._checking = False
+        self._lock = threading.Lock()
+
+    def is_usable(self) -> bool:
+        with self._lock:
+            due = not self._checking and time.monotonic() - self._checked_at >= REPLICA_LAG_CHECK_SECONDS
+            if due:
+                self._checking = True
+                self._checked_at = time.monotonic()
+        if due:
+            try:
+                self._check()
+            finally:
+                with self._lock:
+                    self._checking = False
+        return self.usable
+
+    def _check(self):
+        try:
+            with replica_engine.connect() as connection:
+                lag = connection.execute(REPLICA_LAG_SQL).scalar()
+        except exc.SQLAlchemyError as e:
+            print(f"{datetime.now()}: Replica lag check failed, reading from primary: {e}")
+            self.lag_seconds, self.usable = None, False
+            return
+        if lag is None:
+            print(f"{datetime.now()}: Replica reports no replayed transactions, reading from primary.")
+            self.lag_seconds, self.usable = None, False
+            return
+        self.lag_seconds = float(lag)
+        self.usable = self.lag_seconds <= REPLICA_MAX_LAG_SECONDS
+        if not self.usable:
+            print(f"{datetime.now()}: Replica is {self.lag_seconds:.1f}s behind, reading from primary.")
+
+
+replica_health = ReplicaHealth()
+
+
+def pool_status() -> Dict[str, Dict]:
+    """Current occupancy and wait-time metrics for each engine's connection pool."""
+    pools = [("primary", engine.pool), ("primary_async", async_engine.pool)]
+    if replica_engine is not None:
+        pools.append(("replica", replica_engine.pool))
+    status = {}
+    for name, pool in pools:
+        status[name] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "timeouts": metrics_manager.pool_timeouts[name].value,
+            "wait_seconds": metrics_manager.pool_wait_seconds[name].snapshot(),
+        }
+    if replica_engine is not None:
+        status["replica"]["lag_seconds"] = replica_health.lag_seconds
+    return status
+
+
+# --- Query Counting ---
+# Counts every statement sent to the database within a `count_queries()` block,
+# including statements run from threadpool workers spawned inside it.
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+if replica_engine is not None:
+    event.listen(replica_engine, "before_cursor_execute", _count_query)
+
+
+@contextmanager
+def count_queries():
+    """
+    Context manager yielding a QueryCounter, e.g. to assert that an endpoint's
+    query count stays constant regardless of how many rows it returns.
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
-def get_db():
+
+
+# --- Admission Control ---
+# Caps how many requests per worker hold a sync session at once, so bursts get a
+# fast 503 + Retry-After (see main.py) instead of queueing on the pool. The slot
+# is taken by the session dependencies, after the request body has been read, so
+# request bodies in flight, websockets and async handlers never occupy one; nor
+# does POST /media, which streams files to OSS before opening its own session.
+# Defaults to the pool's total capacity; set ADMISSION_MAX_CONCURRENCY=0 to disable.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1"))
+
+admission = admission_manager.AdmissionController(ADMISSION_MAX_CONCURRENCY, ADMISSION_QUEUE_TIMEOUT)
+
+
+async def admission_slot():
+    """
+    FastAPI dependency that holds an admission slot for the rest of the request.
+    Raises admission_manager.AdmissionRejected when none frees up in time.
+    """
+    if not ADMISSION_MAX_CONCURRENCY:
+        yield
+        return
+    async with admission:
+        yield
+
+
+def get_db(_slot=Depends(admission_slot)):
     """
     FastAPI dependency that provides a SQLAlchemy database session.
     It ensures the session is always closed after the request.
@@ -38,4 +266,40 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine) if replica_engine else None
+
+
+def get_read_db(request: Request, _slot=Depends(admission_slot)):
+    """
+    FastAPI dependency for read-only handlers. Provides a session on the replica
+    when one is configured and within REPLICA_MAX_LAG_SECONDS, unless the caller
+    wrote recently (READ_PRIMARY_COOKIE), in which case it reads from the primary
+    so they see their own changes. Never write through this session.
+    """
+    use_replica = (
+        ReplicaSessionLocal is not None
+        and READ_PRIMARY_COOKIE not in request.cookies
+        and replica_health.is_usable()
+    )
+    db = ReplicaSessionLocal() if use_replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Objects stay loaded after commit so handlers can serialize them without
+# triggering an implicit (and, under asyncio, illegal) refresh.
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db():
+    """
+    FastAPI dependency that provides an async SQLAlchemy session for `async def` handlers.
+    It ensures the session is always closed after the request.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
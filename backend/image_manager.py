@@ -0,0 +1,82 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, features
+
+load_dotenv(dotenv_path="../.env")
+
+# Longest edge in pixels of each derivative; images are never upscaled.
+IMAGE_DERIVATIVE_SIZES = {"thumb": 320, "medium": 960, "large": 1920}
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+# AVIF is several times slower to encode than WebP, so it is opt-in, and only
+# used when this Pillow build can write it.
+IMAGE_AVIF_ENABLED = os.getenv("IMAGE_AVIF_ENABLED", "0") == "1" and features.check("avif")
+IMAGE_AVIF_QUALITY = int(os.getenv("IMAGE_AVIF_QUALITY", "60"))
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", os.cpu_count() or 1))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _encode(image: Image.Image, format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def render_derivatives(data: bytes) -> Dict:
+    """
+    Decodes an image, applies its EXIF orientation and encodes each derivative.
+    Only the ICC colour profile is carried over; EXIF (camera, GPS, ...) and
+    other metadata are dropped. Runs in a pool process.
+
+    :return: {"width", "height", "derivatives": {name: {"width", "height", "webp", ["avif"]}}}
+             with the upright original's dimensions and the encoded bytes of each derivative.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        icc_profile = original.info.get("icc_profile")
+        image = ImageOps.exif_transpose(original)
+
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    image.info = {}
+
+    derivatives = {}
+    for name, edge in IMAGE_DERIVATIVE_SIZES.items():
+        variant = image.copy()
+        variant.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        derivative = {
+            "width": variant.width,
+            "height": variant.height,
+            "webp": _encode(variant, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4, exif=b"", icc_profile=icc_profile),
+        }
+        if IMAGE_AVIF_ENABLED:
+            derivative["avif"] = _encode(variant, "AVIF", quality=IMAGE_AVIF_QUALITY, exif=b"",
+                                         icc_profile=icc_profile)
+        derivatives[name] = derivative
+
+    return {"width": image.width, "height": image.height, "derivatives": derivatives}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    The shared process pool for image work, created on first use. Processes are
+    spawned rather than forked, since the parent holds threads and DB connections.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def create_derivatives(data: bytes) -> Dict:
+    """Runs render_derivatives on the process pool and waits for the result."""
+    return get_pool().submit(render_derivatives, data).result()
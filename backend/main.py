@@ -1,23 +1,31 @@
+import asyncio
+import email.utils
+import hashlib
 import os
 import uuid
 from contextlib import asynccontextmanager
 from datetime import timedelta, datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
-from fastapi import FastAPI, Depends, HTTPException, status, APIRouter, File, UploadFile, Form, Request, BackgroundTasks
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import FastAPI, Depends, HTTPException, status, APIRouter, File, UploadFile, Form, Query, Request, BackgroundTasks
 from fastapi import WebSocket, WebSocketDisconnect, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse, JSONResponse
+from sqlalchemy import exc as sqlalchemy_exc
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import subprocess
-from database_manager import SessionLocal, get_db
+from database_manager import SessionLocal
 import json
 import re
-import crud, models, schemas, security, oss_manager, database_manager, email_manager, logs_manager
+from concurrent.futures import ThreadPoolExecutor
+import admission_manager, cache_manager, crud, crud_async, models, schemas, security, oss_manager, database_manager, email_manager, logs_manager
 from connection_manager import manager
 import logging
 
@@ -155,6 +163,181 @@ async def ban_malicious_ips(request: Request, call_next):
 
     return await call_next(request)
 
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", 0))
+
+if DB_QUERY_BUDGET:
+    @app.middleware("http")
+    async def enforce_query_budget(request: Request, call_next):
+        """
+        Development aid: counts the SQL statements each request runs, reports the
+        count in a response header and logs requests that exceed DB_QUERY_BUDGET.
+        """
+        with database_manager.count_queries() as counter:
+            response = await call_next(request)
+        response.headers["X-DB-Query-Count"] = str(counter.count)
+        if counter.count > DB_QUERY_BUDGET:
+            print(f"{datetime.now()}: {request.method} {request.url.path} ran {counter.count} queries "
+                  f"(budget {DB_QUERY_BUDGET})")
+        return response
+
+# Upper bound on the `limit` query parameter of every list endpoint.
+MAX_PAGE_SIZE = 100
+
+# --- Admission Control ---
+# Requests that cannot get a session slot (database_manager.admission_slot) or a
+# pooled connection in time are shed with a fast 503 + Retry-After.
+RETRY_AFTER_SECONDS = os.getenv("RETRY_AFTER_SECONDS", "1")
+
+
+def service_unavailable() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly."},
+        headers={"Retry-After": RETRY_AFTER_SECONDS},
+    )
+
+
+@app.exception_handler(admission_manager.AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: admission_manager.AdmissionRejected):
+    return service_unavailable()
+
+
+# --- Read-Your-Writes ---
+# After a successful write, the caller's reads stick to the primary for a short
+# window so a lagging replica never hides their own changes (see get_read_db).
+if database_manager.replica_engine is not None:
+    @app.middleware("http")
+    async def read_your_writes(request: Request, call_next):
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            response.set_cookie(
+                key=database_manager.READ_PRIMARY_COOKIE,
+                value="1",
+                httponly=True,
+                samesite="lax",
+                max_age=database_manager.READ_YOUR_WRITES_SECONDS
+            )
+        return response
+
+
+@app.exception_handler(sqlalchemy_exc.TimeoutError)
+async def pool_timeout_handler(request: Request, exc: sqlalchemy_exc.TimeoutError):
+    """A request that could not get a DB connection within DB_POOL_TIMEOUT is shed, not failed."""
+    print(f"{datetime.now()}: DB pool timeout on {request.method} {request.url.path}")
+    return service_unavailable()
+
+
+# --- Response Cache ---
+# Anonymous featured media and the leaderboards are cached as serialized JSON.
+# Writes that change them invalidate the namespace on every worker through the
+# broadcast backend; the TTL bounds staleness for anything not hooked.
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_STALE_SECONDS = float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "30"))
+RESPONSE_CACHE_EVENT = "response_cache.invalidate"
+# Namespaces whose responses embed media cards (counters, captions, owners).
+MEDIA_CARD_CACHES = ("featured", "leaderboard_media")
+
+response_cache = cache_manager.ResponseCache(
+    cache_manager.MemoryCacheBackend(maxsize=int(os.getenv("RESPONSE_CACHE_MAXSIZE", "1024"))),
+    ttl=RESPONSE_CACHE_TTL_SECONDS,
+    stale_ttl=RESPONSE_CACHE_STALE_SECONDS,
+)
+
+_type_adapters: Dict[Any, TypeAdapter] = {}
+_background_tasks = set()
+
+manager.on_event(RESPONSE_CACHE_EVENT, response_cache.invalidate)
+
+
+def cached_json(namespace: str, key, response_model, compute: Callable[[], Any]) -> Response:
+    """Serves `compute()` serialized as `response_model` from the response cache."""
+    adapter = _type_adapters.get(response_model)
+    if adapter is None:
+        adapter = _type_adapters[response_model] = TypeAdapter(response_model)
+
+    def render() -> bytes:
+        return adapter.dump_json(adapter.validate_python(compute(), from_attributes=True))
+
+    return Response(content=response_cache.get_or_compute(namespace, key, render), media_type="application/json")
+
+
+def invalidate_cached(*namespaces: str):
+    """
+    Drops the cached responses of each namespace on this worker right away and
+    on the other workers once the broadcast arrives. Safe to call from async
+    handlers and from sync handlers running in the threadpool.
+    """
+    for namespace in namespaces:
+        response_cache.invalidate(namespace)
+        manager.publish_event_nowait(RESPONSE_CACHE_EVENT, namespace)
+
+
+def invalidate_media_engagement(is_featured: bool):
+    """
+    Likes and comments change counters, so they invalidate the cached responses
+    that can show this media on every worker: the leaderboard always, since any
+    item's counters can move it into or within the top N, and the featured list
+    only if the item is featured.
+    """
+    namespaces = ["leaderboard_media"]
+    if is_featured:
+        namespaces.append("featured")
+    invalidate_cached(*namespaces)
+
+
+@app.on_event("startup")
+async def start_broadcast_listener():
+    """Listens for invalidations from other workers before the first socket connects."""
+    task = asyncio.create_task(manager.start())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# --- HTTP Conditional Requests ---
+# Entity reads answer If-None-Match from cheap version stamps (crud.get_*_version)
+# before loading anything, so a revalidation costs one indexed lookup and no
+# serialization. Responses depend on the viewer (auth cookie or bearer token),
+# hence the viewer id in the ETag and Vary: Cookie, Authorization.
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "10"))
+
+
+def _client_has_current_copy(request: Request, etag: str) -> bool:
+    """
+    Weak If-None-Match comparison. If-Modified-Since is deliberately not honoured:
+    it has one-second resolution, so an edit in the same second as the client's
+    copy would be answered with a 304. The ETag covers revalidation on its own.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def conditional_get(request: Request, response: Response, current_user: Optional[models.User],
+                    version: tuple, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    Sets ETag, Last-Modified and Cache-Control on `response`, and returns a
+    304 response to send instead when the client's copy is still current.
+    """
+    viewer_id = current_user.id if current_user else None
+    etag = '"' + hashlib.sha256(repr((*version, viewer_id)).encode()).hexdigest()[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Vary": "Cookie, Authorization",
+        # Anonymous responses may be shared briefly; personalised ones are revalidated every time.
+        "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}" if viewer_id is None else "private, no-cache",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = email.utils.format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+    if _client_has_current_copy(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     subprocess.run("iptables-restore < /etc/iptables/rules.v4", shell=True)
@@ -171,83 +354,167 @@ async def healthz() -> Dict[str, str]:
     return {"status": "OK"}
 
 
-def process_video_in_background(temp_path_str: str, media_id: int):
-    """
-    This function runs in the background. It creates its own DB session.
-    It now uses pathlib for robust path handling.
-    """
-    db = SessionLocal()
-
-    # Convert string paths to Path objects
-    temp_path = Path(temp_path_str)
-    compressed_path = None
-
-    try:
-        # Create the compressed path using pathlib's .with_suffix() method
-        compressed_path = temp_path.with_name(f"{temp_path.stem}_compressed{temp_path.suffix}")
-
-        # The FFmpeg command. All paths are now correctly formatted for the OS.
-        command = [
-            'ffmpeg', '-i', str(temp_path),  # Convert Path back to string for the command
-            '-vcodec', 'libx264', '-crf', '28',
-            '-preset', 'veryfast', '-c:a', 'copy',
-            str(compressed_path)  # Convert Path back to string
-        ]
-
-        subprocess.run(command, check=True, capture_output=True, text=True)
-
-        # Upload the compressed file to OSS
-        oss_object_name = f"media/{uuid.uuid4()}{temp_path.suffix}"
-        compressed_url = oss_manager.upload_local_file_to_oss(
-            local_file_path=str(compressed_path),
-            object_name=oss_object_name,
-            content_type='video/mp4'
-        )
+@app.get("/healthz/pool", tags=["General"])
+async def healthz_pool():
+    """Connection pool occupancy, checkout wait times and admission-control state for this worker."""
+    return {"pools": database_manager.pool_status(), "admission": database_manager.admission.status()}
 
-        # Update the database
-        db_media = crud.get_media(db, media_id)
-        if db_media:
-            db_media.media_url = compressed_url
-            db.commit()
 
-    except subprocess.CalledProcessError as e:
-        with open(logs_manager.logs_file, 'a') as file:
-            print(f"{datetime.now()}: FFmpeg failed for media_id {media_id}:", file=file)
-            print(f"{datetime.now()}: Stderr: {e.stderr}", file=file)
-            print(f"{datetime.now()}: Stdout: {e.stdout}", file=file)
-    except Exception as e:
-        print(f"{datetime.now()}: Failed to process video for media_id {media_id}: {e}")
+def mark_liked_by_current_user(db: Session, current_user: Optional[models.User],
+                               media_items: List[models.Media]) -> List[models.Media]:
+    """
+    Sets `is_liked_by_current_user` on every media item with a single likes query,
+    so list endpoints report the heart state without a request per card.
+    """
+    liked_ids = set()
+    if current_user and media_items:
+        liked_ids = crud.get_liked_media_ids(db, user_id=current_user.id,
+                                             media_ids=[media.id for media in media_items])
+    for media in media_items:
+        media.is_liked_by_current_user = media.id in liked_ids
+    return media_items
+
+
+# --- Direct-to-OSS Uploads ---
+# Clients ask for presigned POST forms, upload the bytes straight to the bucket,
+# then call the matching /complete endpoint, which checks the objects with a HEAD
+# request and creates the rows. Keys are scoped to the caller by prefix.
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "20"))
+UPLOAD_KEY_SUFFIX = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.[a-z0-9]{1,10})?"
+
+
+def presign_upload(prefix: str, file_info: schemas.UploadFileInfo) -> schemas.PresignedUpload:
+    max_bytes = oss_manager.max_upload_bytes(file_info.content_type)
+    if not max_bytes:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_info.content_type}")
+    if not 0 < file_info.size <= max_bytes:
+        raise HTTPException(status_code=400,
+                            detail=f"{file_info.filename} must be between 1 byte and {max_bytes} bytes.")
+
+    extension = Path(file_info.filename).suffix.lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,10}", extension):
+        extension = ""
+    object_key = f"{prefix}{uuid.uuid4()}{extension}"
+    presigned = oss_manager.create_presigned_upload(object_key, file_info.content_type, max_bytes)
+    return schemas.PresignedUpload(object_key=object_key, url=presigned["url"], fields=presigned["fields"])
+
+
+def verify_upload(prefix: str, object_key: str) -> str:
+    """Checks that an uploaded object belongs to the caller and fits the limits; returns its content type."""
+    if not re.fullmatch(re.escape(prefix) + UPLOAD_KEY_SUFFIX, object_key):
+        raise HTTPException(status_code=400, detail="Invalid upload key.")
+    head = oss_manager.head_object(object_key)
+    if head is None:
+        raise HTTPException(status_code=400, detail=f"Upload {object_key} was not found.")
+
+    content_type = head.get("ContentType", "")
+    max_bytes = oss_manager.max_upload_bytes(content_type)
+    if not max_bytes or head["ContentLength"] > max_bytes:
+        oss_manager.delete_object(object_key)
+        raise HTTPException(status_code=400, detail=f"Upload {object_key} is not an accepted file.")
+    return content_type
 
-    finally:
-        # Clean up the temporary local files
-        if temp_path.exists():
-            os.remove(temp_path)
-        if compressed_path and compressed_path.exists():
-            os.remove(compressed_path)
-        db.close()
 
 @app.websocket("/ws/notifications")
 async def websocket_notifications_endpoint(
         websocket: WebSocket,
-        db: Session = Depends(database_manager.get_db),
-        current_user: models.User = Depends(security.get_current_user),
+        current_user: models.User = Depends(security.get_current_websocket_user),
 ):
     try:
         await manager.connect(current_user.id, websocket)
         try:
             while True: await websocket.receive_text()
         except WebSocketDisconnect:
-            manager.disconnect(current_user.id)
+            manager.disconnect(current_user.id, websocket)
     except Exception:
         await websocket.close()
 
 
+def open_chat_room(conversation_id: int, user_id: int) -> Optional[tuple[str, List[int]]]:
+    """
+    Checks that the user belongs to the conversation and returns its room name and
+    participant ids, or None. Runs in the threadpool with its own short-lived session.
+    """
+    db = SessionLocal()
+    try:
+        conversation = (
+            db.query(models.Conversation)
+            .filter(models.Conversation.id == conversation_id)
+            .filter(models.Conversation.participants.any(id=user_id))
+            .first()
+        )
+        if not conversation:
+            return None
+
+        participant_ids = sorted([p.id for p in conversation.participants])
+        if conversation.type == 'one_to_one':
+            room_name = f"chat-{participant_ids[0]}-{participant_ids[1]}"
+        else:
+            room_name = f"chat_group-{conversation.id}"
+        return room_name, participant_ids
+    finally:
+        db.close()
+
+
+def save_chat_message(sender_id: int, conversation_id: int, content: str,
+                      participant_ids: List[int]) -> tuple[int, str, List[tuple[int, str]]]:
+    """
+    Persists a chat message and its notifications in one transaction and returns the
+    message id, the serialized message and (recipient_id, serialized notification) pairs.
+    Runs in the threadpool with its own short-lived session.
+    """
+    db = SessionLocal()
+    try:
+        db_message, db_notifications = crud.create_chat_message(
+            db=db,
+            sender_id=sender_id,
+            conversation_id=conversation_id,
+            content=content,
+            participant_ids=participant_ids
+        )
+        return (
+            db_message.id,
+            schemas.Message.model_validate(db_message).model_dump_json(),
+            [(n.recipient_id, schemas.Notification.model_validate(n).model_dump_json()) for n in db_notifications]
+        )
+    finally:
+        db.close()
+
+
+def load_message_json(message_id: int) -> Optional[str]:
+    """Rebuilds a chat message broadcast by reference (see ConnectionManager.on_reference)."""
+    db = SessionLocal()
+    try:
+        db_message = crud.get_message(db, message_id=message_id)
+        return schemas.Message.model_validate(db_message).model_dump_json() if db_message else None
+    finally:
+        db.close()
+
+
+def load_comment_json(comment_id: int) -> Optional[str]:
+    """Rebuilds a comment broadcast by reference (see ConnectionManager.on_reference)."""
+    db = SessionLocal()
+    try:
+        db_comment = crud.get_comment(db, comment_id=comment_id)
+        return schemas.Comment.model_validate(db_comment).model_dump_json() if db_comment else None
+    finally:
+        db.close()
+
+
+manager.on_reference("message", load_message_json)
+manager.on_reference("comment", load_comment_json)
+
+
+def chat_error_frame(detail: str) -> str:
+    """The frame sent back to a chat client whose message was rejected."""
+    return json.dumps({"error": detail})
+
+
 @app.websocket("/ws/chat/{conversation_id}")
 async def websocket_chat_endpoint(
         websocket: WebSocket,
         conversation_id: int,
-        db: Session = Depends(database_manager.get_db),
-        current_user: models.User = Depends(security.get_current_user)
+        current_user: models.User = Depends(security.get_current_websocket_user)
 ):
     """
     Handles real-time chat communication for a specific conversation.
@@ -255,26 +522,16 @@ async def websocket_chat_endpoint(
     2. Verifies the user is a valid participant of the conversation.
     3. Joins a dedicated WebSocket 'room' for the conversation.
     4. Listens for incoming messages, saves them to the DB, and broadcasts them to other room members.
+    No database connection is held while the socket is idle: each step borrows a
+    short-lived session in the threadpool, so open chats never starve the pool.
     """
-
-    conversation = (
-        db.query(models.Conversation)
-        .filter(models.Conversation.id == conversation_id)
-        .filter(models.Conversation.participants.any(id=current_user.id))
-        .first()
-    )
-
-    if not conversation:
+    room = await run_in_threadpool(open_chat_room, conversation_id, current_user.id)
+    if not room:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
+    room_name, participant_ids = room
 
-    participant_ids = sorted([p.id for p in conversation.participants])
-    if conversation.type == 'one_to_one':
-        room_name = f"chat-{participant_ids[0]}-{participant_ids[1]}"
-    else:
-        room_name = f"chat_group-{conversation.id}"
-
-    await manager.connect_to_room(room_name, websocket)
+    connection = await manager.connect_to_room(room_name, websocket)
 
     try:
         while True:
@@ -283,56 +540,24 @@ async def websocket_chat_endpoint(
             try:
                 # Parse the incoming JSON data.
                 message_data = json.loads(raw_data)
-                content = message_data.get("content")
-
-                # Basic validation to ensure content is present and is a string.
-                if not content or not isinstance(content, str):
-                    continue  # Ignore malformed messages.
-
             except json.JSONDecodeError:
-                # If the message isn't valid JSON, ignore it and continue listening.
+                connection.enqueue(chat_error_frame("Messages must be JSON."))
                 continue
 
-            # Step 6: Save the validated message to the database.
-            db_message = crud.create_message(
-                db=db,
-                sender_id=current_user.id,
-                conversation_id=conversation_id,
-                content=content
-            )
+            # Basic validation to ensure content is present and is a string.
+            content = message_data.get("content") if isinstance(message_data, dict) else None
+            if not content or not isinstance(content, str):
+                connection.enqueue(chat_error_frame("Messages need a non-empty \"content\" string."))
+                continue
 
-            await manager.broadcast_to_room(
-                room_name,
-                schemas.Message.model_validate(db_message).model_dump_json()
+            # Save the message and notify the other participants, off the event loop.
+            message_id, message_json, notifications = await run_in_threadpool(
+                save_chat_message, current_user.id, conversation_id, content, participant_ids
             )
 
-            notification_content = {
-                "id": 0,  # Placeholder, the actual notification will have its own ID
-                "type": "chat_message",  # A new notification type
-                "is_read": False,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "actor": schemas.UserSimple.model_validate(current_user),
-                "related_entity_id": conversation_id
-            }
-
-            for participant in conversation.participants:
-                # We only want to notify OTHER people in the chat, not the person who sent the message.
-                if participant.id != current_user.id:
-
-                    # Create the notification in the database
-                    db_notification = crud.create_notification(
-                        db,
-                        recipient_id=participant.id,
-                        actor_id=current_user.id,
-                        type=models.NotificationType.chat_message,
-                        related_entity_id=conversation.id  # The related entity is the conversation itself
-                    )
-
-                    if db_notification:
-                        await manager.send_personal_message(
-                            schemas.Notification.model_validate(db_notification).model_dump_json(),
-                            db_notification.recipient_id
-                        )
+            await manager.broadcast_to_room(room_name, message_json, ref=("message", message_id))
+            for recipient_id, notification_json in notifications:
+                await manager.send_personal_message(notification_json, recipient_id)
 
     except WebSocketDisconnect:
         manager.disconnect_from_room(room_name, websocket)
@@ -406,7 +631,7 @@ def logout(response: Response):
 
 @auth_router.post("/forgot-password", status_code=status.HTTP_200_OK)
 @limiter.limit("5/hour")
-async def forgot_password(
+def forgot_password(
         request: Request,
         background_tasks: BackgroundTasks,
         payload: schemas.ForgotPasswordRequest,
@@ -469,7 +694,7 @@ def read_current_user(current_user: models.User = Depends(security.get_current_u
 
 @users_router.get("/me/albums", response_model=List[schemas.Album])
 def get_my_albums(
-        db: Session = Depends(database_manager.get_db),
+        db: Session = Depends(database_manager.get_read_db),
         current_user: models.User = Depends(security.get_current_user)
 ):
     """ Fetches all albums created by the currently authenticated user. """
@@ -479,9 +704,19 @@ def get_my_albums(
 @users_router.get("/profile/{username}", response_model=schemas.UserProfile)
 def get_user_profile(
         username: str,
-        db: Session = Depends(database_manager.get_db),
+        request: Request,
+        response: Response,
+        db: Session = Depends(database_manager.get_read_db),
         current_user: Optional[models.User] = Depends(security.get_optional_current_user)
 ):
+    version = crud.get_profile_version(db, username=username)
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # No Last-Modified: deleting media or albums leaves no timestamp behind; the ETag covers it.
+    not_modified = conditional_get(request, response, current_user, tuple(version))
+    if not_modified:
+        return not_modified
+
     profile_user = crud.get_user_by_username(db, username=username)
     if profile_user is None:
         raise HTTPException(status_code=404, detail="User not found")
@@ -492,12 +727,38 @@ def get_user_profile(
         follow_rel = crud.get_follow(db, follower_id=current_user.id, following_id=profile_user.id)
         if follow_rel:
             is_following = True
-    profile_user.is_followed_by_current_user = is_following
 
-    for album in profile_user.albums:
-        album.media_count = len(album.media)
+    profile = schemas.User.model_validate(profile_user).model_dump()
+    profile.update(
+        is_followed_by_current_user=is_following,
+        media_count=crud.get_media_count_for_user(db, user_id=profile_user.id),
+        albums=[
+            schemas.AlbumWithMediaCount.model_validate(album)
+            for album in crud.get_user_albums_with_media_count(db, user_id=profile_user.id)
+        ],
+    )
+    return schemas.UserProfile(**profile)
 
-    return profile_user
+
+@users_router.get("/{username}/media", response_model=schemas.PaginatedMedia)
+def get_user_media(
+        username: str,
+        cursor: Optional[str] = None,
+        limit: int = Query(24, ge=1, le=MAX_PAGE_SIZE),
+        db: Session = Depends(database_manager.get_read_db),
+        current_user: Optional[models.User] = Depends(security.get_optional_current_user)
+):
+    """ Pages through a user's uploads, newest first. """
+    profile_user = crud.get_user_by_username(db, username=username)
+    if profile_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        results = crud.get_media_for_user(db, owner_id=profile_user.id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mark_liked_by_current_user(db, current_user, results["media"])
+    return results
 
 
 @users_router.post("/me/profile-picture", response_model=schemas.User)
@@ -506,6 +767,8 @@ def upload_profile_picture(
         db: Session = Depends(database_manager.get_db),
         current_user: models.User = Depends(security.get_current_user)
 ):
+    if not (oss_manager.max_upload_bytes(file.content_type) and file.content_type.startswith("image/")):
+        raise HTTPException(status_code=400, detail="Profile pictures must be images.")
     file_extension = os.path.splitext(file.filename)[1]
     unique_filename = f"profile-pictures/{current_user.id}-{uuid.uuid4()}{file_extension}"
 
@@ -517,6 +780,37 @@ def upload_profile_picture(
     current_user.profile_picture_url = new_profile_pic_url
     db.commit()
     db.refresh(current_user)
+    invalidate_cached(*MEDIA_CARD_CACHES, "leaderboard_users")
+
+    return current_user
+
+
+@users_router.post("/me/profile-picture/uploads", response_model=schemas.PresignedUpload)
+def create_profile_picture_upload(
+        file_info: schemas.UploadFileInfo,
+        current_user: models.User = Depends(security.get_current_user)
+):
+    """ Issues a presigned form for uploading a new profile picture straight to OSS. """
+    if not file_info.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Profile pictures must be images.")
+    return presign_upload(f"profile-pictures/{current_user.id}-", file_info)
+
+
+@users_router.post("/me/profile-picture/complete", response_model=schemas.User)
+def complete_profile_picture_upload(
+        payload: schemas.ProfilePictureComplete,
+        db: Session = Depends(database_manager.get_db),
+        current_user: models.User = Depends(security.get_current_user)
+):
+    """ Sets the profile picture to an object uploaded through /me/profile-picture/uploads. """
+    content_type = verify_upload(f"profile-pictures/{current_user.id}-", payload.object_key)
+    if not content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Profile pictures must be images.")
+
+    current_user.profile_picture_url = oss_manager.public_url_for(payload.object_key)
+    db.commit()
+    db.refresh(current_user)
+    invalidate_cached(*MEDIA_CARD_CACHES, "leaderboard_users")
 
     return current_user
 
@@ -524,23 +818,24 @@ def upload_profile_picture(
 @users_router.post("/{user_id}/follow", status_code=status.HTTP_204_NO_CONTENT)
 async def follow_user(
         user_id: int,
-        db: Session = Depends(database_manager.get_db),
-        current_user: models.User = Depends(security.get_current_user),
+        db: AsyncSession = Depends(database_manager.get_async_db),
+        current_user: models.User = Depends(security.get_current_user_async),
 ):
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
 
-    user_to_follow = crud.get_user(db, user_id=user_id)
+    user_to_follow = await crud_async.get_user(db, user_id=user_id)
     if not user_to_follow:
         raise HTTPException(status_code=404, detail="User to follow not found")
 
-    existing_follow = crud.get_follow(db, follower_id=current_user.id, following_id=user_id)
+    existing_follow = await crud_async.get_follow(db, follower_id=current_user.id, following_id=user_id)
     if existing_follow:
         raise HTTPException(status_code=400, detail="Already following this user")
 
-    crud.create_follow(db, follower_id=current_user.id, following_id=user_id)
+    await crud_async.create_follow(db, follower_id=current_user.id, following_id=user_id)
+    invalidate_cached("leaderboard_users")
 
-    db_notification = crud.create_notification(
+    db_notification = await crud_async.create_notification(
         db,
         recipient_id=user_id,
         actor_id=current_user.id,
@@ -559,14 +854,15 @@ async def follow_user(
 @users_router.delete("/{user_id}/follow", status_code=status.HTTP_204_NO_CONTENT)
 async def unfollow_user(
         user_id: int,
-        db: Session = Depends(database_manager.get_db),
-        current_user: models.User = Depends(security.get_current_user),
+        db: AsyncSession = Depends(database_manager.get_async_db),
+        current_user: models.User = Depends(security.get_current_user_async),
 ):
-    follow_to_delete = crud.get_follow(db, follower_id=current_user.id, following_id=user_id)
+    follow_to_delete = await crud_async.get_follow(db, follower_id=current_user.id, following_id=user_id)
     if not follow_to_delete:
         raise HTTPException(status_code=404, detail="Not following this user")
 
-    crud.delete_follow(db, follow=follow_to_delete)
+    await crud_async.delete_follow(db, follow=follow_to_delete)
+    invalidate_cached("leaderboard_users")
     return
 
 
@@ -576,7 +872,9 @@ def update_current_user_profile(
         db: Session = Depends(database_manager.get_db),
         current_user: models.User = Depends(security.get_current_user)
 ):
-    return crud.update_user(db=db, db_user=current_user, user_update=user_update)
+    updated_user = crud.update_user(db=db, db_user=current_user, user_update=user_update)
+    invalidate_cached(*MEDIA_CARD_CACHES, "leaderboard_users")
+    return updated_user
 
 
 @users_router.post("/me/change-password", status_code=status.HTTP_204_NO_CONTENT)
@@ -595,7 +893,7 @@ def change_current_user_password(
 @users_router.get("/{username}/followers", response_model=List[schemas.UserWithFollowStatus])
 def get_user_followers_list(
         username: str,
-        db: Session = Depends(database_manager.get_db),
+        db: Session = Depends(database_manager.get_read_db),
         current_user: Optional[models.User] = Depends(security.get_optional_current_user)
 ):
     profile_user = crud.get_user_by_username(db, username=username)
@@ -616,7 +914,7 @@ def get_user_followers_list(
 @users_router.get("/{username}/following", response_model=List[schemas.UserWithFollowStatus])
 def get_user_following_list(
         username: str,
-        db: Session = Depends(database_manager.get_db),
+        db: Session = Depends(database_manager.get_read_db),
         current_user: Optional[models.User] = Depends(security.get_optional_current_user)
 ):
     profile_user = crud.get_user_by_username(db, username=username)
@@ -634,86 +932,205 @@ def get_user_following_list(
 
 
 # --- Media Endpoints (Previously Media Endpoints) ---
-@media_router.get("", response_model=List[schemas.Media])
-def get_all_media(sort_by: str = "newest", skip: int = 0, limit: int = 20,
-                  db: Session = Depends(database_manager.get_db)):
-    results = crud.get_all_media(db=db, sort_by=sort_by, skip=skip, limit=limit)
+@media_router.get("", response_model=schemas.PaginatedMedia)
+def get_all_media(sort_by: str = "newest", cursor: Optional[str] = None,
+                  limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                  db: Session = Depends(database_manager.get_read_db),
+                  current_user: Optional[models.User] = Depends(security.get_optional_current_user)):
+    if sort_by == "featured" and current_user is None:
+        try:
+            return cached_json("featured", (cursor, limit), schemas.PaginatedMedia,
+                               lambda: crud.get_all_media(db=db, sort_by=sort_by, cursor=cursor, limit=limit))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        results = crud.get_all_media(db=db, sort_by=sort_by, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mark_liked_by_current_user(db, current_user, results["media"])
     return results
 
 
+# Registered before /{media_id} so "feed" is not parsed as a media id.
+@media_router.get("/feed", response_model=schemas.PaginatedMedia)
+def get_following_feed(cursor: Optional[str] = None,
+                       limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                       db: Session = Depends(database_manager.get_read_db),
+                       current_user: models.User = Depends(security.get_current_user)):
+    """ Pages through media posted by the accounts the current user follows, newest first. """
+    try:
+        results = crud.get_following_feed(db, user_id=current_user.id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mark_liked_by_current_user(db, current_user, results["media"])
+    return results
+
+
+# Files of one multipart upload are stored concurrently on this shared, bounded
+# pool; each file additionally streams to OSS in parts (oss_manager.transfer_config).
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY, thread_name_prefix="upload")
+
+
+def store_uploaded_file(owner_id: int, file: UploadFile) -> Optional[tuple]:
+    """
+    Streams one uploaded image or video to OSS, chunk by chunk. media_worker.py
+    then transcodes videos and renders image derivatives from the stored object.
+    Returns (media_type, object_key), or None for unsupported files.
+    """
+    if not oss_manager.max_upload_bytes(file.content_type):
+        return None
+    media_type = models.MediaType.video if file.content_type.startswith("video/") else models.MediaType.image
+
+    file_extension = os.path.splitext(file.filename)[1]
+    object_key = f"media/{owner_id}/{uuid.uuid4()}{file_extension}"
+    oss_manager.upload_file_to_oss(file=file, object_name=object_key)
+    return media_type, object_key
+
+
+def media_upload_rows(uploads: List[tuple]) -> List[tuple]:
+    """
+    Maps stored (media_type, object_key) uploads to crud.create_media_batch rows.
+    Images are live at once and get their derivatives from a job shortly after;
+    videos wait as "processing" on a transcoding job.
+    """
+    return [
+        ("processing" if media_type == models.MediaType.video else oss_manager.public_url_for(object_key),
+         media_type, object_key)
+        for media_type, object_key in uploads
+    ]
+
+
+def create_uploaded_media(db: Session, owner_id: int, uploads: List[tuple], caption: str,
+                          tags: List[str]) -> List[int]:
+    """
+    crud.create_media_batch for stored (media_type, object_key) uploads. If no row
+    gets created, the objects are deleted from OSS, since nothing references them;
+    except on the ValueError for an object that already backs another media item,
+    which is not ours to delete.
+    """
+    try:
+        return crud.create_media_batch(db, owner_id=owner_id, uploads=media_upload_rows(uploads),
+                                       caption=caption, tags=tags)
+    except ValueError:
+        raise
+    except Exception:
+        for _, object_key in uploads:
+            oss_manager.delete_object(object_key)
+        raise
+
+
+def media_file_urls(media: models.Media) -> List[str]:
+    """Every OSS object behind a media item: the original and its derivatives."""
+    urls = [media.media_url]
+    for derivative in (media.derivatives or {}).values():
+        urls.append(derivative["url"])
+        if derivative.get("avif_url"):
+            urls.append(derivative["avif_url"])
+    return urls
+
+
 @media_router.post("", response_model=List[schemas.Media])
 def upload_media(
-        background_tasks: BackgroundTasks,
         files: List[UploadFile] = File(...),
         caption: str = Form(""),
         tags: str = Form(""),
-        db: Session = Depends(get_db),  # We still need the DB session for the initial creation
-        current_user: models.User = Depends(security.get_current_user)
+        current_user: models.User = Depends(security.get_current_user_detached)
 ):
-    created_media_list = []
     tag_names = [tag.strip() for tag in tags.split(',') if tag.strip()]
-    tag_models = crud.get_or_create_tags(db, tags=tag_names)
 
-    for file in files:
-        db_media = None
+    stored, failed = [], False
+    for future in [upload_executor.submit(store_uploaded_file, current_user.id, file) for file in files]:
+        try:
+            stored.append(future.result())
+        except Exception as e:
+            print(f"{datetime.now()}: ERROR storing an uploaded file: {e}")
+            failed = True
+    stored = [upload for upload in stored if upload]
+
+    if failed:
+        for _, object_key in stored:
+            oss_manager.delete_object(object_key)
+        raise HTTPException(status_code=500, detail="Could not store the uploaded files.")
+    if not stored:
+        raise HTTPException(status_code=400, detail="No valid files were uploaded.")
 
-        if file.content_type and file.content_type.startswith("video/"):
+    # The session is opened only now, after the slow file uploads, so they hold no
+    # admission slot or pooled connection. All rows, tag links and processing jobs
+    # are created in one transaction, so the tag rows are only locked for this step.
+    db = SessionLocal()
+    try:
+        media_ids = create_uploaded_media(db, owner_id=current_user.id, uploads=stored,
+                                          caption=caption, tags=tag_names)
+        invalidate_cached("leaderboard_media")
+        return crud.get_media_cards(db, media_ids=media_ids)
+    finally:
+        db.close()
 
-            import tempfile
-            temp_dir = Path(tempfile.gettempdir()) / "video_uploads"
 
-            temp_dir.mkdir(parents=True, exist_ok=True)
+@media_router.post("/uploads", response_model=List[schemas.PresignedUpload])
+def create_media_uploads(payload: schemas.UploadRequest,
+                         current_user: models.User = Depends(security.get_current_user)):
+    """ Issues one presigned form per file for uploading media straight to OSS. """
+    if not 0 < len(payload.files) <= MAX_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"Upload between 1 and {MAX_UPLOAD_FILES} files at a time.")
+    return [presign_upload(f"media/{current_user.id}/", file_info) for file_info in payload.files]
 
-            file_extension = Path(file.filename).suffix
-            temp_filename = f"{uuid.uuid4()}{file_extension}"
-            temp_path = temp_dir / temp_filename  # Use the / operator for joining paths with pathlib
 
-            with open(temp_path, "wb") as buffer:
-                buffer.write(file.file.read())
+@media_router.post("/uploads/complete", response_model=List[schemas.Media])
+def complete_media_uploads(payload: schemas.UploadComplete,
+                           db: Session = Depends(database_manager.get_db),
+                           current_user: models.User = Depends(security.get_current_user)):
+    """ Creates media rows for objects uploaded through /media/uploads, once they exist in OSS. """
+    object_keys = list(dict.fromkeys(payload.object_keys))
+    if not 0 < len(object_keys) <= MAX_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"Complete between 1 and {MAX_UPLOAD_FILES} uploads at a time.")
+    if crud.get_used_source_keys(db, source_keys=object_keys):
+        raise HTTPException(status_code=400, detail="An upload is already attached to another media item.")
+    # Verify every object before creating any row.
+    uploads = []
+    for object_key in object_keys:
+        content_type = verify_upload(f"media/{current_user.id}/", object_key)
+        media_type = models.MediaType.video if content_type.startswith("video/") else models.MediaType.image
+        uploads.append((media_type, object_key))
 
-            db_media = crud.create_media(
-                db=db, owner_id=current_user.id,
-                media_url="processing",
-                caption=caption, media_type=models.MediaType.video
-            )
-            created_media_list.append(db_media)
+    try:
+        media_ids = create_uploaded_media(db, owner_id=current_user.id, uploads=uploads,
+                                          caption=payload.caption, tags=payload.tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_cached("leaderboard_media")
 
-            # Pass the path as a string to the background task
-            background_tasks.add_task(
-                process_video_in_background, str(temp_path), db_media.id
-            )
+    return crud.get_media_cards(db, media_ids=media_ids)
 
-        # --- LOGIC FOR IMAGES (Unchanged) ---
-        elif file.content_type and file.content_type.startswith("image/"):
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"media/{uuid.uuid4()}{file_extension}"
-            media_url = oss_manager.upload_file_to_oss(file=file, object_name=unique_filename)
-            db_media = crud.create_media(db=db, owner_id=current_user.id, media_url=media_url, caption=caption,
-                                         media_type=models.MediaType.image)
-            created_media_list.append(db_media)
-
-        # Associate tags if a media item was created
-        if db_media and tag_models:
-            crud.associate_tags_with_media(db, media=db_media, tags=tag_models)
-            db.refresh(db_media)
-
-    if not created_media_list:
-        raise HTTPException(status_code=400, detail="No valid files were uploaded.")
 
-    return created_media_list
+@media_router.get("/{media_id}/processing", response_model=schemas.MediaJob)
+def get_media_processing_status(media_id: int, db: Session = Depends(database_manager.get_db),
+                                current_user: models.User = Depends(security.get_current_user)):
+    """ Reports the processing job (video transcoding or image derivatives) of an upload to its owner. """
+    media = crud.get_media(db, media_id=media_id)
+    if not media: raise HTTPException(status_code=404, detail="Media not found")
+    if media.owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view this media's processing status")
+    job = crud.get_latest_media_job(db, media_id=media_id)
+    if not job: raise HTTPException(status_code=404, detail="This media has no processing job")
+    return job
 
 
 @media_router.get("/{media_id}", response_model=schemas.Media)
-def get_media_by_id(media_id: int, db: Session = Depends(database_manager.get_db),
+def get_media_by_id(media_id: int, request: Request, response: Response,
+                    db: Session = Depends(database_manager.get_read_db),
                     current_user: Optional[models.User] = Depends(security.get_optional_current_user)):
-    db_media = crud.get_media(db, media_id=media_id)
+    version = crud.get_media_version(db, media_id=media_id)
+    if version is None: raise HTTPException(status_code=404, detail="Media not found")
+    not_modified = conditional_get(request, response, current_user, tuple(version), last_modified=max(version))
+    if not_modified:
+        return not_modified
+
+    db_media = crud.get_media_card(db, media_id=media_id)
     if db_media is None: raise HTTPException(status_code=404, detail="Media not found")
 
-    is_liked = False
-    if current_user:
-        like = crud.get_like(db, user_id=current_user.id, media_id=media_id)
-        is_liked = bool(like)
-    db_media.is_liked_by_current_user = is_liked
+    mark_liked_by_current_user(db, current_user, [db_media])
     return db_media
 
 
@@ -732,16 +1149,21 @@ def delete_media_by_user(
 
     # --- ADDED A TRY/EXCEPT BLOCK ---
     try:
-        crud.delete_media(db, media=media)
+        file_urls = media_file_urls(media)
+        source_keys = crud.delete_media(db, media=media)
 
-        oss_manager.delete_file_from_oss(media.media_url)
+        for file_url in file_urls:
+            oss_manager.delete_file_from_oss(file_url)
+        for source_key in source_keys:
+            oss_manager.delete_object(source_key)
 
     except Exception as e:
         with open(logs_manager.logs_file, 'a') as file:
-            print(f"{datetime.now()}: ERROR during media deletion: {e}")
+            print(f"{datetime.now()}: ERROR during media deletion: {e}", file=file)
         db.rollback()
         raise HTTPException(status_code=500, detail="Could not delete the media item due to a server error.")
 
+    invalidate_cached(*MEDIA_CARD_CACHES)
     return  # Implicitly returns 204 No Content
 
 
@@ -754,24 +1176,23 @@ def update_media_caption(media_id: int, media_update: schemas.MediaUpdate,
     if media.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to edit this media")
     updated_media = crud.update_media(db, media=media, media_update=media_update)
-    # Re-fetch counts for response
-    updated_media.like_count = crud.get_like_count_for_media(db, media_id=media_id)
-    updated_media.comment_count = crud.get_comment_count_for_media(db, media_id=media_id)
+    invalidate_cached(*MEDIA_CARD_CACHES)
     like = crud.get_like(db, user_id=current_user.id, media_id=media_id)
     updated_media.is_liked_by_current_user = bool(like)
     return updated_media
 
 
 @media_router.get("/{media_id}/download", response_class=RedirectResponse, status_code=307)
-async def download_media(media_id: int, db: Session = Depends(database_manager.get_db),
-                         current_user: models.User = Depends(security.get_current_user)):
-    media = crud.get_media(db, media_id=media_id)
+async def download_media(media_id: int, db: AsyncSession = Depends(database_manager.get_async_db),
+                         current_user: models.User = Depends(security.get_current_user_async)):
+    media = await crud_async.get_media_with_owner(db, media_id=media_id)
     if not media: raise HTTPException(status_code=404, detail="Media not found")
     if not media.owner.allow_downloads: raise HTTPException(status_code=403,
                                                             detail="The owner has disabled downloads for this item.")
 
-    db_notification = crud.create_notification(db, recipient_id=media.owner_id, actor_id=current_user.id,
-                                               type=models.NotificationType.download, related_entity_id=media.id)
+    db_notification = await crud_async.create_notification(db, recipient_id=media.owner_id, actor_id=current_user.id,
+                                                           type=models.NotificationType.download,
+                                                           related_entity_id=media.id)
     if db_notification:
         await manager.send_personal_message(schemas.Notification.model_validate(db_notification).model_dump_json(),
                                             db_notification.recipient_id)
@@ -780,17 +1201,21 @@ async def download_media(media_id: int, db: Session = Depends(database_manager.g
 
 @media_router.post("/{media_id}/comments", response_model=schemas.Comment)
 async def post_comment_on_media(media_id: int, comment: schemas.CommentCreate,
-                                db: Session = Depends(database_manager.get_db),
-                                current_user: models.User = Depends(security.get_current_user)):
-    media = crud.get_media(db, media_id=media_id)
-    if not media: raise HTTPException(status_code=status.HTTP_404, detail="Media not found")
-
-    db_comment = crud.create_comment(db=db, comment=comment, media_id=media_id, author_id=current_user.id)
+                                db: AsyncSession = Depends(database_manager.get_async_db),
+                                current_user: models.User = Depends(security.get_current_user_async)):
+    media = await crud_async.get_media(db, media_id=media_id)
+    if not media: raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Media not found")
+
+    db_comment = await crud_async.create_comment(db=db, comment=comment, media_id=media_id,
+                                                 author_id=current_user.id)
+    invalidate_media_engagement(media.is_featured)
     room_name = f"media-{media_id}"
-    await manager.broadcast_to_room(room_name, schemas.Comment.model_validate(db_comment).model_dump_json())
+    await manager.broadcast_to_room(room_name, schemas.Comment.model_validate(db_comment).model_dump_json(),
+                                    ref=("comment", db_comment.id))
 
-    db_notification = crud.create_notification(db, recipient_id=media.owner_id, actor_id=current_user.id,
-                                               type=models.NotificationType.comment, related_entity_id=media.id)
+    db_notification = await crud_async.create_notification(db, recipient_id=media.owner_id, actor_id=current_user.id,
+                                                           type=models.NotificationType.comment,
+                                                           related_entity_id=media.id)
     if db_notification:
         await manager.send_personal_message(schemas.Notification.model_validate(db_notification).model_dump_json(),
                                             db_notification.recipient_id)
@@ -798,16 +1223,18 @@ async def post_comment_on_media(media_id: int, comment: schemas.CommentCreate,
 
 
 @media_router.post("/{media_id}/like", status_code=status.HTTP_204_NO_CONTENT)
-async def like_media(media_id: int, db: Session = Depends(database_manager.get_db),
-                     current_user: models.User = Depends(security.get_current_user)):
-    media = crud.get_media(db, media_id=media_id)
+async def like_media(media_id: int, db: AsyncSession = Depends(database_manager.get_async_db),
+                     current_user: models.User = Depends(security.get_current_user_async)):
+    media = await crud_async.get_media(db, media_id=media_id)
     if not media: raise HTTPException(status_code=404, detail="Media not found")
-    if crud.get_like(db, user_id=current_user.id, media_id=media_id):
+    if await crud_async.get_like(db, user_id=current_user.id, media_id=media_id):
         raise HTTPException(status_code=400, detail="Media already liked")
 
-    crud.create_like(db, user_id=current_user.id, media_id=media_id)
-    db_notification = crud.create_notification(db, recipient_id=media.owner_id, actor_id=current_user.id,
-                                               type=models.NotificationType.like, related_entity_id=media.id)
+    await crud_async.create_like(db, user_id=current_user.id, media_id=media_id)
+    invalidate_media_engagement(media.is_featured)
+    db_notification = await crud_async.create_notification(db, recipient_id=media.owner_id, actor_id=current_user.id,
+                                                           type=models.NotificationType.like,
+                                                           related_entity_id=media.id)
     if db_notification:
         await manager.send_personal_message(schemas.Notification.model_validate(db_notification).model_dump_json(),
                                             db_notification.recipient_id)
@@ -819,7 +1246,9 @@ def unlike_media(media_id: int, db: Session = Depends(database_manager.get_db),
     like_to_delete = crud.get_like(db, user_id=current_user.id, media_id=media_id)
     if not like_to_delete:
         raise HTTPException(status_code=404, detail="Media not liked")
+    is_featured = like_to_delete.media_item.is_featured
     crud.delete_like(db, like=like_to_delete)
+    invalidate_media_engagement(is_featured)
 
 
 # --- comments ---
@@ -831,18 +1260,25 @@ def delete_comment_by_user(comment_id: int, db: Session = Depends(database_manag
         raise HTTPException(status_code=404, detail="Comment not found")
     if comment.author_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
+    media_id, is_featured = comment.media_id, comment.media_item.is_featured
     crud.delete_comment(db, comment=comment)
+    invalidate_media_engagement(is_featured)
 
 
 # --- ALBUM ENDPOINTS ---
 @search_router.get("", response_model=schemas.SearchResults)
-def search(q: str = "", db: Session = Depends(database_manager.get_db)):
+def search(q: str = "", cursor: Optional[str] = None,
+           limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+           db: Session = Depends(database_manager.get_read_db),
+           current_user: Optional[models.User] = Depends(security.get_optional_current_user)):
+    q = q.strip()
     if not q:
         return {"users": [], "media": []}
-    results = crud.search_content(db, query=q)
-    for media_item in results["media"]:
-        media_item.like_count = crud.get_like_count_for_media(db, media_id=media_item.id)
-        media_item.comment_count = crud.get_comment_count_for_media(db, media_id=media_item.id)
+    try:
+        results = crud.search_content(db, query=q, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mark_liked_by_current_user(db, current_user, results["media"])
     return results
 
 
@@ -856,10 +1292,22 @@ def create_album(
 
 
 @albums_router.get("/{album_id}", response_model=schemas.Album)
-def get_album(album_id: int, db: Session = Depends(database_manager.get_db)):
-    db_album = crud.get_album(db, album_id=album_id)
+def get_album(album_id: int, request: Request, response: Response,
+              db: Session = Depends(database_manager.get_read_db),
+              current_user: Optional[models.User] = Depends(security.get_optional_current_user)):
+    version = crud.get_album_version(db, album_id=album_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Album not found")
+    album_updated_at, owner_updated_at, _, media_updated_at, _ = version
+    last_modified = max(stamp for stamp in (album_updated_at, owner_updated_at, media_updated_at) if stamp)
+    not_modified = conditional_get(request, response, current_user, tuple(version), last_modified=last_modified)
+    if not_modified:
+        return not_modified
+
+    db_album = crud.get_album_with_media(db, album_id=album_id)
     if db_album is None:
         raise HTTPException(status_code=404, detail="Album not found")
+    mark_liked_by_current_user(db, current_user, db_album.media)
     return db_album
 
 
@@ -909,7 +1357,7 @@ def remove_media_from_album(album_id: int, media_id: int, db: Session = Depends(
 
 @notifications_router.get("", response_model=List[schemas.Notification])
 def get_notifications(
-        db: Session = Depends(database_manager.get_db),
+        db: Session = Depends(database_manager.get_read_db),
         current_user: models.User = Depends(security.get_current_user)
 ):
     return crud.get_notifications_for_user(db, user_id=current_user.id)
@@ -958,7 +1406,7 @@ def submit_report(
 def get_all_reports(
         status: Optional[models.ReportStatus] = None,
         skip: int = 0,
-        limit: int = 20,
+        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
         db: Session = Depends(database_manager.get_db),
         admin_user: models.User = Depends(security.get_current_admin_user)
 ):
@@ -984,7 +1432,9 @@ def toggle_feature_media(media_id: int, db: Session = Depends(database_manager.g
                          admin_user: models.User = Depends(security.get_current_admin_user)):
     media = crud.get_media(db, media_id=media_id)
     if not media: raise HTTPException(status_code=404, detail="Media not found")
-    return crud.toggle_media_featured_status(db, media=media)
+    updated_media = crud.toggle_media_featured_status(db, media=media)
+    invalidate_cached("featured")
+    return updated_media
 
 
 @admin_router.delete("/media/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -998,14 +1448,19 @@ def delete_media_by_admin(
         raise HTTPException(status_code=404, detail="Media not found")
 
     try:
-        crud.delete_media(db, media=media)
-        oss_manager.delete_file_from_oss(media.media_url)
+        file_urls = media_file_urls(media)
+        source_keys = crud.delete_media(db, media=media)
+        for file_url in file_urls:
+            oss_manager.delete_file_from_oss(file_url)
+        for source_key in source_keys:
+            oss_manager.delete_object(source_key)
     except Exception as e:
         with open(logs_manager.logs_file, "a") as file:
-            print(f"{datetime.now()}: ERROR during admin media deletion: {e}")
+            print(f"{datetime.now()}: ERROR during admin media deletion: {e}", file=file)
         db.rollback()
         raise HTTPException(status_code=500, detail="Could not delete the media item due to a server error.")
 
+    invalidate_cached(*MEDIA_CARD_CACHES)
     return
 
 
@@ -1018,22 +1473,37 @@ def delete_comment_by_admin(
     comment = crud.get_comment(db, comment_id=comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
+    media_id, is_featured = comment.media_id, comment.media_item.is_featured
     crud.delete_comment(db, comment=comment)
+    invalidate_media_engagement(is_featured)
     return
 
 
 # --- Leaderboard Endpoints ---
 @leaderboard_router.get("/media", response_model=List[schemas.Media])  # RENAMED from /media
-def get_leaderboard_media(limit: int = 10, db: Session = Depends(database_manager.get_db)):
-    results = crud.get_top_liked_media(db=db, limit=limit)
-    return results
+def get_leaderboard_media(limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), window: str = "all",
+                          db: Session = Depends(database_manager.get_read_db),
+                          current_user: Optional[models.User] = Depends(security.get_optional_current_user)):
+    """ Gets the top N most liked media, all-time or by likes received in the last day/week/month. """
+    try:
+        if current_user is None:
+            return cached_json("leaderboard_media", (limit, window), List[schemas.Media],
+                               lambda: crud.get_top_liked_media(db=db, limit=limit, window=window))
+        results = crud.get_top_liked_media(db=db, limit=limit, window=window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return mark_liked_by_current_user(db, current_user, results)
 
 
 @leaderboard_router.get("/users", response_model=List[schemas.User])
-def get_leaderboard_users(limit: int = 10, db: Session = Depends(database_manager.get_db)):
-    """ Gets the top N most followed users. """
-    results = crud.get_most_followed_users(db=db, limit=limit)
-    return results
+def get_leaderboard_users(limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), window: str = "all",
+                          db: Session = Depends(database_manager.get_read_db)):
+    """ Gets the top N most followed users, all-time or by follows gained in the last day/week/month. """
+    try:
+        return cached_json("leaderboard_users", (limit, window), List[schemas.User],
+                           lambda: crud.get_most_followed_users(db=db, limit=limit, window=window))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 #--- CHAT ENDPOINTS ---
 
@@ -1095,7 +1565,7 @@ def get_user_conversations(
 def get_conversation_messages(
         conversation_id: int,
         skip: int = 0,
-        limit: int = 50,
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
         db: Session = Depends(database_manager.get_db),
         current_user: models.User = Depends(security.get_current_user)
 ):
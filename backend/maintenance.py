@@ -0,0 +1,78 @@
+"""
+Periodic maintenance jobs for the denormalized data in the database.
+
+Run from the backend directory, e.g.:
+    python maintenance.py counters
+    python maintenance.py counters --batch-size 5000
+    python maintenance.py counters --interval 600   # keep running as a background repair job
+    python maintenance.py rollups --days 2 --interval 3600  # repair recent leaderboard rollups hourly
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+
+import crud, models
+from database_manager import SessionLocal
+
+
+def reconcile_in_batches(model, reconcile, batch_size: int) -> int:
+    """Walks the primary-key range of `model` and runs `reconcile(db, start, end)` on each batch."""
+    db = SessionLocal()
+    corrected = 0
+    try:
+        max_id = db.query(func.max(model.id)).scalar() or 0
+        for start_id in range(1, max_id + 1, batch_size):
+            corrected += reconcile(db, start_id, start_id + batch_size)
+    finally:
+        db.close()
+    return corrected
+
+
+def run_counters(args):
+    while True:
+        corrected = reconcile_in_batches(models.Media, crud.reconcile_media_counters, args.batch_size)
+        print(f"{datetime.now()}: Reconciled media counters, {corrected} rows corrected.")
+        corrected = reconcile_in_batches(models.User, crud.reconcile_user_follow_counters, args.batch_size)
+        print(f"{datetime.now()}: Reconciled user follow counters, {corrected} rows corrected.")
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+def run_rollups(args):
+    while True:
+        db = SessionLocal()
+        try:
+            written = crud.rebuild_daily_rollups(db, days=args.days)
+        finally:
+            db.close()
+        print(f"{datetime.now()}: Rebuilt the last {args.days} days of leaderboard rollups, {written} rows written.")
+        if not args.interval:
+            return
+        time.sleep(args.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database maintenance jobs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    counters_parser = subparsers.add_parser("counters", help="Recompute denormalized like/comment/follow counters.")
+    counters_parser.add_argument("--batch-size", type=int, default=1000)
+    counters_parser.add_argument("--interval", type=int, default=0,
+                                 help="Seconds to sleep between runs; 0 runs once and exits.")
+    counters_parser.set_defaults(func=run_counters)
+
+    rollups_parser = subparsers.add_parser("rollups", help="Rebuild recent leaderboard rollups and prune old days.")
+    rollups_parser.add_argument("--days", type=int, default=2, help="UTC days to rebuild, counting today.")
+    rollups_parser.add_argument("--interval", type=int, default=0,
+                                help="Seconds to sleep between runs; 0 runs once and exits.")
+    rollups_parser.set_defaults(func=run_rollups)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Processes uploads from the media_jobs queue (see models.MediaJob): transcodes
+videos with FFmpeg and renders image derivatives on image_manager's process pool.
+
+Runs outside the web workers, so this work never competes with request handling.
+Jobs survive restarts: they live in Postgres, are claimed with FOR UPDATE SKIP
+LOCKED, heartbeat while FFmpeg runs, and are handed back to the queue if their
+worker disappears.
+
+Run from the backend directory, e.g.:
+    python media_worker.py                  # one job per two CPUs
+    python media_worker.py --concurrency 4
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import crud, image_manager, models, oss_manager
+from database_manager import SessionLocal
+
+load_dotenv(dotenv_path="../.env")
+
+# FFmpeg uses several cores per encode, so by default run one job per two CPUs.
+MEDIA_WORKER_CONCURRENCY = int(os.getenv("MEDIA_WORKER_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2)))
+MEDIA_JOB_POLL_SECONDS = float(os.getenv("MEDIA_JOB_POLL_SECONDS", "2"))
+MEDIA_JOB_HEARTBEAT_SECONDS = int(os.getenv("MEDIA_JOB_HEARTBEAT_SECONDS", "30"))
+# A running job whose heartbeat is older than this is assumed orphaned and requeued.
+MEDIA_JOB_STALE_SECONDS = int(os.getenv("MEDIA_JOB_STALE_SECONDS", "300"))
+VIDEO_JOB_TIMEOUT_SECONDS = int(os.getenv("VIDEO_JOB_TIMEOUT_SECONDS", "3600"))
+
+stop_event = threading.Event()
+
+
+class JobLost(Exception):
+    """Raised when a job's lock was recovered by another worker mid-run."""
+
+
+def _heartbeat(job_id: int, worker_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        return crud.heartbeat_media_job(db, job_id, worker_id)
+    finally:
+        db.close()
+
+
+def transcode(job, worker_id: str) -> str:
+    """Downloads the job's raw source, compresses it with FFmpeg and uploads the result; returns its URL."""
+    with tempfile.TemporaryDirectory(prefix="video_job_") as work_dir:
+        suffix = Path(job.source_key).suffix
+        source_path = Path(work_dir) / f"source{suffix}"
+        compressed_path = Path(work_dir) / f"compressed{suffix}"
+        log_path = Path(work_dir) / "ffmpeg.log"
+
+        oss_manager.download_file_from_oss(job.source_key, str(source_path))
+
+        command = [
+            'ffmpeg', '-y', '-i', str(source_path),
+            '-vcodec', 'libx264', '-crf', '28',
+            '-preset', 'veryfast', '-c:a', 'copy',
+            str(compressed_path)
+        ]
+        with open(log_path, "wb") as log:
+            process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=log)
+            waited = 0
+            while True:
+                try:
+                    process.wait(timeout=MEDIA_JOB_HEARTBEAT_SECONDS)
+                    break
+                except subprocess.TimeoutExpired:
+                    waited += MEDIA_JOB_HEARTBEAT_SECONDS
+                    if waited >= VIDEO_JOB_TIMEOUT_SECONDS:
+                        process.kill()
+                        process.wait()
+                        raise RuntimeError(f"FFmpeg timed out after {VIDEO_JOB_TIMEOUT_SECONDS}s")
+                    if not _heartbeat(job.id, worker_id):
+                        process.kill()
+                        process.wait()
+                        raise JobLost()
+
+        if process.returncode != 0:
+            stderr_tail = log_path.read_bytes()[-2000:].decode(errors="replace")
+            raise RuntimeError(f"FFmpeg exited with {process.returncode}: {stderr_tail}")
+
+        return oss_manager.upload_local_file_to_oss(
+            local_file_path=str(compressed_path),
+            object_name=f"media/{uuid.uuid4()}{suffix}",
+            content_type='video/mp4'
+        )
+
+
+def derivative_urls(derivatives: dict) -> list:
+    """Every uploaded object in a derivatives mapping."""
+    urls = []
+    for derivative in derivatives.values():
+        urls.append(derivative["url"])
+        if derivative.get("avif_url"):
+            urls.append(derivative["avif_url"])
+    return urls
+
+
+def render_image(job) -> dict:
+    """
+    Renders and uploads the derivatives of an uploaded image; returns the media row's
+    new values. Keys are unique per attempt, so an attempt that loses its lock can
+    delete its own uploads without touching those of the worker that took over.
+    """
+    rendered = image_manager.create_derivatives(oss_manager.get_object_bytes(job.source_key))
+    stem = f"{os.path.splitext(job.source_key)[0]}_{uuid.uuid4().hex[:8]}"
+    derivatives = {}
+    try:
+        for name, derivative in rendered["derivatives"].items():
+            derivatives[name] = {
+                "url": oss_manager.upload_bytes_to_oss(derivative["webp"], f"{stem}_{name}.webp", "image/webp"),
+                "width": derivative["width"],
+                "height": derivative["height"],
+            }
+            if "avif" in derivative:
+                derivatives[name]["avif_url"] = oss_manager.upload_bytes_to_oss(
+                    derivative["avif"], f"{stem}_{name}.avif", "image/avif"
+                )
+    except Exception:
+        for url in derivative_urls(derivatives):
+            oss_manager.delete_file_from_oss(url)
+        raise
+    return {"width": rendered["width"], "height": rendered["height"], "derivatives": derivatives}
+
+
+def run_job(job, worker_id: str):
+    is_video = job.kind == models.MediaJobKind.transcode_video
+    # A video whose transcoding gives up is served as uploaded; an image is already live.
+    fallback_media_url = oss_manager.public_url_for(job.source_key) if is_video else None
+    db = SessionLocal()
+    try:
+        if job.attempts > job.max_attempts:
+            # Requeued by stale recovery after its last attempt crashed the worker.
+            crud.fail_media_job(db, job.id, worker_id, job.media_id,
+                                error=f"Gave up after {job.max_attempts} attempts.",
+                                fallback_media_url=fallback_media_url)
+            return
+
+        try:
+            media_values = {"media_url": transcode(job, worker_id)} if is_video else render_image(job)
+        except JobLost:
+            print(f"{datetime.now()}: Lost the lock on media job {job.id}; another worker has it.")
+            return
+        except Exception as e:
+            status = crud.fail_media_job(db, job.id, worker_id, job.media_id, error=str(e)[-2000:],
+                                         fallback_media_url=fallback_media_url)
+            print(f"{datetime.now()}: Media job {job.id} (media_id {job.media_id}) attempt {job.attempts} "
+                  f"failed, now {status.value if status else 'lost'}: {e}")
+            return
+
+        if crud.complete_media_job(db, job.id, worker_id, job.media_id, media_values):
+            if is_video:
+                # The compressed copy is live; the raw source is no longer needed.
+                oss_manager.delete_object(job.source_key)
+            print(f"{datetime.now()}: Media job {job.id} done for media_id {job.media_id}.")
+        else:
+            # Another worker owns the job now; drop what this attempt uploaded.
+            orphaned = [media_values["media_url"]] if is_video else derivative_urls(media_values["derivatives"])
+            for url in orphaned:
+                oss_manager.delete_file_from_oss(url)
+    finally:
+        db.close()
+
+
+def work(index: int):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            job = crud.claim_media_job(db, worker_id)
+        except Exception as e:
+            print(f"{datetime.now()}: Could not claim a media job: {e}")
+            job = None
+        finally:
+            db.close()
+
+        if job is None:
+            stop_event.wait(MEDIA_JOB_POLL_SECONDS)
+            continue
+        try:
+            run_job(job, worker_id)
+        except Exception as e:
+            # Left running; stale recovery requeues it.
+            print(f"{datetime.now()}: Media job {job.id} crashed: {e}")
+
+
+def recover_stale_jobs():
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            recovered = crud.recover_stale_media_jobs(db, stale_seconds=MEDIA_JOB_STALE_SECONDS)
+            if recovered:
+                print(f"{datetime.now()}: Requeued {recovered} stale media jobs.")
+        except Exception as e:
+            print(f"{datetime.now()}: Stale media job recovery failed: {e}")
+        finally:
+            db.close()
+        stop_event.wait(MEDIA_JOB_STALE_SECONDS / 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video transcoding and image derivative worker.")
+    parser.add_argument("--concurrency", type=int, default=MEDIA_WORKER_CONCURRENCY,
+                        help="Jobs to run at once.")
+    args = parser.parse_args()
+
+    # Finish the jobs in hand on SIGTERM/SIGINT, then exit.
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    threads = [threading.Thread(target=work, args=(i,), name=f"media-worker-{i}") for i in range(args.concurrency)]
+    threads.append(threading.Thread(target=recover_stale_jobs, name="media-worker-recovery"))
+    for thread in threads:
+        thread.start()
+    print(f"{datetime.now()}: Media worker started with concurrency {args.concurrency}.")
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import bisect
+import threading
+from typing import Dict, List, Sequence
+
+
+class Counter:
+    """A thread-safe monotonically increasing counter."""
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+class Histogram:
+    """
+    A thread-safe fixed-bucket histogram, reported cumulatively like Prometheus
+    histograms: each bucket counts the observations less than or equal to its bound.
+    """
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + counts[-1]
+        return {"buckets": cumulative, "count": cumulative["+Inf"], "sum": round(total, 6)}
+
+
+# Seconds spent waiting for a pooled DB connection, per engine.
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+pool_wait_seconds: Dict[str, Histogram] = {}
+# Checkouts that gave up after DB_POOL_TIMEOUT, per engine.
+pool_timeouts: Dict[str, Counter] = {}
+
+# Requests turned away by admission control.
+admission_rejections = Counter()
+
+
+def register_pool(name: str):
+    pool_wait_seconds[name] = Histogram(POOL_WAIT_BUCKETS)
+    pool_timeouts[name] = Counter()
@@ -0,0 +1,7 @@
+ALTER TABLE media
+    ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE media m
+SET like_count = (SELECT COUNT(*) FROM likes l WHERE l.media_id = m.id),
+    comment_count = (SELECT COUNT(*) FROM comments c WHERE c.media_id = m.id);
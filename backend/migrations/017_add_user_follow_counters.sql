@@ -0,0 +1,9 @@
+ALTER TABLE users
+    ADD COLUMN followers_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN following_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE users u
+SET followers_count = (SELECT COUNT(*) FROM follows f WHERE f.following_id = u.id),
+    following_count = (SELECT COUNT(*) FROM follows f WHERE f.follower_id = u.id);
+
+CREATE INDEX ix_users_followers_count ON users (followers_count DESC, id);
@@ -0,0 +1,5 @@
+-- Indexes matching the ORDER BY of each GET /media sort mode, so keyset
+-- pages are a single index range scan regardless of depth.
+CREATE INDEX ix_media_popular ON media (like_count DESC, created_at DESC, id DESC);
+CREATE INDEX ix_media_newest ON media (created_at DESC, id DESC);
+CREATE INDEX ix_media_featured ON media (created_at DESC, id DESC) WHERE is_featured;
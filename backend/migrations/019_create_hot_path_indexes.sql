@@ -0,0 +1,17 @@
+-- Secondary indexes for every foreign-key lookup on a hot path in crud.py.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so apply this
+-- file statement by statement (plain `psql -f`, without `-1`/--single-transaction).
+-- IF NOT EXISTS makes it safe to re-run after a failed or partial build; drop any
+-- index left INVALID by an interrupted build before re-running.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_likes_media_id ON likes (media_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_media_created ON comments (media_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_follows_following_id ON follows (following_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_conversation_created ON messages (conversation_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notifications_recipient_created ON notifications (recipient_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_media_tags_tag_id ON media_tags (tag_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_media_albums_album_id ON media_albums (album_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversation_participants_conversation_id ON conversation_participants (conversation_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_media_owner_created ON media (owner_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_albums_owner_id ON albums (owner_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reports_status_created ON reports (status, created_at);
@@ -0,0 +1,69 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Full-text document for a media item: its caption (weight A) plus its tag names (weight B).
+CREATE OR REPLACE FUNCTION media_search_document(p_caption TEXT, p_media_id INTEGER)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_caption, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(
+               (SELECT string_agg(t.name, ' ')
+                FROM media_tags mt JOIN tags t ON t.id = mt.tag_id
+                WHERE mt.media_id = p_media_id), '')), 'B');
+$$ LANGUAGE sql STABLE;
+
+ALTER TABLE media ADD COLUMN search_vector tsvector NOT NULL DEFAULT ''::tsvector;
+
+UPDATE media SET search_vector = media_search_document(caption, id);
+
+-- Keep the document current as captions and tag links change.
+CREATE OR REPLACE FUNCTION media_search_vector_on_media() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector = media_search_document(NEW.caption, NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER media_search_vector_update
+BEFORE INSERT OR UPDATE OF caption ON media
+FOR EACH ROW
+EXECUTE PROCEDURE media_search_vector_on_media();
+
+-- Statement-level, so a bulk tag association refreshes each media row once.
+CREATE OR REPLACE FUNCTION media_search_vector_on_tag_link() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE media m
+    SET search_vector = media_search_document(m.caption, m.id)
+    WHERE m.id IN (SELECT DISTINCT media_id FROM changed_links);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER media_tags_search_insert
+AFTER INSERT ON media_tags
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT
+EXECUTE PROCEDURE media_search_vector_on_tag_link();
+
+CREATE TRIGGER media_tags_search_delete
+AFTER DELETE ON media_tags
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT
+EXECUTE PROCEDURE media_search_vector_on_tag_link();
+
+CREATE OR REPLACE FUNCTION media_search_vector_on_tag_rename() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE media m
+    SET search_vector = media_search_document(m.caption, m.id)
+    WHERE m.id IN (SELECT media_id FROM media_tags WHERE tag_id = NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tags_search_rename
+AFTER UPDATE OF name ON tags
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE PROCEDURE media_search_vector_on_tag_rename();
+
+CREATE INDEX ix_media_search_vector ON media USING GIN (search_vector);
+CREATE INDEX ix_users_username_trgm ON users USING GIN (username gin_trgm_ops);
+CREATE INDEX ix_tags_name_trgm ON tags USING GIN (name gin_trgm_ops);
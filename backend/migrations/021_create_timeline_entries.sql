@@ -0,0 +1,24 @@
+-- Materialized following feed (fan-out on write); see models.TimelineEntry.
+CREATE TABLE timeline_entries (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    media_id INTEGER NOT NULL REFERENCES media(id) ON DELETE CASCADE,
+    owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, media_id)
+);
+
+CREATE INDEX ix_timeline_user_created ON timeline_entries (user_id, created_at DESC, media_id DESC);
+
+-- Seed every existing follower with the followee's 50 most recent posts
+-- (FEED_BACKFILL_LIMIT), matching what a new follow backfills.
+INSERT INTO timeline_entries (user_id, media_id, owner_id, created_at)
+SELECT f.follower_id, recent.id, recent.owner_id, recent.created_at
+FROM follows f
+CROSS JOIN LATERAL (
+    SELECT m.id, m.owner_id, m.created_at
+    FROM media m
+    WHERE m.owner_id = f.following_id
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT 50
+) recent
+ON CONFLICT DO NOTHING;
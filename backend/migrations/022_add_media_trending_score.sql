@@ -0,0 +1,47 @@
+-- Time-decayed "trending" score; see crud.trending_increment.
+-- The decayed score of a media item is S = sum(weight * 2^((event_time - now) / half-life)).
+-- trending_score stores log2(S) + now / half-life (times in Unix seconds), which
+-- is independent of now and orders media exactly like S at every moment. Events
+-- therefore update only their own row, there is no shared epoch to lock and
+-- nothing ever needs rebasing. '-Infinity' is the score of S = 0.
+-- The backfill below assumes the default weights (post 1, like 1, comment 2) and
+-- TRENDING_HALF_LIFE_HOURS=24.
+
+-- log2(2^score + 2^event): adds an event of score `event` (log2(weight) + time / half-life).
+-- Differences beyond 2^-60 are below float precision, and clamping them avoids underflow errors.
+CREATE OR REPLACE FUNCTION trending_log_add(score DOUBLE PRECISION, event DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE
+        WHEN score = '-Infinity' THEN event
+        ELSE greatest(score, event) + ln(1 + power(2::DOUBLE PRECISION, greatest(-abs(score - event), -60))) / ln(2)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- log2(2^score - 2^event): removes an event again (unlike, comment delete).
+-- Removing the last event, or one that rounding made larger than the score, leaves '-Infinity'.
+CREATE OR REPLACE FUNCTION trending_log_sub(score DOUBLE PRECISION, event DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT CASE
+        WHEN score = '-Infinity' OR event >= score - 1e-9 THEN '-Infinity'::DOUBLE PRECISION
+        ELSE score + ln(1 - power(2::DOUBLE PRECISION, greatest(event - score, -60))) / ln(2)
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE media ADD COLUMN trending_score DOUBLE PRECISION NOT NULL DEFAULT '-Infinity';
+
+WITH decayed AS (
+    SELECT m.id,
+        power(2, EXTRACT(EPOCH FROM m.created_at - now()) / 86400)
+        + COALESCE((SELECT SUM(power(2, EXTRACT(EPOCH FROM l.created_at - now()) / 86400))
+                    FROM likes l WHERE l.media_id = m.id), 0)
+        + COALESCE((SELECT SUM(2 * power(2, EXTRACT(EPOCH FROM c.created_at - now()) / 86400))
+                    FROM comments c WHERE c.media_id = m.id), 0) AS score
+    FROM media m
+    WHERE m.created_at > now() - INTERVAL '30 days'
+)
+UPDATE media m
+SET trending_score = ln(d.score) / ln(2) + EXTRACT(EPOCH FROM now()) / 86400
+FROM decayed d
+WHERE m.id = d.id;
+
+CREATE INDEX ix_media_trending ON media (trending_score DESC, id DESC);
@@ -0,0 +1,31 @@
+-- Daily rollups behind the windowed leaderboards; see models.MediaLikeDaily and
+-- models.UserFollowDaily. Days are UTC. Maintained on write by crud and rebuilt
+-- / pruned by `python maintenance.py rollups`.
+CREATE TABLE media_like_daily (
+    day DATE NOT NULL,
+    media_id INTEGER NOT NULL REFERENCES media(id) ON DELETE CASCADE,
+    likes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, media_id)
+);
+CREATE INDEX ix_media_like_daily_media_id ON media_like_daily (media_id);
+
+CREATE TABLE user_follow_daily (
+    day DATE NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    follows INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, user_id)
+);
+CREATE INDEX ix_user_follow_daily_user_id ON user_follow_daily (user_id);
+
+-- Backfill the retention window (ROLLUP_RETENTION_DAYS, default 35).
+INSERT INTO media_like_daily (day, media_id, likes)
+SELECT (created_at AT TIME ZONE 'UTC')::date, media_id, COUNT(*)
+FROM likes
+WHERE created_at >= (now() AT TIME ZONE 'UTC')::date - 34
+GROUP BY 1, 2;
+
+INSERT INTO user_follow_daily (day, user_id, follows)
+SELECT (created_at AT TIME ZONE 'UTC')::date, following_id, COUNT(*)
+FROM follows
+WHERE created_at >= (now() AT TIME ZONE 'UTC')::date - 34
+GROUP BY 1, 2;
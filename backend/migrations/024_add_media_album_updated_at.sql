@@ -0,0 +1,59 @@
+-- Version stamps for HTTP conditional requests (ETag / Last-Modified); see
+-- crud.get_media_version, crud.get_album_version and crud.get_profile_version.
+-- Maintained by triggers so every write path, including raw SQL, bumps them.
+ALTER TABLE media ADD COLUMN updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+ALTER TABLE albums ADD COLUMN updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+-- Only the columns schemas.Media serializes: trending_score changes with every
+-- like and comment but is never sent, so it must not invalidate clients' copies.
+CREATE TRIGGER set_media_timestamp
+BEFORE UPDATE OF caption, is_featured, like_count, comment_count, media_url, media_type ON media
+FOR EACH ROW
+EXECUTE PROCEDURE trigger_set_timestamp();
+
+CREATE TRIGGER set_albums_timestamp
+BEFORE UPDATE ON albums
+FOR EACH ROW
+EXECUTE PROCEDURE trigger_set_timestamp();
+
+-- Tags are linked after the media row is created, so a tag change touches the media row.
+CREATE OR REPLACE FUNCTION media_touch_on_tag_link() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE media SET updated_at = NOW()
+    WHERE id IN (SELECT DISTINCT media_id FROM changed_links);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER media_tags_touch_insert
+AFTER INSERT ON media_tags
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT
+EXECUTE PROCEDURE media_touch_on_tag_link();
+
+CREATE TRIGGER media_tags_touch_delete
+AFTER DELETE ON media_tags
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT
+EXECUTE PROCEDURE media_touch_on_tag_link();
+
+-- Adding or removing album media (including by cascade when media is deleted) touches the album.
+CREATE OR REPLACE FUNCTION albums_touch_on_media_link() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE albums SET updated_at = NOW()
+    WHERE id IN (SELECT DISTINCT album_id FROM changed_links);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER media_albums_touch_insert
+AFTER INSERT ON media_albums
+REFERENCING NEW TABLE AS changed_links
+FOR EACH STATEMENT
+EXECUTE PROCEDURE albums_touch_on_media_link();
+
+CREATE TRIGGER media_albums_touch_delete
+AFTER DELETE ON media_albums
+REFERENCING OLD TABLE AS changed_links
+FOR EACH STATEMENT
+EXECUTE PROCEDURE albums_touch_on_media_link();
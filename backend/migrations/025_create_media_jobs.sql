@@ -0,0 +1,31 @@
+-- Durable queue of video transcoding jobs; see models.MediaJob and media_worker.py.
+-- Jobs are created in the same transaction as their media row and claimed by
+-- workers with SELECT ... FOR UPDATE SKIP LOCKED.
+CREATE TYPE media_job_status AS ENUM ('pending', 'running', 'done', 'failed');
+
+CREATE TABLE media_jobs (
+    id SERIAL PRIMARY KEY,
+    media_id INTEGER NOT NULL REFERENCES media(id) ON DELETE CASCADE,
+    source_key VARCHAR(255) NOT NULL,
+    status media_job_status NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR(255),
+    locked_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX ix_media_jobs_media_id ON media_jobs (media_id);
+-- An uploaded object backs at most one media item; deleting either of two would remove it.
+CREATE UNIQUE INDEX ux_media_jobs_source_key ON media_jobs (source_key);
+-- Claiming scans due pending jobs; stale recovery scans running jobs by lock age.
+CREATE INDEX ix_media_jobs_pending ON media_jobs (run_after, id) WHERE status = 'pending';
+CREATE INDEX ix_media_jobs_running ON media_jobs (locked_at) WHERE status = 'running';
+
+CREATE TRIGGER set_media_jobs_timestamp
+BEFORE UPDATE ON media_jobs
+FOR EACH ROW
+EXECUTE PROCEDURE trigger_set_timestamp();
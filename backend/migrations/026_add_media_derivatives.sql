@@ -0,0 +1,17 @@
+-- Pixel dimensions and resized WebP (optionally AVIF) derivatives of images,
+-- written by the media worker's image_derivatives jobs; see image_manager.py.
+ALTER TABLE media ADD COLUMN width INTEGER;
+ALTER TABLE media ADD COLUMN height INTEGER;
+-- {"thumb": {"url": ..., "width": ..., "height": ..., "avif_url": ...}, "medium": ..., "large": ...}
+ALTER TABLE media ADD COLUMN derivatives JSONB;
+
+CREATE TYPE media_job_kind AS ENUM ('transcode_video', 'image_derivatives');
+ALTER TABLE media_jobs ADD COLUMN kind media_job_kind NOT NULL DEFAULT 'transcode_video';
+
+-- The new columns are serialized too, so they bump the ETag version stamp (migration 024).
+DROP TRIGGER set_media_timestamp ON media;
+CREATE TRIGGER set_media_timestamp
+BEFORE UPDATE OF caption, is_featured, like_count, comment_count, media_url, media_type,
+                 width, height, derivatives ON media
+FOR EACH ROW
+EXECUTE PROCEDURE trigger_set_timestamp();
@@ -1,3 +1,7 @@
+DROP TABLE IF EXISTS "media_jobs" CASCADE;
+DROP TABLE IF EXISTS "timeline_entries" CASCADE;
+DROP TABLE IF EXISTS "media_like_daily" CASCADE;
+DROP TABLE IF EXISTS "user_follow_daily" CASCADE;
 DROP TABLE IF EXISTS "reports" CASCADE;
 DROP TABLE IF EXISTS "notifications" CASCADE;
 DROP TABLE IF EXISTS "follows" CASCADE;
@@ -13,8 +17,12 @@ DROP TABLE IF EXISTS "media" CASCADE;
 DROP TABLE IF EXISTS "images" CASCADE;
 DROP TABLE IF EXISTS "users" CASCADE;
 
+DROP TYPE IF EXISTS "media_job_kind";
+DROP TYPE IF EXISTS "media_job_status";
 DROP TYPE IF EXISTS "report_status";
 DROP TYPE IF EXISTS "notification_type";
 DROP TYPE IF EXISTS "media_type";
 
 DROP FUNCTION IF EXISTS trigger_set_timestamp();
+DROP FUNCTION IF EXISTS trending_log_add(DOUBLE PRECISION, DOUBLE PRECISION);
+DROP FUNCTION IF EXISTS trending_log_sub(DOUBLE PRECISION, DOUBLE PRECISION);
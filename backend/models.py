@@ -1,9 +1,10 @@
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, Boolean, DateTime,
-    ForeignKey, Table, Enum as PyEnum
+    create_engine, Column, Integer, Float, String, Text, Boolean, Date, DateTime,
+    ForeignKey, Table, Index, Enum as PyEnum
 )
-from sqlalchemy.orm import relationship, declarative_base, column_property
-from sqlalchemy.sql import func, select
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, declarative_base, deferred
+from sqlalchemy.sql import func, text
 import enum
 from database_manager import Base
 
@@ -28,21 +29,36 @@ class ReportStatus(enum.Enum):
     dismissed = 'dismissed'
 
 
+class MediaJobKind(enum.Enum):
+    transcode_video = 'transcode_video'
+    image_derivatives = 'image_derivatives'
+
+
+class MediaJobStatus(enum.Enum):
+    pending = 'pending'
+    running = 'running'
+    done = 'done'
+    failed = 'failed'
+
+
 # --- RENAMED: from image_tags to media_tags ---
 media_tags = Table('media_tags', Base.metadata,
                    Column('media_id', Integer, ForeignKey('media.id', ondelete="CASCADE"), primary_key=True),
-                   Column('tag_id', Integer, ForeignKey('tags.id', ondelete="CASCADE"), primary_key=True)
+                   Column('tag_id', Integer, ForeignKey('tags.id', ondelete="CASCADE"), primary_key=True),
+                   Index('ix_media_tags_tag_id', 'tag_id')
                    )
 
 # --- RENAMED: from image_albums to media_albums ---
 media_albums = Table('media_albums', Base.metadata,
                      Column('media_id', Integer, ForeignKey('media.id', ondelete="CASCADE"), primary_key=True),
-                     Column('album_id', Integer, ForeignKey('albums.id', ondelete="CASCADE"), primary_key=True)
+                     Column('album_id', Integer, ForeignKey('albums.id', ondelete="CASCADE"), primary_key=True),
+                     Index('ix_media_albums_album_id', 'album_id')
                      )
 
 conversation_participants = Table('conversation_participants', Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True),
-    Column('conversation_id', Integer, ForeignKey('conversations.id', ondelete="CASCADE"), primary_key=True)
+    Column('conversation_id', Integer, ForeignKey('conversations.id', ondelete="CASCADE"), primary_key=True),
+    Index('ix_conversation_participants_conversation_id', 'conversation_id')
 )
 
 
@@ -56,6 +72,10 @@ class Follow(Base):
     follower = relationship("User", foreign_keys=[follower_id], back_populates="following")
     followed_by = relationship("User", foreign_keys=[following_id], back_populates="followers")
 
+    __table_args__ = (
+        Index("ix_follows_following_id", following_id),
+    )
+
 class Like(Base):
     __tablename__ = "likes"
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
@@ -64,6 +84,10 @@ class Like(Base):
     user = relationship("User", back_populates="likes")
     media_item = relationship("Media", back_populates="likes")
 
+    __table_args__ = (
+        Index("ix_likes_media_id", media_id),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
@@ -75,6 +99,10 @@ class Comment(Base):
     media_item = relationship("Media", back_populates="comments")
     reports = relationship("Report", back_populates="reported_comment", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_comments_media_created", media_id, created_at),
+    )
+
 
 # --- Main models that have dependencies ---
 
@@ -92,20 +120,10 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    # This now correctly references the 'Follow' class defined above
-    followers_count = column_property(
-        select(func.count(Follow.follower_id))
-        .where(Follow.following_id == id)
-        .correlate_except(Follow)
-        .scalar_subquery()
-    )
-    # This now correctly references the 'Follow' class defined above
-    following_count = column_property(
-        select(func.count(Follow.following_id))
-        .where(Follow.follower_id == id)
-        .correlate_except(Follow)
-        .scalar_subquery()
-    )
+    # Denormalized counters, kept in step by crud on follow/unfollow
+    # and repaired in bulk by `python maintenance.py counters`.
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     media = relationship("Media", back_populates="owner", cascade="all, delete-orphan")
     albums = relationship("Album", back_populates="owner", cascade="all, delete-orphan")
@@ -124,33 +142,46 @@ class User(Base):
     sent_messages = relationship("Message", back_populates="sender", cascade="all, delete-orphan")
     conversations = relationship("Conversation", secondary=conversation_participants, back_populates="participants")
 
+    __table_args__ = (
+        Index("ix_users_followers_count", followers_count.desc(), id),
+        Index("ix_users_username_trgm", username, postgresql_using="gin",
+              postgresql_ops={"username": "gin_trgm_ops"}),
+    )
+
 
 class Media(Base):
     __tablename__ = "media"
 
     id = Column(Integer, primary_key=True, index=True)
-    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
     media_url = Column(String(255), nullable=False)
-    media_type = Column(PyEnum(MediaType), nullable=False, default=MediaType.image)
+    media_type = Column(PyEnum(MediaType, name="media_type"), nullable=False, default=MediaType.image)
     caption = Column(Text, nullable=True)
     is_featured = Column(Boolean, nullable=False, default=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
-
-    # This now correctly references the 'Like' class defined above
-    like_count = column_property(
-        select(func.count(Like.user_id))
-        .where(Like.media_id == id)
-        .correlate_except(Like)
-        .scalar_subquery()
-    )
-    # This now correctly references the 'Comment' class defined above
-    comment_count = column_property(
-        select(func.count(Comment.id))
-        .where(Comment.media_id == id)
-        .correlate_except(Comment)
-        .scalar_subquery()
-    )
+    # Bumped by database triggers when a serialized column or the tag links change
+    # (migration 024); the version stamp behind ETags on GET /media/{id}.
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Denormalized counters, kept in step by crud on like/unlike/comment/delete
+    # and repaired in bulk by `python maintenance.py counters`.
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Time-decayed engagement as log2 against a fixed epoch, so the ranking never
+    # needs recomputing: see crud.trending_increment and migration 022.
+    trending_score = Column(Float, nullable=False, server_default=text("'-Infinity'"))
+
+    # Pixel size of the upright original and its resized WebP derivatives
+    # ({"thumb": {"url", "width", "height"[, "avif_url"]}, ...}), filled in by an
+    # image_derivatives job after upload; None until then and for videos.
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    derivatives = Column(JSONB, nullable=True)
+
+    # Full-text document (caption + tag names), maintained by database triggers
+    # (migration 020). Deferred so it is never loaded with ordinary media rows.
+    search_vector = deferred(Column(TSVECTOR, nullable=False, server_default="''::tsvector"))
 
     owner = relationship("User", back_populates="media")
     comments = relationship("Comment", back_populates="media_item", cascade="all, delete-orphan")
@@ -159,6 +190,89 @@ class Media(Base):
     tags = relationship("Tag", secondary=media_tags, back_populates="media")
     albums = relationship("Album", secondary=media_albums, back_populates="media")
 
+    __table_args__ = (
+        Index("ix_media_popular", like_count.desc(), created_at.desc(), id.desc()),
+        Index("ix_media_trending", trending_score.desc(), id.desc()),
+        Index("ix_media_newest", created_at.desc(), id.desc()),
+        Index("ix_media_featured", created_at.desc(), id.desc(), postgresql_where=is_featured),
+        Index("ix_media_owner_created", owner_id, created_at.desc(), id.desc()),
+        Index("ix_media_search_vector", search_vector, postgresql_using="gin"),
+    )
+
+
+class MediaLikeDaily(Base):
+    """Likes received per media item per UTC day, read by the windowed media leaderboard."""
+    __tablename__ = "media_like_daily"
+    day = Column(Date, primary_key=True)
+    media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), primary_key=True)
+    likes = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_media_like_daily_media_id", media_id),
+    )
+
+
+class UserFollowDaily(Base):
+    """Follows gained per user per UTC day, read by the windowed user leaderboard."""
+    __tablename__ = "user_follow_daily"
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    follows = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_user_follow_daily_user_id", user_id),
+    )
+
+
+class TimelineEntry(Base):
+    """
+    One row per (follower, media) for the following feed, written when media is
+    created (fan-out on write). Posts by accounts with more than
+    FEED_FANOUT_MAX_FOLLOWERS followers are not fanned out; the feed reads them
+    from media directly instead.
+    """
+    __tablename__ = "timeline_entries"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Copy of media.created_at, so a page is one range scan of ix_timeline_user_created.
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_timeline_user_created", user_id, created_at.desc(), media_id.desc()),
+    )
+
+
+class MediaJob(Base):
+    """
+    A post-upload processing job, created with its media row and run by
+    media_worker.py: transcoding a video, or rendering an image's derivatives.
+    `source_key` is the uploaded object in OSS. Failed attempts are retried with
+    exponential backoff via `run_after`; running jobs whose `locked_at` heartbeat
+    goes stale are handed back to the queue.
+    """
+    __tablename__ = "media_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), nullable=False)
+    source_key = Column(String(255), nullable=False)
+    kind = Column(PyEnum(MediaJobKind, name="media_job_kind"), nullable=False, default=MediaJobKind.transcode_video)
+    status = Column(PyEnum(MediaJobStatus, name="media_job_status"), nullable=False, default=MediaJobStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    max_attempts = Column(Integer, nullable=False, default=5, server_default="5")
+    run_after = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_by = Column(String(255), nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_media_jobs_media_id", media_id),
+        Index("ux_media_jobs_source_key", source_key, unique=True),
+        Index("ix_media_jobs_pending", run_after, id, postgresql_where=(status == MediaJobStatus.pending)),
+        Index("ix_media_jobs_running", locked_at, postgresql_where=(status == MediaJobStatus.running)),
+    )
+
 
 # --- The rest of the models can stay in their original order ---
 
@@ -170,10 +284,16 @@ class Album(Base):
     name = Column(String(100), nullable=False)
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Bumped by database triggers on update and when album media change (migration 024).
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
 
     owner = relationship("User", back_populates="albums")
     media = relationship("Media", secondary=media_albums, back_populates="albums")
 
+    __table_args__ = (
+        Index("ix_albums_owner_id", owner_id),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -183,19 +303,27 @@ class Tag(Base):
 
     media = relationship("Media", secondary=media_tags, back_populates="tags")
 
+    __table_args__ = (
+        Index("ix_tags_name_trgm", name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+    )
+
 
 class Notification(Base):
     __tablename__ = "notifications"
     id = Column(Integer, primary_key=True, index=True)
-    recipient_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    recipient_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     actor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    type = Column(PyEnum(NotificationType), nullable=False)
+    type = Column(PyEnum(NotificationType, name="notification_type"), nullable=False)
     related_entity_id = Column(Integer, nullable=True)
     is_read = Column(Boolean, nullable=False, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     recipient = relationship("User", foreign_keys=[recipient_id], back_populates="notifications_received")
     actor = relationship("User", foreign_keys=[actor_id], back_populates="actions_caused")
 
+    __table_args__ = (
+        Index("ix_notifications_recipient_created", recipient_id, created_at),
+    )
+
 
 class Report(Base):
     __tablename__ = "reports"
@@ -206,13 +334,17 @@ class Report(Base):
     reported_media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), nullable=True)
     reported_comment_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=True)
     reason = Column(Text, nullable=True)
-    status = Column(PyEnum(ReportStatus), nullable=False, default=ReportStatus.pending)
+    status = Column(PyEnum(ReportStatus, name="report_status"), nullable=False, default=ReportStatus.pending)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     reporter = relationship("User", back_populates="reports_made")
     reported_media = relationship("Media", back_populates="reports")
     reported_comment = relationship("Comment", back_populates="reports")
 
+    __table_args__ = (
+        Index("ix_reports_status_created", status, created_at),
+    )
+
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
 
@@ -229,7 +361,7 @@ class Conversation(Base):
     __tablename__ = "conversations"
     id = Column(Integer, primary_key=True, index=True)
     type = Column(PyEnum(enum.Enum('ConversationType', {'one_to_one': 'one_to_one', 'group': 'group'}),
-                         name='conversation_type_enum'), nullable=False, default='one_to_one')
+                         name='conversation_type'), nullable=False, default='one_to_one')
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     participants = relationship("User", secondary=conversation_participants, back_populates="conversations")
@@ -251,4 +383,8 @@ class Message(Base):
     read_at = Column(DateTime(timezone=True), nullable=True)
 
     conversation = relationship("Conversation", back_populates="messages")
-    sender = relationship("User", back_populates="sent_messages")
\ No newline at end of file
+    sender = relationship("User", back_populates="sent_messages")
+
+    __table_args__ = (
+        Index("ix_messages_conversation_created", conversation_id, created_at),
+    )
\ No newline at end of file
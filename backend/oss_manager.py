@@ -3,7 +3,10 @@ import boto3
 from fastapi import UploadFile
 from dotenv import load_dotenv
 import uuid
+from typing import Optional
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
+from botocore.exceptions import ClientError
 from urllib.parse import urlparse
 
 load_dotenv(dotenv_path="../.env")
@@ -14,6 +17,37 @@ OSS_ACCESS_KEY_SECRET = os.getenv("OSS_ACCESS_KEY_SECRET")
 OSS_ENDPOINT = os.getenv("OSS_ENDPOINT")
 OSS_BUCKET_NAME = os.getenv("OSS_BUCKET_NAME")
 
+# Direct-to-OSS uploads: how long a presigned form stays valid and how large an object it accepts.
+PRESIGNED_UPLOAD_EXPIRES_SECONDS = int(os.getenv("PRESIGNED_UPLOAD_EXPIRES_SECONDS", "900"))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_VIDEO_UPLOAD_BYTES = int(os.getenv("MAX_VIDEO_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+PUBLIC_CACHE_CONTROL = 'public, max-age=31536000'
+# Uploads are stored public-read, so only concrete, non-scriptable media types are
+# accepted (no image/svg+xml, text/html, ...), each with its size limit. Each must
+# also be one media_worker can process: Pillow here has no HEIC decoder, and the
+# libx264 transcode keeps the source container, which WebM cannot hold.
+UPLOAD_CONTENT_TYPES = {
+    "image/jpeg": MAX_IMAGE_UPLOAD_BYTES,
+    "image/png": MAX_IMAGE_UPLOAD_BYTES,
+    "image/webp": MAX_IMAGE_UPLOAD_BYTES,
+    "image/gif": MAX_IMAGE_UPLOAD_BYTES,
+    "video/mp4": MAX_VIDEO_UPLOAD_BYTES,
+    "video/quicktime": MAX_VIDEO_UPLOAD_BYTES,
+}
+
+# Server-side uploads stream in parts: files above the threshold go up as a
+# multipart upload with this many parts in flight, so memory stays bounded at
+# roughly chunk size x concurrency per file, whatever the file size.
+OSS_MULTIPART_THRESHOLD_BYTES = int(os.getenv("OSS_MULTIPART_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+OSS_MULTIPART_CHUNK_BYTES = int(os.getenv("OSS_MULTIPART_CHUNK_BYTES", str(8 * 1024 * 1024)))
+OSS_MULTIPART_CONCURRENCY = int(os.getenv("OSS_MULTIPART_CONCURRENCY", "4"))
+
+transfer_config = TransferConfig(
+    multipart_threshold=OSS_MULTIPART_THRESHOLD_BYTES,
+    multipart_chunksize=OSS_MULTIPART_CHUNK_BYTES,
+    max_concurrency=OSS_MULTIPART_CONCURRENCY,
+)
+
 if not all([OSS_ACCESS_KEY_ID, OSS_ACCESS_KEY_SECRET, OSS_ENDPOINT, OSS_BUCKET_NAME]):
     raise ValueError("One or more OSS environment variables are not set.")
 
@@ -32,6 +66,67 @@ s3_client = boto3.client(
 )
 
 
+def public_url_for(object_name: str) -> str:
+    """The public URL of an object in the bucket."""
+    return f"https://{OSS_BUCKET_NAME}.{OSS_ENDPOINT}/{object_name}"
+
+
+def max_upload_bytes(content_type: Optional[str]) -> int:
+    """The size limit for an upload of this content type, or 0 if the type is not accepted."""
+    return UPLOAD_CONTENT_TYPES.get(content_type or "", 0)
+
+
+def create_presigned_upload(object_name: str, content_type: str, max_bytes: int) -> dict:
+    """
+    Signs a browser POST (form) upload straight to the bucket, so the bytes never
+    pass through the API. The policy pins the key, content type, ACL and cache
+    headers, and makes OSS reject bodies larger than `max_bytes`; a presigned PUT
+    cannot enforce a size limit, hence POST.
+
+    :return: {"url": ..., "fields": {...}}; the client posts the fields plus a final `file` field.
+    """
+    fields = {
+        'acl': 'public-read',
+        'Content-Type': content_type,
+        'Cache-Control': PUBLIC_CACHE_CONTROL,
+    }
+    conditions = [
+        {'acl': 'public-read'},
+        {'Content-Type': content_type},
+        {'Cache-Control': PUBLIC_CACHE_CONTROL},
+        ['content-length-range', 1, max_bytes],
+    ]
+    return s3_client.generate_presigned_post(
+        Bucket=OSS_BUCKET_NAME,
+        Key=object_name,
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=PRESIGNED_UPLOAD_EXPIRES_SECONDS
+    )
+
+
+def head_object(object_name: str) -> Optional[dict]:
+    """
+    Returns the object's metadata (ContentLength, ContentType, ...), or None if it does not exist.
+    """
+    try:
+        return s3_client.head_object(Bucket=OSS_BUCKET_NAME, Key=object_name)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def download_file_from_oss(object_name: str, local_file_path: str):
+    """Downloads an object to a local path on the server."""
+    s3_client.download_file(OSS_BUCKET_NAME, object_name, local_file_path, Config=transfer_config)
+
+
+def delete_object(object_name: str):
+    """Deletes an object by key."""
+    s3_client.delete_object(Bucket=OSS_BUCKET_NAME, Key=object_name)
+
+
 def upload_file_to_oss(file: UploadFile, object_name: str) -> str:
     """
     Uploads a file to an Alibaba Cloud OSS bucket and returns the public URL.
@@ -48,15 +143,40 @@ def upload_file_to_oss(file: UploadFile, object_name: str) -> str:
             ExtraArgs={
                 'ACL': 'public-read',
                 'ContentType': file.content_type,
-                'CacheControl': 'public, max-age=31536000'
-            }
+                'CacheControl': PUBLIC_CACHE_CONTROL
+            },
+            Config=transfer_config
         )
     except Exception as e:
         print(f"Error uploading to OSS: {e}")
         raise e
 
-    public_url = f"https://{OSS_BUCKET_NAME}.{OSS_ENDPOINT}/{object_name}"
-    return public_url
+    return public_url_for(object_name)
+
+def upload_bytes_to_oss(data: bytes, object_name: str, content_type: str) -> str:
+    """
+    Uploads in-memory bytes (e.g. a rendered image derivative) to OSS and returns the public URL.
+    """
+    try:
+        s3_client.put_object(
+            Bucket=OSS_BUCKET_NAME,
+            Key=object_name,
+            Body=data,
+            ACL='public-read',
+            ContentType=content_type,
+            CacheControl=PUBLIC_CACHE_CONTROL
+        )
+    except Exception as e:
+        print(f"Error uploading bytes to OSS: {e}")
+        raise e
+
+    return public_url_for(object_name)
+
+
+def get_object_bytes(object_name: str) -> bytes:
+    """Reads a whole object into memory; for objects known to be small."""
+    return s3_client.get_object(Bucket=OSS_BUCKET_NAME, Key=object_name)["Body"].read()
+
 
 def upload_local_file_to_oss(local_file_path: str, object_name: str, content_type: str) -> str:
     """
@@ -70,15 +190,15 @@ def upload_local_file_to_oss(local_file_path: str, object_name: str, content_typ
             ExtraArgs={
                 'ACL': 'public-read',
                 'ContentType': content_type,
-                'CacheControl': 'public, max-age=31536000'
-            }
+                'CacheControl': PUBLIC_CACHE_CONTROL
+            },
+            Config=transfer_config
         )
     except Exception as e:
         print(f"Error uploading local file to OSS: {e}")
         raise e
 
-    public_url = f"https://{OSS_BUCKET_NAME}.{OSS_ENDPOINT}/{object_name}"
-    return public_url
+    return public_url_for(object_name)
 
 
 def delete_file_from_oss(file_url: str) -> bool:
@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+
+def encode_cursor(sort_by: str, keys: Sequence[Any]) -> str:
+    """
+    Builds an opaque keyset cursor from the sort mode and the sort-key values of
+    the last row on a page. Datetimes are stored as ISO strings.
+    """
+    values = [{"dt": key.isoformat()} if isinstance(key, datetime) else key for key in keys]
+    payload = json.dumps({"s": sort_by, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort_by: str) -> Optional[List[Any]]:
+    """
+    Returns the sort-key values stored in a cursor, or None when no cursor was given.
+    Raises ValueError if the cursor is malformed or belongs to a different sort mode.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["k"]
+        if payload["s"] != sort_by or not isinstance(values, list):
+            raise ValueError
+        return [datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v for v in values]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid pagination cursor.")
+
+
+def _matches_column(value: Any, column) -> bool:
+    """Whether a decoded cursor value can be bound against `column` without a database error."""
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return isinstance(value, (int, float, str, datetime)) and not isinstance(value, bool)
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is int:
+        return isinstance(value, int) and -2 ** 63 <= value < 2 ** 63
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def paginate_keyset(query: Query, sort_by: str, sort_columns: Sequence, cursor: Optional[str],
+                    limit: int, key_of: Optional[Callable[[Any], Sequence[Any]]] = None
+                    ) -> Tuple[list, Optional[str]]:
+    """
+    Orders `query` by `sort_columns` (all descending, the last one unique) and returns
+    the page that follows `cursor`, plus the cursor for the page after it.
+    Every page is an index range scan starting at the cursor, so deep pages cost the
+    same as the first one and rows inserted mid-scroll never shift the window.
+
+    `key_of` extracts the sort-key values from a result row; by default they are read
+    from the row's attributes named after `sort_columns`.
+    """
+    after = decode_cursor(cursor, sort_by)
+    if after is not None:
+        if len(after) != len(sort_columns) or not all(map(_matches_column, after, sort_columns)):
+            raise ValueError("Invalid pagination cursor.")
+        query = query.filter(tuple_(*sort_columns) < tuple_(*after))
+
+    # Fetch one extra row to learn whether another page exists.
+    rows = query.order_by(*(column.desc() for column in sort_columns)).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    keys = key_of(last) if key_of else [getattr(last, column.key) for column in sort_columns]
+    return rows, encode_cursor(sort_by, keys)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
-from models import NotificationType, ReportStatus, MediaType  # Import MediaType
+from models import NotificationType, ReportStatus, MediaType, MediaJobKind, MediaJobStatus  # Import MediaType
 
 
 # --- Configuration ---
@@ -73,6 +73,13 @@ class MediaUpdate(MediaBase):
     pass
 
 
+class MediaDerivative(BaseModel):
+    url: str
+    width: int
+    height: int
+    avif_url: Optional[str] = None
+
+
 class Media(MediaBase, BaseSchema):
     id: int
     owner_id: int
@@ -86,6 +93,55 @@ class Media(MediaBase, BaseSchema):
     like_count: int = 0
     comment_count: int = 0
     is_liked_by_current_user: bool = False
+    # Filled in shortly after upload for images; None for videos and until then.
+    width: Optional[int] = None
+    height: Optional[int] = None
+    derivatives: Optional[Dict[str, MediaDerivative]] = None
+
+
+class PaginatedMedia(BaseModel):
+    media: List[Media]
+    next_cursor: Optional[str] = None
+
+
+# --- Direct Upload Schemas ---
+
+class UploadFileInfo(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
+
+class UploadRequest(BaseModel):
+    files: List[UploadFileInfo]
+
+
+class PresignedUpload(BaseModel):
+    object_key: str
+    url: str
+    fields: Dict[str, str]
+
+
+class UploadComplete(BaseModel):
+    object_keys: List[str]
+    caption: str = ""
+    tags: List[str] = []
+
+
+class ProfilePictureComplete(BaseModel):
+    object_key: str
+
+
+class MediaJob(BaseSchema):
+    media_id: int
+    kind: MediaJobKind
+    status: MediaJobStatus
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 
 # --- Album Schemas ---
@@ -146,8 +202,6 @@ class User(UserBase, BaseSchema):
     profile_picture_url: Optional[str] = None
     allow_downloads: bool
     created_at: datetime
-    media: List[Media] = []  # RENAMED from media
-    albums: List['Album'] = []
     followers_count: int = 0
     following_count: int = 0
     is_followed_by_current_user: bool = False
@@ -155,6 +209,8 @@ class User(UserBase, BaseSchema):
 
 
 class UserProfile(User, BaseSchema):
+    # Media is paginated separately through GET /users/{username}/media.
+    media_count: int = 0
     albums: List[AlbumWithMediaCount] = []
 
 
@@ -210,7 +266,9 @@ class TokenData(BaseModel):
 # --- Search Schemas ---
 class SearchResults(BaseModel):
     users: List[UserSimple]
+    tags: List[Tag] = []
     media: List[Media]  # RENAMED from media
+    next_cursor: Optional[str] = None  # Pages through media only
 
 
 class UserWithFollowStatus(UserSimple):
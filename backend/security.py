@@ -6,9 +6,13 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Cookie
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
-import crud, models, schemas, database_manager
+from connection_manager import manager
+
+import crud, models, schemas, database_manager, cache_manager
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path="../.env")
@@ -23,6 +27,16 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60  # Token validity period
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# --- Principal Cache ---
+# Per-worker cache of the columns returned by crud.get_user_principal, keyed by the JWT `sub`.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 2048))
+
+principal_cache = cache_manager.TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+# Invalidations are broadcast so a demoted admin or changed password takes effect
+# on every worker, not just the one that handled the write.
+PRINCIPAL_INVALIDATE_EVENT = "principal.invalidate"
+
 # --- OAuth2 Scheme ---
 # This tells FastAPI which URL to use to get the token.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
@@ -60,6 +74,70 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     return user
 
 
+def invalidate_principal(username: str) -> None:
+    """Drops a user from the principal cache so the next request reloads them."""
+    principal_cache.delete(username)
+
+
+manager.on_event(PRINCIPAL_INVALIDATE_EVENT, invalidate_principal)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_principal_on_change(mapper, connection, target):
+    """
+    Any ORM update or delete of a user (profile edit, password change, admin flag)
+    evicts them now and again on every worker once the transaction commits, so a
+    concurrent request cannot re-cache the pre-commit row. The cache is keyed by
+    the token's username, so a rename evicts the previous username as well, and
+    tokens issued for it stop resolving everywhere.
+    """
+    usernames = {target.username, *inspect(target).attrs.username.history.deleted}
+    for username in usernames:
+        invalidate_principal(username)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stale_principals", set()).update(usernames)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_principals_on_commit(session):
+    for username in session.info.pop("stale_principals", ()):
+        invalidate_principal(username)
+        manager.publish_event_nowait(PRINCIPAL_INVALIDATE_EVENT, username)
+
+
+def resolve_principal(db: Session, username: str) -> Optional[models.User]:
+    """
+    Returns a models.User for the given username, attached to `db`, holding only
+    the principal columns. Served from the per-worker cache when possible, so a
+    cache hit costs no query at all. Any other attribute lazy-loads on access.
+    If `db` already holds this user, that instance is returned instead.
+    """
+    principal = principal_cache.get(username)
+    if principal is None:
+        principal = crud.get_user_principal(db, username=username)
+        if principal is None:
+            return None
+        principal_cache.set(username, principal)
+
+    user = models.User(**principal)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def _username_from_token(access_token: Optional[str]) -> Optional[str]:
+    """Decodes a JWT and returns its subject, or None if the token is missing or invalid."""
+    if access_token is None:
+        return None
+    try:
+        payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_data = schemas.TokenData(username=payload.get("sub"))
+    except JWTError:
+        return None
+    return token_data.username
+
+
 def get_current_user(access_token: Optional[str] = Cookie(None),
                      db: Session = Depends(database_manager.get_db)) -> models.User:
     """
@@ -71,42 +149,106 @@ def get_current_user(access_token: Optional[str] = Cookie(None),
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    if access_token is None:
+    username = _username_from_token(access_token)
+    if username is None:
         raise credentials_exception
-        # raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    try:
-        payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+
+    user = resolve_principal(db, username=username)
+    if user is None:
+        raise credentials_exception
+    return user
+
+async def get_current_user_async(access_token: Optional[str] = Cookie(None),
+                                 db: AsyncSession = Depends(database_manager.get_async_db)) -> models.User:
+    """
+    Async counterpart of get_current_user for handlers on the async session.
+    A principal-cache hit costs no query; a miss runs the same principal lookup
+    through the async connection. The returned user is detached with its principal
+    columns loaded, so only those may be accessed.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    username = _username_from_token(access_token)
+    if username is None:
+        raise credentials_exception
+
+    principal = principal_cache.get(username)
+    if principal is None:
+        principal = await db.run_sync(lambda session: crud.get_user_principal(session, username=username))
+        if principal is None:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+        principal_cache.set(username, principal)
+
+    user = models.User(**principal)
+    make_transient_to_detached(user)
+    return user
+
+
+def _resolve_principal_detached(username: str) -> Optional[models.User]:
+    """resolve_principal on a session borrowed just for the lookup; the user comes back detached."""
+    db = database_manager.SessionLocal()
+    try:
+        return resolve_principal(db, username=username)
+    finally:
+        db.close()
+
+
+def get_current_user_detached(access_token: Optional[str] = Cookie(None)) -> models.User:
+    """
+    Like get_current_user, but borrows a session only for the lookup, so a handler
+    doing slow non-DB work (e.g. streaming uploads to OSS) holds neither an
+    admission slot nor a pooled connection meanwhile. The returned user is detached
+    with its principal columns loaded.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    username = _username_from_token(access_token)
+    if username is None:
+        raise credentials_exception
+
+    user = _resolve_principal_detached(username)
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+def get_current_websocket_user(access_token: Optional[str] = Cookie(None)) -> models.User:
+    """
+    Dependency to get the current user for a WebSocket. Unlike get_current_user it
+    borrows a session only for the lookup, so a long-lived socket does not hold a
+    pooled connection; the returned user is detached with its principal columns loaded.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+    )
+    username = _username_from_token(access_token)
+    if username is None:
         raise credentials_exception
 
-    user = crud.get_user_by_username(db, username=token_data.username)
+    user = _resolve_principal_detached(username)
     if user is None:
         raise credentials_exception
     return user
 
-def get_optional_current_user(access_token: Optional[str] = Depends(oauth2_scheme),
+def get_optional_current_user(access_token: Optional[str] = Cookie(None),
+                              bearer_token: Optional[str] = Depends(oauth2_scheme),
                               db: Session = Depends(database_manager.get_db)) -> Optional[models.User]:
     """
-        Dependency to get the current user from a JWT token if present.
+        Dependency to get the current user from a JWT token if present, read from the
+        auth cookie (as set by /auth/token) or an Authorization bearer header.
         If the token is missing or invalid, it returns None instead of raising an exception.
     """
-    if access_token is None:
-        return None
-    try:
-        payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+    username = _username_from_token(access_token or bearer_token)
+    if username is None:
         return None
-
-    user = crud.get_user_by_username(db, username=token_data.username)
-    return user
+    return resolve_principal(db, username=username)
 
 def get_current_admin_user(current_user: models.User = Depends(get_current_user)) -> models.User:
     """
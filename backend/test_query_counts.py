@@ -0,0 +1,113 @@
+"""
+Query-count regression tests for the media card endpoints: each must run the same
+number of statements whatever the number of rows it returns, i.e. no N+1 loads.
+
+Needs the database from ../.env with every migration applied; skipped when the
+environment is not configured or the database is unreachable. Run from the backend directory:
+    python -m pytest -q test_query_counts.py
+"""
+import uuid
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import exc, text
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import crud, database_manager, models, schemas, security
+    import main
+except Exception as e:  # the modules refuse to import without their ../.env settings
+    pytest.skip(f"Backend environment not configured: {e}", allow_module_level=True)
+
+SMALL, LARGE = 2, 6
+
+
+@pytest.fixture
+def seeded():
+    """An owner with media, tags, likes, comments and albums, liked by a viewer; grown by `grow(n)`."""
+    try:
+        with database_manager.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except exc.OperationalError as e:
+        pytest.skip(f"Database unavailable: {e}")
+
+    db = database_manager.SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    owner, viewer = [
+        crud.create_user(db, schemas.UserCreate(username=f"qc_{role}_{suffix}", email=f"qc_{role}_{suffix}@example.com",
+                                                password=uuid.uuid4().hex))
+        for role in ("owner", "viewer")
+    ]
+
+    def grow(count: int):
+        while crud.get_media_count_for_user(db, user_id=owner.id) < count:
+            upload = (f"https://example.com/{uuid.uuid4()}.jpg", models.MediaType.image, None)
+            media_id, = crud.create_media_batch(db, owner_id=owner.id, uploads=[upload], caption="query count",
+                                                tags=[f"qc-{suffix}", f"qc-{suffix}-{uuid.uuid4().hex[:8]}"])
+            crud.create_like(db, user_id=viewer.id, media_id=media_id)
+            crud.create_comment(db, schemas.CommentCreate(content="nice"), media_id=media_id, author_id=viewer.id)
+            album = crud.create_album(db, schemas.AlbumCreate(name=f"album {media_id}"), owner_id=owner.id)
+            crud.add_media_to_album(db, media=crud.get_media(db, media_id=media_id), album=album)
+
+    yield owner.username, viewer.username, grow
+
+    for user in (owner, viewer):
+        db.delete(user)
+    db.query(models.Tag).filter(models.Tag.name.like(f"qc-{suffix}%")).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+def count_request(handler) -> int:
+    """Runs `handler(db)` on a fresh session and returns the number of statements it sent."""
+    db = database_manager.SessionLocal()
+    try:
+        with database_manager.count_queries() as counter:
+            handler(db)
+        return counter.count
+    finally:
+        db.close()
+
+
+def media_page(viewer_name: str):
+    def handler(db):
+        viewer = security.resolve_principal(db, viewer_name)
+        result = main.get_all_media(sort_by="newest", cursor=None, limit=20, db=db, current_user=viewer)
+        schemas.PaginatedMedia.model_validate(result, from_attributes=True)
+    return handler
+
+
+def leaderboard(viewer_name: str):
+    def handler(db):
+        viewer = security.resolve_principal(db, viewer_name)
+        result = main.get_leaderboard_media(limit=10, window="all", db=db, current_user=viewer)
+        TypeAdapter(List[schemas.Media]).validate_python(result, from_attributes=True)
+    return handler
+
+
+def profile(owner_name: str, viewer_name: str):
+    def handler(db):
+        viewer = security.resolve_principal(db, viewer_name)
+        request = Request({"type": "http", "method": "GET", "headers": []})
+        main.get_user_profile(username=owner_name, request=request, response=Response(), db=db, current_user=viewer)
+    return handler
+
+
+@pytest.mark.parametrize("endpoint", ["media", "leaderboard", "profile"])
+def test_query_count_is_independent_of_row_count(seeded, endpoint):
+    owner_name, viewer_name, grow = seeded
+    handler = {
+        "media": media_page(viewer_name),
+        "leaderboard": leaderboard(viewer_name),
+        "profile": profile(owner_name, viewer_name),
+    }[endpoint]
+
+    grow(SMALL)
+    count_request(handler)  # warm the principal cache so both runs resolve the viewer the same way
+    small = count_request(handler)
+    grow(LARGE)
+    large = count_request(handler)
+
+    assert small == large, f"{endpoint}: {small} queries for {SMALL} items, {large} for {LARGE}"
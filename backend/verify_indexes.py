@@ -0,0 +1,131 @@
+"""
+Checks that every hot crud query can be served by an index.
+
+Runs each read path in crud.py against the configured database, captures the SQL it
+emits (including selectinload follow-up queries), and EXPLAINs every statement with
+sequential scans disabled. The planner only falls back to a Seq Scan in that mode when
+no usable index exists, so any Seq Scan on a hot table is reported as a failure.
+
+Run from the backend directory after applying the migrations:
+    python verify_indexes.py
+Exits with status 1 if any hot query falls back to a sequential scan.
+"""
+import json
+import sys
+from typing import Callable, List, Tuple
+
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+
+import crud, models
+from database_manager import SessionLocal, engine
+
+# Tables large enough that a sequential scan on a request path is a bug.
+HOT_TABLES = {
+    "media", "likes", "comments", "follows", "messages", "notifications", "media_tags",
+    "media_albums", "conversation_participants", "albums", "reports", "users", "tags",
+    "timeline_entries",
+}
+
+
+def _first_id(db: Session, column) -> int:
+    return db.query(func.min(column)).scalar() or 1
+
+
+def hot_queries(db: Session) -> List[Tuple[str, Callable[[], object]]]:
+    """The crud read paths to verify, bound to ids that exist in the database."""
+    media_id = _first_id(db, models.Media.id)
+    user_id = _first_id(db, models.User.id)
+    album_id = _first_id(db, models.Album.id)
+    conversation_id = _first_id(db, models.Conversation.id)
+    username = db.query(models.User.username).filter(models.User.id == user_id).scalar() or ""
+
+    return [
+        ("get_user_principal", lambda: crud.get_user_principal(db, username=username)),
+        ("get_all_media[newest]", lambda: crud.get_all_media(db, sort_by="newest")),
+        ("get_all_media[popular]", lambda: crud.get_all_media(db, sort_by="popular")),
+        ("get_all_media[featured]", lambda: crud.get_all_media(db, sort_by="featured")),
+        ("get_all_media[trending]", lambda: crud.get_all_media(db, sort_by="trending")),
+        ("get_media_for_user", lambda: crud.get_media_for_user(db, owner_id=user_id)),
+        ("get_following_feed", lambda: crud.get_following_feed(db, user_id=user_id)),
+        ("get_media_count_for_user", lambda: crud.get_media_count_for_user(db, user_id=user_id)),
+        ("get_media_card", lambda: crud.get_media_card(db, media_id=media_id)),
+        ("get_top_liked_media", lambda: crud.get_top_liked_media(db)),
+        ("get_most_followed_users", lambda: crud.get_most_followed_users(db)),
+        ("get_top_liked_media[week]", lambda: crud.get_top_liked_media(db, window="week")),
+        ("get_most_followed_users[week]", lambda: crud.get_most_followed_users(db, window="week")),
+        ("get_user_followers", lambda: crud.get_user_followers(db, user_id=user_id)),
+        ("get_user_following", lambda: crud.get_user_following(db, user_id=user_id)),
+        ("get_comments_for_media", lambda: crud.get_comments_for_media(db, media_id=media_id)),
+        ("get_liked_media_ids", lambda: crud.get_liked_media_ids(db, user_id=user_id, media_ids=[media_id])),
+        ("get_user_albums_with_media_count",
+         lambda: crud.get_user_albums_with_media_count(db, user_id=user_id)),
+        ("get_album_with_media", lambda: crud.get_album_with_media(db, album_id=album_id)),
+        ("get_media_version", lambda: crud.get_media_version(db, media_id=media_id)),
+        ("get_album_version", lambda: crud.get_album_version(db, album_id=album_id)),
+        ("get_profile_version", lambda: crud.get_profile_version(db, username=username)),
+        ("get_notifications_for_user", lambda: crud.get_notifications_for_user(db, user_id=user_id)),
+        ("get_messages_for_conversation",
+         lambda: crud.get_messages_for_conversation(db, conversation_id=conversation_id)),
+        ("get_reports[pending]", lambda: crud.get_reports(db, status=models.ReportStatus.pending)),
+        ("search_content", lambda: crud.search_content(db, query="graduation")),
+    ]
+
+
+def _seq_scans(plan: dict) -> List[str]:
+    """Walks an EXPLAIN (FORMAT JSON) plan tree and returns the hot tables it seq-scans."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in HOT_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def main() -> int:
+    captured: List[Tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    db = SessionLocal()
+    failures = 0
+    try:
+        queries = hot_queries(db)
+        for name, run in queries:
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                run()
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+
+            connection = db.connection()
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+            name_failures = 0
+            for statement, parameters in list(captured):
+                result = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                raw_plan = result.scalar()
+                plan = (json.loads(raw_plan) if isinstance(raw_plan, str) else raw_plan)[0]["Plan"]
+                scanned = _seq_scans(plan)
+                if scanned:
+                    name_failures += 1
+                    print(f"FAIL {name}: sequential scan on {', '.join(sorted(set(scanned)))}")
+                    print(f"     {' '.join(statement.split())}")
+            if not name_failures:
+                print(f"ok   {name} ({len(captured)} statements)")
+            failures += name_failures
+            db.rollback()
+    finally:
+        db.close()
+
+    if failures:
+        print(f"{failures} statement(s) fell back to a sequential scan.")
+        return 1
+    print("All hot queries are index-backed.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
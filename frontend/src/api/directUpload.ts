@@ -0,0 +1,22 @@
+import axios from 'axios';
+
+export interface PresignedUpload {
+    object_key: string;
+    url: string;
+    fields: Record<string, string>;
+}
+
+export const describeFile = (file: File) => ({
+    filename: file.name,
+    content_type: file.type,
+    size: file.size,
+});
+
+// Posts a file straight to OSS with a presigned form issued by the API.
+// The file must be the last field of the form.
+export const uploadToPresignedForm = async (upload: PresignedUpload, file: File): Promise<void> => {
+    const formData = new FormData();
+    Object.entries(upload.fields).forEach(([key, value]) => formData.append(key, value));
+    formData.append('file', file);
+    await axios.post(upload.url, formData);
+};
@@ -21,6 +21,13 @@ const MediaCardComponent = ({ media, onRemoveFromAlbum, loadingStrategy = 'lazy'
     };
 
     const getSrcSet = (baseUrl: string) => {
+        // Prefer the derivatives rendered at upload; fall back to on-the-fly OSS resizing until they exist.
+        if (media.derivatives) {
+            return Object.values(media.derivatives)
+                .map(derivative => `${derivative.url} ${derivative.width}w`)
+                .join(', ');
+        }
+
         const widths = [400, 600, 800, 1200, 1600];
 
         // Chain commands: 1. Resize, 2. Auto-format to WebP, 3. Set quality to 80
@@ -48,7 +55,7 @@ const MediaCardComponent = ({ media, onRemoveFromAlbum, loadingStrategy = 'lazy'
                     />
                 ) : (
                     <img
-                        src={media.media_url}
+                        src={media.derivatives?.medium.url ?? media.media_url}
                         srcSet={getSrcSet(media.media_url)}
                         sizes="(max-width: 768px) 100vw, (max-width: 1280px) 50vw, 33vw"
                         alt={media.caption || `A media item by ${media.owner.username}`}
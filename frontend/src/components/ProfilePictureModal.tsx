@@ -1,6 +1,7 @@
 import { useState, type ChangeEvent } from 'react';
 import { X, UploadCloud, Loader2 } from 'lucide-react';
 import apiService from '../api/apiService';
+import { describeFile, uploadToPresignedForm, type PresignedUpload } from '../api/directUpload';
 
 interface ProfilePictureModalProps {
     isOpen: boolean;
@@ -44,13 +45,13 @@ export const ProfilePictureModal = ({
         setIsUploading(true);
         setError(null);
 
-        const formData = new FormData();
-        formData.append('file', file);
-
         try {
-            // NOTE: You will need to create this backend endpoint!
-            const response = await apiService.post('/users/me/profile-picture', formData, {
-                headers: { 'Content-Type': 'multipart/form-data' },
+            const { data: upload } = await apiService.post<PresignedUpload>(
+                '/users/me/profile-picture/uploads', describeFile(file)
+            );
+            await uploadToPresignedForm(upload, file);
+            const response = await apiService.post('/users/me/profile-picture/complete', {
+                object_key: upload.object_key,
             });
             onUploadSuccess(response.data.profile_picture_url);
             handleClose();
@@ -1,6 +1,7 @@
 import { useState, type ChangeEvent, type FormEvent, useEffect, useId } from 'react';
 import { X, UploadCloud, Loader2, Trash2 } from 'lucide-react';
 import apiService from '../api/apiService';
+import { describeFile, uploadToPresignedForm, type PresignedUpload } from '../api/directUpload';
 import imageCompression from 'browser-image-compression';
 
 interface UploadModalProps {
@@ -94,20 +95,23 @@ export const UploadModal = ({ isOpen, onClose, onUploadSuccess }: UploadModalPro
         setIsUploading(true);
         setError(null);
 
-        const formData = new FormData();
-        files.forEach(fp => {
-            // Use compressed file for media, original for videos
-            const fileToUpload = fp.file.type.startsWith('image/') ? fp.compressedFile : fp.file;
-            if (fileToUpload) {
-                formData.append('files', fileToUpload, `${fp.file.name.split('.')[0]}.webp`);
-            }
-        });
-        formData.append('caption', caption);
-        formData.append('tags', tags);
+        // Use compressed file for images, original for videos
+        const filesToUpload = files
+            .map(fp => fp.file.type.startsWith('image/')
+                ? (fp.compressedFile && new File([fp.compressedFile], `${fp.file.name.split('.')[0]}.webp`, { type: fp.compressedFile.type }))
+                : fp.file)
+            .filter((file): file is File => Boolean(file));
 
         try {
-            await apiService.post('/media', formData, {
-                headers: { 'Content-Type': 'multipart/form-data' },
+            // Bytes go straight to storage; the API only signs the uploads and records them.
+            const { data: uploads } = await apiService.post<PresignedUpload[]>('/media/uploads', {
+                files: filesToUpload.map(describeFile),
+            });
+            await Promise.all(uploads.map((upload, index) => uploadToPresignedForm(upload, filesToUpload[index])));
+            await apiService.post('/media/uploads/complete', {
+                object_keys: uploads.map(upload => upload.object_key),
+                caption,
+                tags: tags.split(',').map(tag => tag.trim()).filter(Boolean),
             });
             onUploadSuccess();
             handleClose();
@@ -158,7 +162,7 @@ export const UploadModal = ({ isOpen, onClose, onUploadSuccess }: UploadModalPro
                                 <p className="mb-2 text-sm text-gray-500"><span className="font-semibold">Click to upload</span> or drag and drop</p>
                                 <p className="text-xs text-gray-500">Images and Videos</p>
                             </div>
-                            <input id={uniqueId} type="file" className="hidden" multiple onChange={handleFileChange} accept="image/png, image/jpeg, video/mp4, video/quicktime" />
+                            <input id={uniqueId} type="file" className="hidden" multiple onChange={handleFileChange} accept="image/png, image/jpeg, image/webp, image/gif, video/mp4, video/quicktime" />
                         </label>
                     </div>
 
@@ -9,9 +9,10 @@
     if (!response.ok) return;
 
     const data = await response.json();
-    if (!data || data.length === 0 || !data[0].media_url) return;
+    const media = data?.media;
+    if (!media || media.length === 0 || !media[0].media_url) return;
 
-    const lcpImageUrl = data[0].media_url;
+    const lcpImageUrl = media[0].media_url;
     const processCommands = "image/resize,w_{w}/format,webp/quality,q_80";
 
     const preloadLink = document.createElement('link');
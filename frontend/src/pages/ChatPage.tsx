@@ -1,6 +1,7 @@
 import {useEffect, useState} from 'react';
 import {useInfiniteQuery, useQuery, useQueryClient} from '@tanstack/react-query';
 import {useSearchParams} from 'react-router-dom';
+import toast from 'react-hot-toast';
 
 import apiService from '../api/apiService';
 import {useAuth} from '../hooks/useAuth';
@@ -10,7 +11,7 @@ import {WS_URL} from '../api/config';
 import {ChatLayout} from '../components/chat/ChatLayout';
 import {PageHelmet} from '../components/layout/PageHelmet';
 
-import type {Conversation, Message} from '../types/chat';
+import type {ChatError, Conversation, Message} from '../types/chat';
 
 const MESSAGES_PAGE_SIZE = 50;
 
@@ -67,7 +68,7 @@ export const ChatPage = () => {
     // --- WebSocket Connection ---
     const token = localStorage.getItem('accessToken');
     const wsUrl = selectedConversationId ? `${WS_URL}/ws/chat/${selectedConversationId}?token=${token}` : null;
-    const { lastMessage, sendMessage, readyState } = useWebSocket<Message>(wsUrl);
+    const { lastMessage, sendMessage, readyState } = useWebSocket<Message | ChatError>(wsUrl);
 
     // --- Effects ---
     // Update URL when a conversation is selected
@@ -79,7 +80,9 @@ export const ChatPage = () => {
 
     // Handle incoming WebSocket messages
     useEffect(() => {
-        if (lastMessage) {
+        if (lastMessage && 'error' in lastMessage) {
+            toast.error(lastMessage.error);
+        } else if (lastMessage) {
             queryClient.setQueryData(['messages', lastMessage.conversation_id], (oldData: any) => {
                 if (!oldData || !oldData.pages) {
                      return oldData;
@@ -8,20 +8,25 @@ import type { Media } from '../types/media'; // <-- Use Media type
 import { Loader2, Camera } from 'lucide-react';
 import {PageHelmet} from "../components/layout/PageHelmet.tsx";
 
-type SortOption = 'newest' | 'popular' | 'featured';
+type SortOption = 'newest' | 'trending' | 'popular' | 'featured';
 const PAGE_SIZE = 12;
 
-const fetchMedia = async ({ pageParam = 0, sortBy }: { pageParam?: number, sortBy: SortOption }) => {
-    const { data } = await apiService.get<Media[]>('/media', {
+interface PaginatedMedia {
+    media: Media[];
+    next_cursor: string | null;
+}
+
+const fetchMedia = async ({ pageParam, sortBy }: { pageParam?: string, sortBy: SortOption }) => {
+    const { data } = await apiService.get<PaginatedMedia>('/media', {
         params: {
             sort_by: sortBy,
-            skip: pageParam,
+            cursor: pageParam,
             limit: PAGE_SIZE,
         },
     });
     return {
-        media: data,
-        nextPage: data.length === PAGE_SIZE ? pageParam + PAGE_SIZE : undefined,
+        media: data.media,
+        nextPage: data.next_cursor ?? undefined,
     };
 };
 
@@ -40,7 +45,7 @@ const HomePage = () => {
         // 4. UPDATE the query key for better cache separation
         queryKey: ['media', sortBy],
         queryFn: ({ pageParam }) => fetchMedia({ pageParam, sortBy }), // <-- Use renamed function
-        initialPageParam: 0,
+        initialPageParam: undefined as string | undefined,
         getNextPageParam: (lastPage) => lastPage.nextPage,
     });
 
@@ -82,6 +87,7 @@ const HomePage = () => {
                          <h2 className="text-2xl font-semibold">Explore Moments</h2>
                          <div className="flex items-center justify-center gap-2 p-1 bg-gray-100 rounded-full">
                             <button onClick={() => handleSortChange('newest')} className={getSortButtonClass('newest')}>Most Recent</button>
+                            <button onClick={() => handleSortChange('trending')} className={getSortButtonClass('trending')}>Trending</button>
                             <button onClick={() => handleSortChange('popular')} className={getSortButtonClass('popular')}>Most Popular</button>
                             <button onClick={() => handleSortChange('featured')} className={getSortButtonClass('featured')}>Featured</button>
                         </div>
@@ -1,3 +1,4 @@
+import { useState } from 'react';
 import { useQuery } from '@tanstack/react-query';
 import { Link } from 'react-router-dom';
 import { Crown } from 'lucide-react';
@@ -10,14 +11,23 @@ import type { Media } from '../types/media.ts';
 import type { User } from '../types/user';
 import {PageHelmet} from "../components/layout/PageHelmet.tsx";
 
+type LeaderboardWindow = 'day' | 'week' | 'month' | 'all';
+
+const WINDOW_LABELS: Record<LeaderboardWindow, string> = {
+    day: 'Today',
+    week: 'This Week',
+    month: 'This Month',
+    all: 'All Time',
+};
+
 // Fetcher functions
-const fetchTopMedia = async (): Promise<Media[]> => {
-    const { data } = await apiService.get('/leaderboard/media?limit=9'); // Corrected endpoint
+const fetchTopMedia = async (window: LeaderboardWindow): Promise<Media[]> => {
+    const { data } = await apiService.get('/leaderboard/media', { params: { limit: 9, window } });
     return data;
 };
 
-const fetchTopUsers = async (): Promise<User[]> => {
-    const { data } = await apiService.get('/leaderboard/users?limit=10');
+const fetchTopUsers = async (window: LeaderboardWindow): Promise<User[]> => {
+    const { data } = await apiService.get('/leaderboard/users', { params: { limit: 10, window } });
     return data;
 };
 
@@ -38,15 +48,24 @@ const UserListSkeleton = () => (
 
 
 export const LeaderboardPage = () => {
+    const [timeWindow, setTimeWindow] = useState<LeaderboardWindow>('all');
     const { data: topMedia, isLoading: isLoadingMedia, isError: isErrorMedia } = useQuery({
-        queryKey: ['leaderboard_media'],
-        queryFn: fetchTopMedia,
+        queryKey: ['leaderboard_media', timeWindow],
+        queryFn: () => fetchTopMedia(timeWindow),
     });
     const { data: topUsers, isLoading: isLoadingUsers, isError: isErrorUsers } = useQuery({
-        queryKey: ['leaderboard_users'],
-        queryFn: fetchTopUsers,
+        queryKey: ['leaderboard_users', timeWindow],
+        queryFn: () => fetchTopUsers(timeWindow),
     });
 
+    const getWindowButtonClass = (option: LeaderboardWindow) => {
+        const baseClass = "px-4 py-2 rounded-full font-semibold transition-all duration-300 text-sm sm:text-base shadow-sm";
+        if (timeWindow === option) {
+            return `${baseClass} bg-brand-dark text-white scale-105`;
+        }
+        return `${baseClass} bg-white text-brand-text hover:bg-gray-200 border border-gray-200`;
+    };
+
     const getTrophyColor = (rank: number) => {
         if (rank === 0) return 'text-yellow-500'; // Gold
         if (rank === 1) return 'text-gray-400';  // Silver
@@ -61,6 +80,13 @@ export const LeaderboardPage = () => {
                 <header className="text-center">
                     <h1 className="text-5xl font-bold font-serif text-gray-800">Leaderboards</h1>
                     <p className="text-xl text-gray-600 mt-2">Discover the top photos and most influential users.</p>
+                    <div className="inline-flex items-center justify-center gap-2 p-1 mt-6 bg-gray-100 rounded-full">
+                        {(Object.keys(WINDOW_LABELS) as LeaderboardWindow[]).map((option) => (
+                            <button key={option} onClick={() => setTimeWindow(option)} className={getWindowButtonClass(option)}>
+                                {WINDOW_LABELS[option]}
+                            </button>
+                        ))}
+                    </div>
                 </header>
 
                 <div className="grid grid-cols-1 lg:grid-cols-3 gap-10">
@@ -164,7 +164,7 @@ export const MediaDetailPage = () => {
                         />
                     ) : (
                         <img
-                            src={media.media_url}
+                            src={media.derivatives?.large.url ?? media.media_url}
                             alt={media.caption || `Media by ${media.owner.username}`}
                             className="max-w-full max-h-[80vh] object-contain rounded-lg shadow-lg"
                         />
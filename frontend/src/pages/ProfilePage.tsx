@@ -1,12 +1,13 @@
-import { useState } from 'react';
+import { useState, useEffect } from 'react';
 import {useParams, Link, useNavigate} from 'react-router-dom';
-import { useQuery, useQueryClient, useMutation } from '@tanstack/react-query';
+import { useQuery, useInfiniteQuery, useQueryClient, useMutation } from '@tanstack/react-query';
+import { useInView } from 'react-intersection-observer';
 import toast from 'react-hot-toast';
 import apiService from '../api/apiService';
 import type { User } from '../types/user';
 import type { Media } from '../types/media';
 import type { Conversation } from '../types/chat';
-import { Camera, BookCopy, Plus, Trash2, MessageCircle } from 'lucide-react';
+import { Camera, BookCopy, Plus, Trash2, MessageCircle, Loader2 } from 'lucide-react';
 
 import { MediaGrid } from '../components/MediaGrid'; // Use MediaGrid
 import { SkeletonLoader as GridSkeletonLoader } from '../components/ui/SkeletonLoader';
@@ -25,7 +26,7 @@ interface AlbumSummary {
 }
 
 interface UserProfile extends User {
-    media: Media[];
+    media_count: number;
     followers_count: number;
     following_count: number;
     albums: AlbumSummary[];
@@ -37,6 +38,20 @@ const fetchProfile = async (username: string): Promise<UserProfile> => {
     return data;
 };
 
+interface PaginatedMedia {
+    media: Media[];
+    next_cursor: string | null;
+}
+
+const MEDIA_PAGE_SIZE = 24;
+
+const fetchProfileMedia = async (username: string, cursor?: string): Promise<PaginatedMedia> => {
+    const { data } = await apiService.get<PaginatedMedia>(`/users/${username}/media`, {
+        params: { cursor, limit: MEDIA_PAGE_SIZE },
+    });
+    return data;
+};
+
 const ProfileHeaderSkeleton = () => (
     <header className="flex flex-col md:flex-row items-center gap-8 animate-pulse">
         <div className="w-32 h-32 bg-gray-300 rounded-full"></div>
@@ -74,6 +89,27 @@ export const ProfilePage = () => {
         enabled: !!username,
     });
 
+    const { ref: loadMoreRef, inView } = useInView({ threshold: 0.5 });
+    const {
+        data: mediaPages,
+        hasNextPage,
+        fetchNextPage,
+        isFetchingNextPage,
+    } = useInfiniteQuery({
+        queryKey: ['profile', username, 'media'],
+        queryFn: ({ pageParam }) => fetchProfileMedia(username!, pageParam),
+        initialPageParam: undefined as string | undefined,
+        getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
+        enabled: !!username,
+    });
+    const profileMedia = mediaPages?.pages.flatMap(page => page.media) || [];
+
+    useEffect(() => {
+        if (inView && hasNextPage && !isFetchingNextPage) {
+            fetchNextPage();
+        }
+    }, [inView, hasNextPage, isFetchingNextPage, fetchNextPage]);
+
     const startConversationMutation = useMutation({
         mutationFn: (userId: number) => apiService.post<Conversation>('/chat/conversations', { user_id: userId }),
         onSuccess: (data) => {
@@ -175,7 +211,7 @@ export const ProfilePage = () => {
                         </div>
                         <div className="flex justify-center md:justify-start gap-6 mt-4 text-gray-600">
                             <span className="text-center">
-                                <span className="font-bold block text-lg text-brand-dark">{profile.media.length}</span>
+                                <span className="font-bold block text-lg text-brand-dark">{profile.media_count}</span>
                                 <span className="text-sm">posts</span>
                             </span>
                             <Link to={`/profile/${profile.username}/followers`} className="text-center hover:text-brand-accent transition-colors">
@@ -216,8 +252,13 @@ export const ProfilePage = () => {
 
                 <main>
                     {activeTab === 'media' && (
-                        profile.media.length > 0 ? (
-                            <MediaGrid mediaItems={profile.media} />
+                        profileMedia.length > 0 ? (
+                            <>
+                                <MediaGrid mediaItems={profileMedia} />
+                                <div ref={loadMoreRef} className="flex justify-center mt-8 h-10">
+                                    {isFetchingNextPage && <Loader2 className="animate-spin text-gray-500" size={20} />}
+                                </div>
+                            </>
                         ) : (
                             <div className="text-center text-gray-500 py-10 bg-gray-50 rounded-lg">
                                 This user hasn't posted any media yet.
@@ -9,6 +9,11 @@ export interface Message {
     sender: UserSimple;
 }
 
+// Sent back over the chat socket instead of a Message when the server rejects one.
+export interface ChatError {
+    error: string;
+}
+
 export interface Conversation {
     id: number;
     type: 'one_to_one' | 'group';
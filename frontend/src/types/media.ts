@@ -5,6 +5,13 @@ interface MediaOwner {
     allow_downloads: boolean;
 }
 
+interface MediaDerivative {
+    url: string;
+    width: number;
+    height: number;
+    avif_url?: string | null;
+}
+
 interface MediaTag {
     id: number;
     name: string;
@@ -21,4 +28,7 @@ export interface Media {
     like_count: number;
     comment_count: number;
     is_featured: boolean;
+    width?: number | null;
+    height?: number | null;
+    derivatives?: Record<'thumb' | 'medium' | 'large', MediaDerivative> | null;
 }
\ No newline at end of file